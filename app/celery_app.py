@@ -1,9 +1,39 @@
 import os
+import time
 from celery import Celery
+from kombu import Queue
+from celery.signals import before_task_publish
 
 BROKER = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
 
+# The API enqueues tasks by name, so it never imports app.worker and the extraction stack behind it.
+# These are Celery's default names for the worker functions, kept explicit so they cannot drift.
+PROCESS_INVOICE_TASK = "app.worker.process_invoice_task"
+PROCESS_INVOICE_CHUNK_TASK = "app.worker.process_invoice_chunk_task"
+AGGREGATE_BATCH_TASK = "app.worker.aggregate_batch_task"
+DELIVER_WEBHOOK_TASK = "app.worker.deliver_webhook_task"
+BATCH_FAILED_TASK = "app.worker.batch_failed_task"
+
+# Redis key of each batch's manifest: the task id of every file
+BATCH_KEY_PREFIX = "invoice-batch:"
+
+# Single checks wait on their own queue, served by dedicated workers, so a month-end
+# dump on the bulk queue never sits in front of them.
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
+QUEUES = [INTERACTIVE_QUEUE, BULK_QUEUE]
+
+# Redis emulates priorities with one list per step, and serves step 0 first
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEPARATOR = ":"
+
+
+def broker_lists(queue: str) -> list:
+    """The Redis lists holding one queue's messages, one per priority step."""
+    return [queue] + [f"{queue}{PRIORITY_SEPARATOR}{step}" for step in PRIORITY_STEPS[1:]]
+
+
 celery_app = Celery(
     "invoice_worker",
     broker=BROKER,
@@ -16,4 +46,28 @@ celery_app.conf.update(
     result_serializer="json",
     accept_content=["json"],
     result_expires=3600,
-)
\ No newline at end of file
+    task_queues=[Queue(queue) for queue in QUEUES],
+    task_default_queue=INTERACTIVE_QUEUE,
+    task_default_priority=0,
+    task_routes={
+        PROCESS_INVOICE_CHUNK_TASK: {"queue": BULK_QUEUE},
+        AGGREGATE_BATCH_TASK: {"queue": BULK_QUEUE},
+    },
+    broker_transport_options={
+        "priority_steps": PRIORITY_STEPS,
+        "sep": PRIORITY_SEPARATOR,
+        "queue_order_strategy": "priority",
+    },
+    # LLM tasks run for seconds: a worker reserves one message per free slot instead of
+    # hoarding a prefetch buffer that idle workers cannot take from. Acking late returns
+    # the message to the queue if the worker dies mid-task.
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+)
+
+
+@before_task_publish.connect
+def _stamp_enqueue_time(headers=None, **kwargs):
+    # Read back by the worker to measure how long each task waited in the queue
+    headers["enqueued_at"] = time.time()
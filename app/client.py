@@ -0,0 +1,242 @@
+"""
+Async client for the /invoices API, for the Streamlit UI and integration scripts.
+
+One pooled httpx.AsyncClient per InvoiceClient. Uploads run concurrently up to
+max_concurrency, and a 429 pauses every request of the client until the window named by
+Retry-After / X-RateLimit-Reset reopens. Results are awaited over Server-Sent Events for
+small sets and through the bulk status endpoint otherwise.
+
+    async with InvoiceClient("http://localhost:8000") as client:
+        submissions = await client.submit_many(Path("invoices").glob("*.pdf"))
+        results = await client.wait_all([s["task_id"] for s in submissions if "task_id" in s])
+
+Only depends on httpx and httpx-sse, never on the server code.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Iterable, List
+import httpx
+from httpx_sse import aconnect_sse
+
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+CLIENT_MAX_CONCURRENCY = int(os.getenv("CLIENT_MAX_CONCURRENCY", "8"))
+CLIENT_TIMEOUT_SECONDS = float(os.getenv("CLIENT_TIMEOUT_SECONDS", "120"))
+# 429s retried per request before giving up; waits without rate-limit headers back off from 1s
+CLIENT_MAX_RETRIES = int(os.getenv("CLIENT_MAX_RETRIES", "8"))
+CLIENT_BACKOFF_MAX_SECONDS = float(os.getenv("CLIENT_BACKOFF_MAX_SECONDS", "60"))
+# Larger sets are polled through POST /invoices/status: one request covers up to STATUS_MAX_IDS tasks
+SSE_MAX_IDS = 100
+STATUS_MAX_IDS = 1000
+# Only honoured when the API is reached through one of its TENANT_TRUSTED_PROXIES
+TENANT_HEADER = "X-Tenant-ID"
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """Still rate limited after every retry."""
+
+
+def _retry_after(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait after a 429: Retry-After, else X-RateLimit-Reset, else exponential backoff."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            pass
+    return min(CLIENT_BACKOFF_MAX_SECONDS, 2 ** attempt)
+
+
+def _read(file) -> tuple[str, bytes]:
+    """A path, or an already loaded (filename, content) pair."""
+    if isinstance(file, tuple):
+        return file
+    path = Path(file)
+    return path.name, path.read_bytes()
+
+
+class InvoiceClient:
+    def __init__(
+        self,
+        base_url: str = API_URL,
+        max_concurrency: int = CLIENT_MAX_CONCURRENCY,
+        timeout: float = CLIENT_TIMEOUT_SECONDS,
+        max_retries: int = CLIENT_MAX_RETRIES,
+        tenant: str | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._resume_at = 0.0
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            headers={TENANT_HEADER: tenant} if tenant else None,
+            # The uploads, plus an event stream and a status poll
+            limits=httpx.Limits(max_connections=max_concurrency + 2),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "InvoiceClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    def _pause_until(self, resume_at: float):
+        self._resume_at = max(self._resume_at, resume_at)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Sends one request, waiting out 429s. Every request of this client waits out the same window."""
+        for attempt in range(self.max_retries + 1):
+            delay = self._resume_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            response = await self._http.request(method, url, **kwargs)
+            if response.status_code != 429:
+                if response.headers.get("X-RateLimit-Remaining") == "0":
+                    # Last request of the window: hold the next ones instead of collecting a 429
+                    self._pause_until(time.time() + _retry_after(response, attempt))
+                return response
+
+            wait = _retry_after(response, attempt)
+            logger.info(f"Rate limited on {url}, retrying in {wait:.1f}s")
+            # A little jitter so the paused uploads do not all hit the new window at once
+            self._pause_until(time.time() + wait + random.uniform(0, 0.5))
+        raise RateLimited(f"{method} {url} still rate limited after {self.max_retries} retries")
+
+    # --- Submission ---
+
+    async def submit(self, file, callback_url: str | None = None) -> dict:
+        """
+        Queues one PDF and returns the API's answer (task_id, queue, preflight). A file rejected
+        by preflight or refused by the API comes back as {"filename", "status": "failed", "error"}.
+        """
+        filename, content = await asyncio.to_thread(_read, file)
+        data = {"callback_url": callback_url} if callback_url else None
+        async with self._semaphore:
+            try:
+                response = await self._request(
+                    "POST", "/invoices/validate", files={"file": (filename, content, "application/pdf")}, data=data,
+                )
+            except (httpx.HTTPError, RateLimited) as e:
+                return {"filename": filename, "status": "failed", "error": str(e)}
+
+        if response.is_success:
+            return {"filename": filename, **response.json()}
+        detail = response.json().get("detail") if response.headers.get("content-type") == "application/json" else None
+        message = detail.get("message") if isinstance(detail, dict) else detail or response.text
+        return {"filename": filename, "status": "failed", "status_code": response.status_code, "error": message}
+
+    async def submit_many(self, files: Iterable, callback_url: str | None = None) -> List[dict]:
+        """Uploads every file concurrently (max_concurrency at a time); answers come back in input order."""
+        return await asyncio.gather(*(self.submit(file, callback_url) for file in files))
+
+    async def submit_batch(self, files: Iterable, callback_url: str | None = None) -> dict:
+        """One POST /invoices/validate/batch with every file; the batch id can be awaited like a task."""
+        loaded = [await asyncio.to_thread(_read, file) for file in files]
+        response = await self._request(
+            "POST", "/invoices/validate/batch",
+            files=[("files", (filename, content, "application/pdf")) for filename, content in loaded],
+            data={"callback_url": callback_url} if callback_url else None,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    # --- Results ---
+
+    async def status(self, task_ids: List[str], include_data: bool = False) -> List[dict]:
+        """Compact status of every task, one POST /invoices/status per STATUS_MAX_IDS ids."""
+        chunks = [task_ids[i:i + STATUS_MAX_IDS] for i in range(0, len(task_ids), STATUS_MAX_IDS)]
+
+        async def fetch(chunk: List[str]) -> List[dict]:
+            response = await self._request("POST", "/invoices/status", json={"ids": chunk, "include_data": include_data})
+            response.raise_for_status()
+            return response.json()["tasks"]
+
+        return [task for tasks in await asyncio.gather(*(fetch(chunk) for chunk in chunks)) for task in tasks]
+
+    async def events(self, task_ids: List[str]) -> AsyncIterator[dict]:
+        """Finished tasks from GET /invoices/events as they arrive. Ends when the server closes the stream."""
+        async with aconnect_sse(self._http, "GET", "/invoices/events", params={"ids": ",".join(task_ids)}, timeout=None) as source:
+            source.response.raise_for_status()
+            async for event in source.aiter_sse():
+                if event.event == "task":
+                    yield json.loads(event.data)
+
+    async def _pump_events(self, task_ids: List[str], queue: asyncio.Queue):
+        """Copies events into `queue`, then None when the stream ends or the error that ended it."""
+        try:
+            async for event in self.events(task_ids):
+                queue.put_nowait(event)
+            queue.put_nowait(None)
+        except httpx.HTTPError as e:
+            queue.put_nowait(e)
+
+    async def as_completed(
+        self, task_ids: List[str], timeout: float | None = None, poll_interval: float = 2.0, stream: bool = True,
+    ) -> AsyncIterator[dict]:
+        """
+        Yields {"task_id", "status": "completed" | "failed", "data" | "error"} for each task as it finishes.
+        Streams events for up to SSE_MAX_IDS pending tasks and polls the bulk status otherwise, or
+        when streaming fails. Stops silently at `timeout`, leaving the rest pending.
+        """
+        pending = set(task_ids)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while pending and (deadline is None or time.monotonic() < deadline):
+            if stream and len(pending) <= SSE_MAX_IDS:
+                # The stream is read by its own task so the deadline holds between events too
+                queue = asyncio.Queue()
+                reader = asyncio.create_task(self._pump_events(sorted(pending), queue))
+                received = 0
+                try:
+                    while True:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        try:
+                            event = await asyncio.wait_for(queue.get(), remaining)
+                        except asyncio.TimeoutError:
+                            return
+                        if event is None:
+                            break
+                        if isinstance(event, Exception):
+                            logger.warning(f"Event stream failed, polling instead: {event}")
+                            stream = False
+                            break
+                        if event["task_id"] in pending:
+                            pending.discard(event["task_id"])
+                            received += 1
+                            yield event
+                finally:
+                    reader.cancel()
+                if received:
+                    continue  # The server closed a productive stream: reconnect for the rest
+
+            for task in await self.status(sorted(pending), include_data=True):
+                if task["status"] != "pending":
+                    pending.discard(task["task_id"])
+                    yield task
+            if pending:
+                await asyncio.sleep(poll_interval)
+
+    async def wait_all(
+        self, task_ids: List[str], timeout: float | None = None, poll_interval: float = 2.0, stream: bool = True,
+    ) -> dict:
+        """Task id -> final status of every task; tasks still running at `timeout` are {"status": "pending"}."""
+        results = {task_id: {"task_id": task_id, "status": "pending"} for task_id in task_ids}
+        async for result in self.as_completed(task_ids, timeout, poll_interval, stream):
+            results[result["task_id"]] = result
+        return results
@@ -0,0 +1,104 @@
+import os
+import logging
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from app.core.redis_client import get_redis
+
+# Workers serve their metrics on this port; the API exposes them on GET /metrics.
+# The worker runs the threads pool, so one process holds every counter. A prefork
+# pool would need prometheus_client's multiprocess mode (PROMETHEUS_MULTIPROC_DIR).
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages last from milliseconds (rules, validation) to a minute (multi-chunk LLM calls)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# --- 1. Pipeline ---
+
+STAGE_SECONDS = Histogram(
+    "invoice_stage_seconds", "Time spent in each stage of process_invoice", ["stage"], buckets=STAGE_BUCKETS,
+)
+CACHE_REQUESTS = Counter("extraction_cache_requests_total", "Extraction cache lookups", ["result"])
+INVOICE_RESULTS = Counter("invoice_results_total", "Processed invoices by outcome", ["status"])
+PDF_TEXT_SECONDS = Histogram("pdf_text_seconds", "Text layer extraction time per invoice", ["backend"], buckets=STAGE_BUCKETS)
+PDF_TEXT_QUALITY = Counter("pdf_text_quality_total", "Whether the seller ICE and IF survived text extraction", ["backend", "result"])
+OCR_PAGES = Counter("ocr_pages_total", "Pages without a text layer sent through OCR", ["source"])
+INVOICE_ISSUES = Counter("invoice_issues_total", "Validation issues raised", ["error_type"])
+DEADLINE_EXCEEDED = Counter("stage_deadline_exceeded_total", "Pipeline stages abandoned at their deadline", ["stage"])
+
+# --- 2. LLM ---
+
+LLM_IN_FLIGHT = Gauge("llm_requests_in_flight", "LLM requests currently awaiting vLLM")
+LLM_REQUEST_SECONDS = Histogram("llm_request_seconds", "Latency of one LLM request", buckets=STAGE_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by vLLM", ["kind"])
+LLM_ERRORS = Counter("llm_errors_total", "LLM requests that raised")
+LLM_OUTPUT_TOKENS = Histogram(
+    "llm_output_tokens", "Completion tokens of one extraction answer", ["mode"],
+    buckets=(16, 32, 64, 128, 192, 256, 384, 512, 640, 1024),
+)
+LLM_PARSE_FAILURES = Counter("llm_parse_failures_total", "Extraction answers that did not parse into the schema", ["mode"])
+LLM_CONCURRENCY_LIMIT = Gauge("llm_concurrency_limit", "In-flight LLM requests the adaptive limiter currently allows")
+LLM_LIMITER_WAIT_SECONDS = Histogram("llm_limiter_wait_seconds", "Time spent waiting for an LLM slot", buckets=STAGE_BUCKETS)
+LLM_SHED = Counter("llm_shed_total", "LLM calls given up because no slot freed in time")
+LLM_CIRCUIT_STATE = Gauge("llm_circuit_state", "LLM circuit breaker: 0 closed, 1 half-open, 2 open")
+
+# --- 3. Queue ---
+
+TASK_RETRIES = Counter("invoice_retries_total", "Invoices re-run after a transient failure", ["error"])
+QUEUE_WAIT_SECONDS = Histogram(
+    "celery_queue_wait_seconds", "Time between publishing a task and a worker starting it", ["task"],
+    buckets=STAGE_BUCKETS,
+)
+
+
+def record_outcome(result: dict) -> None:
+    """Counts a finished invoice: result is a ValidationResult dump or a failed-task dict."""
+    if "error" in result:
+        INVOICE_RESULTS.labels("failed").inc()
+        return
+
+    INVOICE_RESULTS.labels("valid" if result.get("is_valid") else "invalid").inc()
+    for issue in result.get("issues", []):
+        error_type = issue["error_type"]
+        INVOICE_ISSUES.labels(getattr(error_type, "value", error_type)).inc()
+
+
+class QueueDepthCollector:
+    """Reads the broker queue lengths at scrape time, so the gauge is never stale."""
+
+    def __init__(self, queues: dict):
+        # Queue name -> the broker lists behind it (one per priority step)
+        self.queues = dict(queues)
+
+    def describe(self):
+        # Lets the registry check names without a broker round trip at registration
+        yield GaugeMetricFamily("celery_queue_depth", "Tasks waiting in the broker", labels=["queue"])
+
+    def collect(self):
+        depth = GaugeMetricFamily("celery_queue_depth", "Tasks waiting in the broker", labels=["queue"])
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for lists in self.queues.values():
+                for name in lists:
+                    pipe.llen(name)
+            lengths = iter(pipe.execute())
+            for queue, lists in self.queues.items():
+                depth.add_metric([queue], sum(next(lengths) for _ in lists))
+        except Exception as e:
+            logger.warning(f"Could not read queue depth: {e}")
+        yield depth
+
+
+_queue_collector_registered = False
+
+def register_queue_depth(queues: dict) -> None:
+    global _queue_collector_registered
+    if not _queue_collector_registered:
+        REGISTRY.register(QueueDepthCollector(queues))
+        _queue_collector_registered = True
+
+
+def start_worker_metrics_server(port: int = WORKER_METRICS_PORT) -> None:
+    start_http_server(port)
+    logger.info(f"Worker metrics served on :{port}/metrics")
@@ -0,0 +1,23 @@
+import os
+import redis
+import redis.asyncio
+
+REDIS_URL = os.getenv("REDIS_URL", os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0"))
+
+
+_cached_redis = None
+
+def get_redis() -> redis.Redis:
+    global _cached_redis
+    if _cached_redis is None:
+        _cached_redis = redis.Redis.from_url(REDIS_URL)
+    return _cached_redis
+
+
+_cached_async_redis = None
+
+def get_async_redis() -> redis.asyncio.Redis:
+    global _cached_async_redis
+    if _cached_async_redis is None:
+        _cached_async_redis = redis.asyncio.Redis.from_url(REDIS_URL)
+    return _cached_async_redis
@@ -1,5 +1,70 @@
+import json
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+# X-RateLimit-Limit/Remaining/Reset on every limited response and Retry-After on 429s: clients pace themselves on them
+limiter = Limiter(key_func=get_remote_address, headers_enabled=True)
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """
+    Caps the request body of the upload endpoints before it is received. Starlette spools a
+    multipart body to a temporary file before the handler runs, so a limit checked in the
+    handler would only apply once the whole upload had been accepted. A declared
+    Content-Length over the limit is refused without reading the body; a chunked body is
+    counted as it arrives and cut off at the limit.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await self._refuse(send, limit)
+
+        received = 0
+        exceeded = refused = False
+
+        async def counting_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > limit:
+                exceeded = True
+                raise BodyTooLarge()
+            return message
+
+        async def refusing_send(message):
+            # The body parser turns the interruption into its own error response: answer 413 instead
+            nonlocal refused
+            if not exceeded:
+                return await send(message)
+            if not refused:
+                refused = True
+                await self._refuse(send, limit)
+
+        try:
+            await self.app(scope, counting_receive, refusing_send)
+        except BodyTooLarge:
+            if not refused:
+                await self._refuse(send, limit)
+
+    @staticmethod
+    async def _refuse(send, limit: int):
+        body = json.dumps({"detail": f"Request body exceeds the {limit // (1024 * 1024)} MB limit."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
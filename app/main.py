@@ -1,11 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.core.logging import setup_logging
-from app.routers import invoices
+from app.routers import invoices, results
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from app.core.security import limiter
+from app.core.security import BodySizeLimitMiddleware, limiter
+from app.core.metrics import register_queue_depth
+from app.celery_app import QUEUES, broker_lists
 
 
 
@@ -35,10 +38,20 @@ app.add_middleware(
     allowed_hosts=["localhost", "127.0.0.1", "0.0.0.0", "*"]
 )
 
+app.add_middleware(BodySizeLimitMiddleware, limits=invoices.UPLOAD_BODY_LIMITS)
+
 app.include_router(invoices.router)
+app.include_router(results.router)
+
+register_queue_depth({queue: broker_lists(queue) for queue in QUEUES})
 
 
 
 @app.get("/")
 def health_check():
-    return {"status": "ok", "version": "1.0.0"}
\ No newline at end of file
+    return {"status": "ok", "version": "1.0.0"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
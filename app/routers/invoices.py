@@ -1,53 +1,188 @@
-from fastapi import APIRouter, UploadFile, HTTPException, Request
+from fastapi import APIRouter, UploadFile, HTTPException, Request, Response, Form, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile as FormFile
 from pathlib import Path
-from app.worker import process_invoice_task
+from typing import List
+from celery import chord, group
 from celery.result import AsyncResult
-from app.celery_app import celery_app
+from app.celery_app import (
+    celery_app, PROCESS_INVOICE_TASK, PROCESS_INVOICE_CHUNK_TASK, AGGREGATE_BATCH_TASK, BATCH_FAILED_TASK,
+    BATCH_KEY_PREFIX, BULK_QUEUE,
+)
+from app.core.redis_client import get_redis, get_async_redis
+from app.services.notifications import EVENT_CHANNEL_PREFIX, UnsafeCallbackUrl, check_callback_url
+from app.services.blob_store import MAX_UPLOAD_BYTES, BlobWriter, NotAPdfError, UploadTooLargeError, get_blob_store, store_stream
+from app.services.preflight import preflight
+from app.services.scheduling import TENANT_HEADER, arelease_slots, choose_queue, reserve_slots, tenant_headers, tenant_of
+from app.schemas.invoices import TaskStatusQuery, PreflightDecision, PreflightReport
 from app.core.security import limiter
+from slowapi.util import get_remote_address
 import os
-import shutil
+import json
+import asyncio
 import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 
 router = APIRouter(prefix="/invoices", tags=["Invoices"])
 
-UPLOAD_DIR = Path("temp")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "5000"))
+# > 0 groups batch invoices into chunks processed concurrently on one worker event loop
+BATCH_ASYNC_CHUNK_SIZE = int(os.getenv("BATCH_ASYNC_CHUNK_SIZE", "0"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_MAX_WAIT_SECONDS = float(os.getenv("EVENTS_MAX_WAIT_SECONDS", "900"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Blobs of one batch checked at once: fetching them from object storage is mostly waiting
+PREFLIGHT_THREADS = int(os.getenv("PREFLIGHT_THREADS", "8"))
+# Whole request bodies, enforced by BodySizeLimitMiddleware before they are received.
+# A single upload gets room for the multipart framing and the callback_url field.
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+UPLOAD_BODY_LIMITS = {
+    f"{router.prefix}/validate": MAX_UPLOAD_BYTES + 64 * 1024,
+    f"{router.prefix}/validate/batch": BATCH_MAX_UPLOAD_BYTES,
+}
+
+
+async def _check_callback_url(callback_url: str | None):
+    if not callback_url:
+        return
+    try:
+        await asyncio.to_thread(check_callback_url, callback_url)
+    except UnsafeCallbackUrl as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _ingestion_error(name: str, error: Exception) -> HTTPException:
+    if isinstance(error, UploadTooLargeError):
+        return HTTPException(status_code=413, detail=f"'{name}': {error}")
+    if isinstance(error, NotAPdfError):
+        return HTTPException(status_code=415, detail=f"'{name}': {error}")
+    return HTTPException(status_code=500, detail=f"Could not save '{name}': {error}")
+
+
+async def _ingest_upload(file: UploadFile) -> str:
+    """
+    Copies an upload into the blob store chunk by chunk and returns its content digest.
+    Starlette has already spooled the body to a temporary file by then; its size was capped
+    on the way in by BodySizeLimitMiddleware.
+    """
+    writer = await asyncio.to_thread(BlobWriter, get_blob_store())
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            await asyncio.to_thread(writer.write, chunk)
+        return await asyncio.to_thread(writer.commit)
+    except Exception as e:
+        writer.abort()
+        raise _ingestion_error(file.filename, e)
+
+
+def _ingest_zip(file: UploadFile) -> List[tuple[str, str]]:
+    name = file.filename
+    try:
+        archive = zipfile.ZipFile(file.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"'{name}' is not a valid zip archive.")
+
+    stored = []
+    with archive:
+        for entry in archive.infolist():
+            entry_name = Path(entry.filename).name
+            if entry.is_dir() or entry.filename.startswith("__MACOSX") or not entry_name.lower().endswith(".pdf"):
+                continue
+            try:
+                with archive.open(entry) as source:
+                    stored.append((store_stream(source, get_blob_store()), entry_name))
+            except Exception as e:
+                raise _ingestion_error(f"{name}/{entry_name}", e)
+
+            if len(stored) > BATCH_MAX_FILES:
+                break
+    return stored
+
+
+async def _ingest_uploads(files: List[UploadFile]) -> List[tuple[str, str]]:
+    """Stores every PDF of the request, unpacking zip archives. Returns (digest, original name) pairs."""
+    stored = []
+    for file in files:
+        name = file.filename or ""
+
+        if name.lower().endswith(".pdf"):
+            stored.append((await _ingest_upload(file), Path(name).name))
+        elif name.lower().endswith(".zip"):
+            stored += await asyncio.to_thread(_ingest_zip, file)
+        else:
+            raise HTTPException(status_code=400, detail=f"'{name}': only PDF files and zip archives are allowed.")
+
+        if len(stored) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"A batch is limited to {BATCH_MAX_FILES} invoices.")
+
+    return stored
+
+
+def _preflight_blob(digest: str) -> PreflightReport:
+    """
+    Rejected blobs are left to the blob sweeper: blobs are shared by identical uploads, so a
+    concurrent upload of the same file may still be checking this one.
+    """
+    with get_blob_store().fetch(digest) as path:
+        return preflight(path)
+
+
+def _preflight_blobs(digests: List[str]) -> List[PreflightReport]:
+    # A batch may repeat a file: each blob is checked once
+    unique = list(dict.fromkeys(digests))
+    with ThreadPoolExecutor(max_workers=min(PREFLIGHT_THREADS, len(unique)), thread_name_prefix="preflight") as pool:
+        reports = dict(zip(unique, pool.map(_preflight_blob, unique)))
+    return [reports[digest] for digest in digests]
 
 
 
 @router.post("/validate")
 @limiter.limit("60/minute")
-def validate_invoice_endpoint(request: Request, file: UploadFile):
+async def validate_invoice_endpoint(request: Request, response: Response, file: UploadFile, callback_url: str | None = Form(None)):
 
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
-    
-    path = Path(file.filename)
-    filename = path.name
-    extension = path.suffix
-    unique_filename = f"{uuid.uuid4()}{extension}"
 
-    save_to = UPLOAD_DIR / unique_filename
-    
+    await _check_callback_url(callback_url)
+
+    filename = Path(file.filename).name
+
     try:
-        with open(save_to, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        digest = await _ingest_upload(file)
 
-        task = process_invoice_task.delay(str(save_to))
+        report = await asyncio.to_thread(_preflight_blob, digest)
+        if report.decision == PreflightDecision.REJECT:
+            raise HTTPException(status_code=422, detail={"message": report.reason, "preflight": report.model_dump(mode="json")})
+
+        tenant = tenant_of(get_remote_address(request), request.headers.get(TENANT_HEADER))
+        queue = choose_queue(report)
+        [priority], bucket = await reserve_slots(tenant, queue, 1)
+        try:
+            task = await asyncio.to_thread(
+                celery_app.send_task, PROCESS_INVOICE_TASK, args=[digest, filename, callback_url],
+                queue=queue, priority=priority, headers=tenant_headers(tenant, queue, 1, bucket),
+            )
+        except Exception:
+            # No worker will ever release a slot for a task that was never published
+            await arelease_slots(tenant, queue, 1, bucket)
+            raise
 
         return {
             "task_id": task.id,
             "status": "processing started",
-            "message": f"Check results at GET /invoices/status/{task.id}"
+            "queue": queue,
+            "preflight": report.model_dump(mode="json"),
+            "message": f"Check results at GET /invoices/status/{task.id} or stream GET /invoices/events?ids={task.id}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        if save_to.exists():
-            os.remove(save_to)
-        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not queue file: {e}")
     
     finally:
-        file.file.close()
+        await file.close()
 
 
 
@@ -63,3 +198,290 @@ def get_task_status(task_id: str):
     else:
         return {"status": "pending"}
 
+
+
+STATUS_MAX_IDS = 1000
+
+
+def _fetch_task_metas(task_ids: List[str]) -> List[dict | None]:
+    """Reads the stored state of many tasks in a single MGET round trip to the result backend."""
+    backend = celery_app.backend
+    raw_values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    return [backend.decode_result(raw) if raw is not None else None for raw in raw_values]
+
+
+def _compact_status(task_id: str, meta: dict | None, include_data: bool) -> dict:
+    state = meta["status"] if meta else "PENDING"
+
+    if state == "SUCCESS":
+        result = meta["result"]
+        entry = {
+            "task_id": task_id,
+            "status": "completed",
+            "filename": result.get("filename"),
+            "is_valid": result.get("is_valid"),
+            "issues_count": len(result.get("issues", [])),
+        }
+        if "error" in result:
+            entry["error"] = result["error"]
+        if include_data:
+            entry["data"] = result
+        return entry
+
+    if state == "FAILURE":
+        return {"task_id": task_id, "status": "failed", "error": str(meta["result"])}
+
+    return {"task_id": task_id, "status": "pending"}
+
+
+def _bulk_status(task_ids: List[str], include_data: bool) -> dict:
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one task id.")
+    if len(task_ids) > STATUS_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {STATUS_MAX_IDS} task ids per request.")
+
+    tasks = [
+        _compact_status(task_id, meta, include_data)
+        for task_id, meta in zip(task_ids, _fetch_task_metas(task_ids))
+    ]
+
+    counts = {"completed": 0, "failed": 0, "pending": 0}
+    for task in tasks:
+        counts[task["status"]] += 1
+
+    return {"total": len(tasks), **counts, "tasks": tasks}
+
+
+@router.get("/status")
+def get_many_task_status(
+    ids: str = Query(..., description="Comma-separated task ids"),
+    include_data: bool = Query(False, description="Include the full extraction payload"),
+):
+    return _bulk_status([task_id for task_id in ids.split(",") if task_id], include_data)
+
+
+@router.post("/status")
+def post_many_task_status(query: TaskStatusQuery):
+    return _bulk_status(query.ids, query.include_data)
+
+
+
+async def _task_events(task_ids: List[str]):
+    """
+    Yields one event per task as it finishes (None on every heartbeat tick).
+    Subscribes before looking at stored results so a task finishing in between
+    is never missed; pending tasks are re-checked on each heartbeat as a fallback.
+    """
+    pending = set(task_ids)
+    pubsub = get_async_redis().pubsub()
+    await pubsub.subscribe(*[EVENT_CHANNEL_PREFIX + task_id for task_id in task_ids])
+
+    async def finished_from_backend():
+        for task_id in list(pending):
+            payload = await asyncio.to_thread(get_task_status, task_id)
+            if payload["status"] != "pending":
+                pending.discard(task_id)
+                yield {"task_id": task_id, **payload}
+
+    try:
+        async for event in finished_from_backend():
+            yield event
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + EVENTS_MAX_WAIT_SECONDS
+
+        while pending and loop.time() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=EVENTS_HEARTBEAT_SECONDS)
+            if message is None:
+                async for event in finished_from_backend():
+                    yield event
+                yield None
+                continue
+
+            event = json.loads(message["data"])
+            if event["task_id"] in pending:
+                pending.discard(event["task_id"])
+                yield event
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+
+def _parse_ids(ids: str) -> List[str]:
+    task_ids = [task_id for task_id in ids.split(",") if task_id]
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one task id in 'ids'.")
+    if len(task_ids) > STATUS_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {STATUS_MAX_IDS} task ids per request.")
+    return task_ids
+
+
+@router.get("/events")
+async def stream_task_events(ids: str = Query(..., description="Comma-separated task or batch ids")):
+    """Server-Sent Events: one 'task' event per id as soon as it finishes, then the stream closes."""
+    task_ids = _parse_ids(ids)
+
+    async def event_stream():
+        async for event in _task_events(task_ids):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: task\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def task_events_websocket(websocket: WebSocket, ids: str):
+    """WebSocket variant of GET /invoices/events: sends each finished task as a JSON message."""
+    # Raised before the handshake completes, the 400 is sent as the HTTP denial response
+    task_ids = _parse_ids(ids)
+    await websocket.accept()
+    try:
+        async for event in _task_events(task_ids):
+            if event is not None:
+                await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+
+async def _batch_form(request: Request) -> tuple[List[UploadFile], str | None]:
+    """
+    The batch's files and callback_url. Parsed here rather than declared as parameters:
+    FastAPI's own parsing stops at Starlette's default of 1000 files per request.
+    """
+    form = await request.form(max_files=BATCH_MAX_FILES)
+    files = [value for value in form.getlist("files") if isinstance(value, FormFile)]
+    callback_url = form.get("callback_url")
+    return files, callback_url if isinstance(callback_url, str) and callback_url else None
+
+
+@router.post("/validate/batch")
+@limiter.limit("10/minute")
+async def validate_batch_endpoint(request: Request, response: Response):
+    """Multipart form: one or more 'files' (PDFs or zip archives of PDFs) and an optional 'callback_url'."""
+    files, callback_url = await _batch_form(request)
+    await _check_callback_url(callback_url)
+
+    batch_id = str(uuid.uuid4())
+    batch_kwargs = {"batch_id": batch_id, "callback_url": callback_url}
+    # A failed invoice fails the chord: the error callback then reports the batch instead of the body
+    summary_task = celery_app.signature(AGGREGATE_BATCH_TASK, kwargs=batch_kwargs).on_error(
+        celery_app.signature(BATCH_FAILED_TASK, kwargs=batch_kwargs)
+    )
+    try:
+        stored = await _ingest_uploads(files)
+        if not stored:
+            raise HTTPException(status_code=400, detail="No PDF files found in the request.")
+
+        reports = await asyncio.to_thread(_preflight_blobs, [digest for digest, _ in stored])
+        rejected = [
+            {"filename": filename, "preflight": report.model_dump(mode="json")}
+            for (_, filename), report in zip(stored, reports) if report.decision == PreflightDecision.REJECT
+        ]
+        stored = [pair for pair, report in zip(stored, reports) if report.decision != PreflightDecision.REJECT]
+        if not stored:
+            raise HTTPException(status_code=422, detail={"message": "Every file failed preflight.", "rejected": rejected})
+
+        # Batches always go to the bulk queue, prioritised against the tenant's own backlog there
+        tenant = tenant_of(get_remote_address(request), request.headers.get(TENANT_HEADER))
+        priorities, bucket = await reserve_slots(tenant, BULK_QUEUE, len(stored))
+        try:
+            if BATCH_ASYNC_CHUNK_SIZE > 0:
+                tasks = [{"filename": filename, "task_id": str(uuid.uuid4())} for _, filename in stored]
+                invoices = [{"digest": digest, "callback_url": callback_url, **task} for (digest, _), task in zip(stored, tasks)]
+                starts = range(0, len(invoices), BATCH_ASYNC_CHUNK_SIZE)
+                chunks = [invoices[i:i + BATCH_ASYNC_CHUNK_SIZE] for i in starts]
+
+                header = group([
+                    celery_app.signature(PROCESS_INVOICE_CHUNK_TASK, args=[chunk]).set(
+                        queue=BULK_QUEUE, priority=priorities[i], headers=tenant_headers(tenant, BULK_QUEUE, len(chunk), bucket),
+                    )
+                    for i, chunk in zip(starts, chunks)
+                ])
+                summary = await asyncio.to_thread(chord(header, summary_task).apply_async, task_id=batch_id)
+            else:
+                header = group([
+                    celery_app.signature(PROCESS_INVOICE_TASK, args=[digest, filename, callback_url]).set(
+                        queue=BULK_QUEUE, priority=priority, headers=tenant_headers(tenant, BULK_QUEUE, 1, bucket),
+                    )
+                    for (digest, filename), priority in zip(stored, priorities)
+                ])
+                summary = await asyncio.to_thread(chord(header, summary_task).apply_async, task_id=batch_id)
+
+                tasks = [
+                    {"filename": filename, "task_id": child.id}
+                    for (_, filename), child in zip(stored, summary.parent.results)
+                ]
+        except Exception:
+            await arelease_slots(tenant, BULK_QUEUE, len(stored), bucket)
+            raise
+
+        # The chord body runs under the batch id, so the batch can be polled or streamed like a task
+        manifest = {"summary_task_id": summary.id, "tasks": tasks}
+        await get_async_redis().set(BATCH_KEY_PREFIX + batch_id, json.dumps(manifest), ex=celery_app.conf.result_expires)
+
+        return {
+            "batch_id": batch_id,
+            "status": "processing started",
+            "total": len(tasks),
+            "tasks": tasks,
+            "rejected": rejected,
+            "message": f"Check progress at GET /invoices/batch/{batch_id} or stream GET /invoices/events?ids={batch_id}"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not start batch: {e}")
+
+    finally:
+        for file in files:
+            await file.close()
+
+
+
+@router.get("/batch/{batch_id}")
+def get_batch_status(batch_id: str):
+    raw = get_redis().get(BATCH_KEY_PREFIX + batch_id)
+    if raw is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired batch id.")
+
+    manifest = json.loads(raw)
+
+    task_ids = [task["task_id"] for task in manifest["tasks"]]
+    *statuses, summary_meta = _fetch_task_metas(task_ids + [manifest["summary_task_id"]])
+
+    files = []
+    counts = {"completed": 0, "failed": 0, "pending": 0}
+    for task, meta in zip(manifest["tasks"], statuses):
+        status = _compact_status(task["task_id"], meta, include_data=False)
+        if "error" in status:
+            status["status"] = "failed"
+        counts[status["status"]] += 1
+        files.append({**status, **task})
+
+    # The summary task fails (ChordError) when any invoice failed; the batch is finished all the same
+    is_done = summary_meta is not None and summary_meta["status"] in ("SUCCESS", "FAILURE")
+    if not is_done:
+        summary = None
+    elif summary_meta["status"] == "SUCCESS":
+        summary = {k: v for k, v in summary_meta["result"].items() if k != "results"}
+    else:
+        valid = sum(1 for file in files if file.get("is_valid") is True)
+        summary = {"total": len(files), "valid": valid, "invalid": counts["completed"] - valid, "failed": counts["failed"]}
+
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if is_done else "processing",
+        "total": len(files),
+        **counts,
+        "files": files,
+        # Per-invoice payloads stay behind GET /invoices/status/{task_id}
+        "summary": summary,
+    }
@@ -0,0 +1,68 @@
+import json
+from datetime import date
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.core.security import limiter
+
+
+router = APIRouter(prefix="/invoices/results", tags=["Results"])
+
+# The store is imported inside the handlers: SQLAlchemy alone would add ~0.4 s to the API cold start
+
+
+@router.get("")
+def list_results(
+    seller_ice: str | None = None,
+    client_ice: str | None = None,
+    invoice_number: str | None = None,
+    date_from: date | None = Query(None, description="Invoice date lower bound (YYYY-MM-DD)"),
+    date_to: date | None = Query(None, description="Invoice date upper bound (YYYY-MM-DD)"),
+    is_valid: bool | None = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+    include_data: bool = Query(False, description="Include issues and the full extraction"),
+):
+    from app.services.results_store import query_results
+
+    return query_results(
+        seller_ice=seller_ice, client_ice=client_ice, invoice_number=invoice_number,
+        date_from=date_from, date_to=date_to, is_valid=is_valid,
+        page=page, page_size=page_size, include_data=include_data,
+    )
+
+
+@router.post("/revalidate")
+@limiter.limit("2/minute")
+def revalidate_results(
+    request: Request,
+    seller_ice: str | None = None,
+    client_ice: str | None = None,
+    invoice_number: str | None = None,
+    date_from: date | None = Query(None, description="Invoice date lower bound (YYYY-MM-DD)"),
+    date_to: date | None = Query(None, description="Invoice date upper bound (YYYY-MM-DD)"),
+    is_valid: bool | None = None,
+    full: bool = Query(False, description="Re-run every rule, not only those whose version changed"),
+    dry_run: bool = Query(True, description="Report the diff without updating the stored results; false writes it back"),
+):
+    """
+    Replays the current rules over stored extractions, without the LLM. Streams NDJSON:
+    one line per result whose issues changed, then a summary with per-rule timings.
+    Only reports by default: rewriting the stored results takes an explicit dry_run=false.
+    """
+    from app.services.revalidation import revalidate
+
+    lines = revalidate(
+        full=full, dry_run=dry_run, seller_ice=seller_ice, client_ice=client_ice,
+        invoice_number=invoice_number, date_from=date_from, date_to=date_to, is_valid=is_valid,
+    )
+    return StreamingResponse((json.dumps(line) + "\n" for line in lines), media_type="application/x-ndjson")
+
+
+@router.get("/{result_id}")
+def get_stored_result(result_id: int):
+    from app.services.results_store import get_result
+
+    result = get_result(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Result {result_id} not found.")
+    return result
@@ -23,9 +23,10 @@ class InvoiceItem(BaseModel):
     total_line: float = Field(..., description="Total price for this line (qty * unit_price)")
 
 class Financials(BaseModel):
-    total_ht: float = Field(..., description="Total amount excluding tax")
-    total_tva: float = Field(..., description="Total tax amount")
-    total_ttc: float = Field(..., description="Total amount including tax (Total to pay)")
+    # Null when the document does not state it: the validator reports it missing
+    total_ht: Optional[float] = Field(None, description="Total amount excluding tax")
+    total_tva: Optional[float] = Field(None, description="Total tax amount")
+    total_ttc: Optional[float] = Field(None, description="Total amount including tax (Total to pay)")
 
 # --- 2. The Main Input Model (What the AI extracts) ---
 
@@ -46,6 +47,7 @@ class ErrorType(str, Enum):
     CRITICAL_COMPLIANCE = "CRITICAL_COMPLIANCE"  # Legal failures (Missing ICE)
     MATH_MISMATCH = "MATH_MISMATCH"              # Calculation failures (HT + TVA != TTC)
     MISSING_DATA = "MISSING_DATA"                # OCR failures (No Date, No Total)
+    DUPLICATE_INVOICE = "DUPLICATE_INVOICE"      # Same seller, number and total already submitted
     
     # 🟡 WARNINGS (The Invoice is Valid, but suspicious)
     SUSPICIOUS_VALUE = "SUSPICIOUS_VALUE"        # Weird Tax Rate (e.g., 18%), Future Date
@@ -55,10 +57,32 @@ class ValidationIssue(BaseModel):
     field: str
     error_type: ErrorType
     message: str
+    rule: Optional[str] = Field(None, description="Validator rule that raised the issue")
 
 class ValidationResult(BaseModel):
     is_valid: bool
     filename: str
     issues: List[ValidationIssue]
     # We include the extracted data so the user can see what was scanned
-    extracted_data: InvoiceExtractedData
\ No newline at end of file
+    extracted_data: InvoiceExtractedData
+
+# --- 4. API Request Models ---
+
+class TaskStatusQuery(BaseModel):
+    ids: List[str] = Field(..., description="Task ids to look up", max_length=1000)
+    include_data: bool = Field(False, description="Include the full extraction payload of finished tasks")
+
+# --- 5. Upload Preflight ---
+
+class PreflightDecision(str, Enum):
+    ACCEPT = "ACCEPT"    # Has a text layer and fits the limits: queued for the pipeline
+    OCR = "OCR"          # Scanned or image-only: queued, pages are recognised with Tesseract
+    REJECT = "REJECT"    # Corrupt, encrypted, oversized, or scanned while OCR is disabled
+
+class PreflightReport(BaseModel):
+    decision: PreflightDecision
+    reason: Optional[str] = Field(None, description="Why the file was rejected")
+    pages: int = 0
+    encrypted: bool = False
+    has_text_layer: bool = False
+    estimated_tokens: int = Field(0, description="Estimated prompt tokens of the whole text layer")
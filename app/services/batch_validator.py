@@ -0,0 +1,301 @@
+import logging
+import numpy as np
+from typing import List
+from datetime import datetime, timedelta
+from app.schemas.invoices import InvoiceExtractedData, ValidationIssue, ErrorType
+
+logger = logging.getLogger(__name__)
+
+VALID_TVA_RATES = np.array([0.20, 0.14, 0.10, 0.07, 0.00])
+
+
+class InvoiceColumns:
+    """
+    Columnar view of many extracted invoices: one NumPy array per field.
+    Line items are flattened into their own arrays, linked back by item_invoice.
+    Build it with from_invoices (Pydantic objects) or from_records (stored JSON dicts,
+    which skips model validation entirely for large re-audits).
+    """
+
+    def __init__(self, rows: dict, items: dict):
+        self.size = len(rows["seller_ice"])
+
+        self.seller_ice_raw = rows["seller_ice"]
+        self.client_ice_raw = rows["client_ice"]
+        self.seller_ice = np.array([ice or "" for ice in rows["seller_ice"]], dtype=str)
+        self.client_ice = np.array([ice or "" for ice in rows["client_ice"]], dtype=str)
+
+        # Missing totals become NaN, which fails every comparison like the validator's None checks
+        self.total_ht = np.array(rows["total_ht"], dtype=np.float64)
+        self.total_tva = np.array(rows["total_tva"], dtype=np.float64)
+        self.total_ttc = np.array(rows["total_ttc"], dtype=np.float64)
+
+        self.has_invoice_number = np.array(rows["has_invoice_number"], dtype=bool)
+        self.has_date = np.array(rows["has_date"], dtype=bool)
+        self.has_seller_name = np.array(rows["has_seller_name"], dtype=bool)
+        self.has_seller_if = np.array(rows["has_seller_if"], dtype=bool)
+        self.has_client_name = np.array(rows["has_client_name"], dtype=bool)
+        self.dates = rows["date"]
+
+        self.item_invoice = np.array(items["invoice"], dtype=np.int64)
+        self.item_position = np.array(items["position"], dtype=np.int64)
+        self.item_description = items["description"]
+        self.item_quantity = np.array(items["quantity"], dtype=np.float64)
+        self.item_unit_price = np.array(items["unit_price"], dtype=np.float64)
+        self.item_total = np.array(items["total_line"], dtype=np.float64)
+
+    @staticmethod
+    def _empty_columns() -> tuple[dict, dict]:
+        rows = {name: [] for name in (
+            "seller_ice", "client_ice", "total_ht", "total_tva", "total_ttc", "date", "has_invoice_number",
+            "has_date", "has_seller_name", "has_seller_if", "has_client_name",
+        )}
+        items = {name: [] for name in ("invoice", "position", "description", "quantity", "unit_price", "total_line")}
+        return rows, items
+
+    @classmethod
+    def from_invoices(cls, invoices: List[InvoiceExtractedData]) -> "InvoiceColumns":
+        rows, items = cls._empty_columns()
+        for index, inv in enumerate(invoices):
+            meta, seller, client, financials = inv.meta, inv.seller, inv.client, inv.financials
+            rows["seller_ice"].append(seller.ice)
+            rows["client_ice"].append(client.ice)
+            rows["total_ht"].append(financials.total_ht)
+            rows["total_tva"].append(financials.total_tva)
+            rows["total_ttc"].append(financials.total_ttc)
+            rows["date"].append(meta.date)
+            rows["has_invoice_number"].append(bool(meta.invoice_number))
+            rows["has_date"].append(bool(meta.date))
+            rows["has_seller_name"].append(bool(seller.name))
+            rows["has_seller_if"].append(bool(seller.if_))
+            rows["has_client_name"].append(bool(client.name))
+            for position, item in enumerate(inv.items):
+                items["invoice"].append(index)
+                items["position"].append(position)
+                items["description"].append(item.description)
+                items["quantity"].append(item.quantity)
+                items["unit_price"].append(item.unit_price)
+                items["total_line"].append(item.total_line)
+        return cls(rows, items)
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> "InvoiceColumns":
+        """Loads InvoiceExtractedData.model_dump() shaped dicts."""
+        rows, items = cls._empty_columns()
+        for index, record in enumerate(records):
+            meta, seller, client, financials = record["meta"], record["seller"], record["client"], record["financials"]
+            rows["seller_ice"].append(seller.get("ice"))
+            rows["client_ice"].append(client.get("ice"))
+            rows["total_ht"].append(financials.get("total_ht"))
+            rows["total_tva"].append(financials.get("total_tva"))
+            rows["total_ttc"].append(financials.get("total_ttc"))
+            rows["date"].append(meta.get("date"))
+            rows["has_invoice_number"].append(bool(meta.get("invoice_number")))
+            rows["has_date"].append(bool(meta.get("date")))
+            rows["has_seller_name"].append(bool(seller.get("name")))
+            rows["has_seller_if"].append(bool(seller.get("if_")))
+            rows["has_client_name"].append(bool(client.get("name")))
+            for position, item in enumerate(record["items"]):
+                items["invoice"].append(index)
+                items["position"].append(position)
+                items["description"].append(item["description"])
+                items["quantity"].append(float(item["quantity"]))
+                items["unit_price"].append(float(item["unit_price"]))
+                items["total_line"].append(float(item["total_line"]))
+        return cls(rows, items)
+
+
+# --- Vectorised Checks ---
+# Each check mirrors its counterpart in validator.py, thresholds and messages included,
+# so a bulk re-audit produces exactly what validate_invoice would.
+
+def _check_ice(ice: np.ndarray, raw: list, entity_type: str, issues: List[list]) -> None:
+    clean = np.char.strip(np.char.replace(np.char.replace(ice, " ", ""), "-", ""))
+    missing = np.char.str_len(ice) == 0
+    not_digits = ~missing & ~np.char.isdigit(clean)
+    bad_length = ~missing & ~not_digits & (np.char.str_len(clean) != 15)
+
+    for i in np.flatnonzero(missing):
+        issues[i].append(ValidationIssue(
+            field=f"{entity_type} ICE",
+            error_type=ErrorType.MISSING_DATA,
+            message=f"{entity_type} ICE is missing."
+        ))
+    for i in np.flatnonzero(not_digits):
+        issues[i].append(ValidationIssue(
+            field=f"{entity_type} ICE",
+            error_type=ErrorType.CRITICAL_COMPLIANCE,
+            message=f"ICE must contain only digits. Found: '{raw[i]}'"
+        ))
+    for i in np.flatnonzero(bad_length):
+        issues[i].append(ValidationIssue(
+            field=f"{entity_type} ICE",
+            error_type=ErrorType.CRITICAL_COMPLIANCE,
+            message=f"ICE must be exactly 15 digits. Found {len(clean[i])} digits: '{clean[i]}'"
+        ))
+
+
+def _check_math(cols: InvoiceColumns, issues: List[list]) -> None:
+    calculated_line = cols.item_quantity * cols.item_unit_price
+    bad_lines = np.abs(calculated_line - cols.item_total) > 0.10
+
+    for k in np.flatnonzero(bad_lines):
+        issues[cols.item_invoice[k]].append(ValidationIssue(
+            field=f"Item #{cols.item_position[k] + 1} ({cols.item_description[k]})",
+            error_type=ErrorType.MATH_MISMATCH,
+            message=(
+                f"Line item math error: {float(cols.item_quantity[k])} x {float(cols.item_unit_price[k])} "
+                f"= {calculated_line[k]:.2f}, but extracted value is {float(cols.item_total[k])}"
+            )
+        ))
+
+    calculated_ht = np.bincount(cols.item_invoice, weights=cols.item_total, minlength=cols.size)
+    for i in np.flatnonzero(np.abs(calculated_ht - cols.total_ht) > 1.00):
+        issues[i].append(ValidationIssue(
+            field="Total HT",
+            error_type=ErrorType.MATH_MISMATCH,
+            message=(
+                f"Sum of line items ({calculated_ht[i]:.2f}) does not match "
+                f"declared Total HT ({float(cols.total_ht[i])})."
+            )
+        ))
+
+    expected_ttc = cols.total_ht + cols.total_tva
+    for i in np.flatnonzero(np.abs(expected_ttc - cols.total_ttc) > 0.50):
+        issues[i].append(ValidationIssue(
+            field="Total TTC",
+            error_type=ErrorType.MATH_MISMATCH,
+            message=(
+                f"Math error in totals: HT ({float(cols.total_ht[i])}) + "
+                f"TVA ({float(cols.total_tva[i])}) = {expected_ttc[i]:.2f}, "
+                f"but invoice says {float(cols.total_ttc[i])}"
+            )
+        ))
+
+
+def _check_tax(cols: InvoiceColumns, issues: List[list]) -> None:
+    has_ht = cols.total_ht != 0
+    implied_rate = np.divide(cols.total_tva, cols.total_ht, out=np.zeros(cols.size), where=has_ht)
+
+    # Same predicate as _validate_tax_consistency: a rate passes when any() of its
+    # distances to the standard rates is non-zero.
+    is_valid_rate = np.any(np.abs(implied_rate[:, None] - VALID_TVA_RATES) != 0, axis=1)
+
+    for i in np.flatnonzero(has_ht & ~is_valid_rate):
+        issues[i].append(ValidationIssue(
+            field="TVA Rate",
+            error_type=ErrorType.SUSPICIOUS_VALUE,
+            message=(
+                f"The implied tax rate is {implied_rate[i] * 100:.1f}%, which is not a standard "
+                "Moroccan VAT rate (20%, 14%, 10%, 7%). Check amounts."
+            )
+        ))
+
+
+def _check_metadata(cols: InvoiceColumns, issues: List[list]) -> None:
+    checks = [
+        (cols.has_invoice_number, "Invoice Number", ErrorType.MISSING_DATA, "Invoice Number is missing."),
+        (cols.has_date, "Invoice Date", ErrorType.MISSING_DATA, "Invoice Date is missing."),
+        (cols.has_seller_name, "Seller Name", ErrorType.MISSING_DATA, "Seller Name is missing."),
+        (cols.has_seller_if, "Seller Tax ID (IF)", ErrorType.CRITICAL_COMPLIANCE,
+         "Seller Identifiant Fiscal (IF) is missing. This invoice cannot be used for tax deduction."),
+        (cols.has_client_name, "Client Name", ErrorType.MISSING_DATA,
+         "Client Name is missing. We cannot verify who was billed."),
+        (~np.isnan(cols.total_ht), "Total HT", ErrorType.MISSING_DATA, "Total HT is missing."),
+        (~np.isnan(cols.total_tva), "Total TVA", ErrorType.MISSING_DATA, "Total TVA is missing."),
+        (~np.isnan(cols.total_ttc), "Total TTC", ErrorType.MISSING_DATA, "Total TTC is missing."),
+    ]
+    missing_masks = [~present for present, *_ in checks]
+
+    # Appended invoice by invoice so each list keeps validate_invoice's field order
+    for i in np.flatnonzero(np.any(missing_masks, axis=0)):
+        for mask, (_, field, error_type, message) in zip(missing_masks, checks):
+            if mask[i]:
+                issues[i].append(ValidationIssue(field=field, error_type=error_type, message=message))
+
+
+def _parse_date(date_str: str) -> np.datetime64:
+    try:
+        clean_date_str = date_str.replace("-", "/").replace(".", "/")
+        return np.datetime64(datetime.strptime(clean_date_str, "%d/%m/%Y"), "us")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _check_dates(cols: InvoiceColumns, issues: List[list]) -> None:
+    present = np.flatnonzero(cols.has_date)
+    if present.size == 0:
+        return
+
+    # Invoice dates repeat heavily, so each distinct string is parsed once
+    date_strings = np.array([cols.dates[i] for i in present], dtype=object)
+    unique_dates, inverse = np.unique(date_strings, return_inverse=True)
+    parsed = np.array([_parse_date(d) for d in unique_dates], dtype="datetime64[us]")[inverse]
+
+    today = datetime.now()
+    unparsable = np.isnat(parsed)
+    future = ~unparsable & (parsed > np.datetime64(today + timedelta(days=1), "us"))
+    too_old = ~unparsable & (parsed < np.datetime64(today - timedelta(days=365), "us"))
+
+    for k, i in enumerate(present):
+        date_str = cols.dates[i]
+        if unparsable[k]:
+            issues[i].append(ValidationIssue(
+                field="Date",
+                error_type=ErrorType.DATA_QUALITY,
+                message=f"Date format not recognized: '{date_str}'. Expected DD/MM/YYYY."
+            ))
+            continue
+        if future[k]:
+            issues[i].append(ValidationIssue(
+                field="Date",
+                error_type=ErrorType.SUSPICIOUS_VALUE,
+                message=f"Date is in the future ({date_str}). Impossible."
+            ))
+        if too_old[k]:
+            issues[i].append(ValidationIssue(
+                field="Date",
+                error_type=ErrorType.SUSPICIOUS_VALUE,
+                message=f"Invoice is over 1 year old ({date_str}). Verify validity."
+            ))
+
+
+def validate_columns(cols: InvoiceColumns) -> List[List[ValidationIssue]]:
+    logger.info(f"Validating {cols.size} invoices in bulk")
+
+    issues = [[] for _ in range(cols.size)]
+
+    # Same rule names and order as the validator's registry
+    checks = [
+        ("seller_ice", lambda: _check_ice(cols.seller_ice, cols.seller_ice_raw, "Seller", issues)),
+        ("client_ice", lambda: _check_ice(cols.client_ice, cols.client_ice_raw, "Client", issues)),
+        ("math_integrity", lambda: _check_math(cols, issues)),
+        ("tax_consistency", lambda: _check_tax(cols, issues)),
+        ("required_metadata", lambda: _check_metadata(cols, issues)),
+        ("date_logic", lambda: _check_dates(cols, issues)),
+    ]
+    for rule, check in checks:
+        before = [len(found) for found in issues]
+        check()
+        for found, start in zip(issues, before):
+            for issue in found[start:]:
+                issue.rule = rule
+
+    return issues
+
+
+def validate_invoices(invoices: List[InvoiceExtractedData]) -> List[List[ValidationIssue]]:
+    """
+    Bulk counterpart of validate_invoice for re-audits: runs every check over
+    columnar arrays and returns one issue list per invoice, in input order.
+    """
+    if not invoices:
+        return []
+    return validate_columns(InvoiceColumns.from_invoices(invoices))
+
+
+def validate_records(records: List[dict]) -> List[List[ValidationIssue]]:
+    """Same as validate_invoices, for stored extractions that were never turned back into models."""
+    if not records:
+        return []
+    return validate_columns(InvoiceColumns.from_records(records))
@@ -0,0 +1,202 @@
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from contextlib import contextmanager
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", "blobs"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Blobs are shared between identical uploads, so no task can delete one when it finishes.
+# They are swept once untouched for this long, which must outlast the longest queue wait
+# (results themselves only live for result_expires once done). Re-uploads refresh the age.
+BLOB_TTL_SECONDS = int(os.getenv("BLOB_TTL_SECONDS", str(24 * 3600)))
+BLOB_SWEEP_INTERVAL_SECONDS = int(os.getenv("BLOB_SWEEP_INTERVAL_SECONDS", "600"))
+
+# The PDF spec allows the header anywhere in the first 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class NotAPdfError(ValueError):
+    pass
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed storage for uploaded PDFs: blobs are keyed by their SHA-256,
+    so identical uploads are stored once and any node can fetch them by digest.
+    """
+
+    @abstractmethod
+    def staging_path(self) -> Path:
+        ...
+
+    @abstractmethod
+    def put_file(self, staged: Path, digest: str) -> bool:
+        """Moves a staged file into the store. Returns False if the blob already existed."""
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    @contextmanager
+    def fetch(self, digest: str):
+        """Yields a local path to the blob for the duration of the block."""
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        ...
+
+    @abstractmethod
+    def sweep(self, max_age: float) -> int:
+        """Deletes blobs and abandoned staged files older than `max_age` seconds; returns how many."""
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: Path = BLOB_STORE_DIR):
+        self.root = Path(root)
+        self.staging = self.root / "staging"
+        self.staging.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / f"{digest}.pdf"
+
+    def staging_path(self) -> Path:
+        return self.staging / f"{uuid.uuid4()}.part"
+
+    def put_file(self, staged: Path, digest: str) -> bool:
+        target = self._path(digest)
+        if target.exists():
+            staged.unlink(missing_ok=True)
+            os.utime(target)  # A new task needs it: restart its TTL
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged, target)
+        return True
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    @contextmanager
+    def fetch(self, digest: str):
+        path = self._path(digest)
+        if not path.exists():
+            raise FileNotFoundError(f"Blob {digest} not found in {self.root}")
+        yield path
+
+    def delete(self, digest: str) -> None:
+        self._path(digest).unlink(missing_ok=True)
+
+    def sweep(self, max_age: float) -> int:
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in [*self.root.glob("??/??/*.pdf"), *self.staging.glob("*.part")]:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Swept by another worker sharing the directory
+        return removed
+
+
+class BlobWriter:
+    """
+    Streams an upload into the store: hashes while writing, enforces the size
+    limit and checks the PDF magic bytes as soon as the header window is read.
+    """
+
+    def __init__(self, store: BlobStore, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.sniffed = False
+        self.staged = store.staging_path()
+        self.file = open(self.staged, "wb")
+
+    def _sniff(self):
+        if PDF_MAGIC not in self.head[:PDF_HEADER_WINDOW]:
+            raise NotAPdfError("File content is not a PDF.")
+        self.sniffed = True
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"File exceeds the {self.max_bytes // (1024 * 1024)} MB limit.")
+
+        if not self.sniffed:
+            self.head += chunk[:PDF_HEADER_WINDOW]
+            if len(self.head) >= PDF_HEADER_WINDOW:
+                self._sniff()
+
+        self.sha.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self) -> str:
+        if not self.sniffed:
+            self._sniff()
+        self.file.close()
+        digest = self.sha.hexdigest()
+        if not self.store.put_file(self.staged, digest):
+            logger.info(f"Duplicate upload, blob {digest[:12]} already stored")
+        return digest
+
+    def abort(self) -> None:
+        self.file.close()
+        self.staged.unlink(missing_ok=True)
+
+
+def store_stream(source, store: BlobStore, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = 1024 * 1024) -> str:
+    """Copies a binary file object into the store and returns its digest."""
+    writer = BlobWriter(store, max_bytes)
+    try:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            writer.write(chunk)
+        return writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+
+
+def start_blob_sweeper(interval: float = BLOB_SWEEP_INTERVAL_SECONDS, max_age: float = BLOB_TTL_SECONDS) -> threading.Thread:
+    """Sweeps the store every `interval` seconds from a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                removed = get_blob_store().sweep(max_age)
+                if removed:
+                    logger.info(f"Swept {removed} expired blobs")
+            except Exception as e:
+                logger.warning(f"Blob sweep failed: {e}")
+
+    thread = threading.Thread(target=run, name="blob-sweeper", daemon=True)
+    thread.start()
+    return thread
+
+
+_cached_blob_store = None
+
+def get_blob_store() -> BlobStore:
+    global _cached_blob_store
+    if _cached_blob_store is None:
+        if BLOB_STORE_BACKEND == "local":
+            _cached_blob_store = LocalBlobStore()
+        else:
+            # S3-compatible stores plug in here by implementing BlobStore
+            raise ValueError(f"Unknown BLOB_STORE_BACKEND: {BLOB_STORE_BACKEND}")
+    return _cached_blob_store
@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable
+from app.core.metrics import LLM_CIRCUIT_STATE
+
+# Consecutive backend failures that open the circuit, and how long it stays open before one probe call
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """The backend is considered down: the call was refused without being attempted."""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and backend failures are counted. After `failure_threshold`
+    in a row the circuit opens and every call fails fast for `reset_seconds`. It then goes
+    half-open: a single probe call is let through, and its outcome closes or reopens it.
+    Errors `is_failure` does not recognise (a bad answer, a cancelled call) change nothing.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        is_failure: Callable[[BaseException], bool] = lambda error: True,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.is_failure = is_failure
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        LLM_CIRCUIT_STATE.set(self.state)
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            logger.warning(f"LLM circuit {['closed', 'half-open', 'open'][state]}")
+        self.state = state
+        LLM_CIRCUIT_STATE.set(state)
+
+    def _before_call(self) -> bool:
+        """Admits the call or raises CircuitOpenError; True when the call is the half-open probe."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probing):
+                raise CircuitOpenError(f"LLM backend unavailable after {self.failures} consecutive failures")
+            if self.state == self.HALF_OPEN:
+                self._probing = True
+                return True
+            return False
+
+    def _after_call(self, error: BaseException | None, probe: bool):
+        with self._lock:
+            # Calls admitted before the circuit opened may still be finishing: only the probe ends probing
+            if probe:
+                self._probing = False
+            if error is None:
+                self.failures = 0
+                self._set_state(self.CLOSED)
+            elif self.is_failure(error):
+                self.failures += 1
+                if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                    self._set_state(self.OPEN)
+
+    @contextmanager
+    def guard(self):
+        """Wraps one call; raises CircuitOpenError instead of running it while the circuit is open."""
+        probe = self._before_call()
+        try:
+            yield
+        except BaseException as error:
+            self._after_call(error, probe)
+            raise
+        self._after_call(None, probe)
@@ -0,0 +1,95 @@
+"""
+Compact wire format for LLM extraction.
+
+Output tokens dominate decode time, and the verbose schema spends most of them on keys:
+every line item repeats description/quantity/unit_price/total_line. On the wire, sections
+and fields get one- to three-letter keys and each item is a fixed-order array. vLLM
+enforces the schema with guided decoding, and expand() maps the answer back to the
+InvoiceExtractedData layout.
+"""
+from app.schemas.invoices import InvoiceExtractedData, InvoiceItem
+
+COMPACT_SCHEMA_NAME = "invoice_compact"
+
+_ENTITY_KEYS = {"name": "n", "address": "a", "ice": "i", "if_": "f", "rc": "r"}
+
+# Section -> (wire key, field -> wire key). Items have no field keys: their order is ITEM_FIELDS.
+WIRE_KEYS = {
+    "meta": ("m", {"invoice_number": "n", "date": "d"}),
+    "seller": ("s", _ENTITY_KEYS),
+    "client": ("c", _ENTITY_KEYS),
+    "items": ("it", None),
+    "financials": ("t", {"total_ht": "ht", "total_tva": "tva", "total_ttc": "ttc"}),
+}
+ITEM_FIELDS = ("description", "quantity", "unit_price", "total_line")
+
+# Appended to the instructions in compact mode: the schema constrains the shape, this gives the meaning
+FORMAT_INSTRUCTIONS = """OUTPUT FORMAT (compact JSON keys)
+- m = invoice metadata: n = invoice number, d = date
+- s = seller, c = client: n = name, a = address, i = ICE, f = IF, r = RC
+- it = line items, each one an array: [description, quantity, unit price HT, line total]
+- t = totals: ht = Total HT, tva = Total TVA, ttc = Total TTC
+- Use null for anything not explicitly present.
+"""
+
+
+def _field_type(model, name: str) -> dict:
+    field = model.model_fields[name]
+    kind = "number" if field.annotation in (float, float | None) else "string"
+    return {"type": kind} if field.is_required() else {"type": [kind, "null"]}
+
+
+def _section_schema(section: str) -> dict:
+    key, fields = WIRE_KEYS[section]
+    if section == "items":
+        columns = [_field_type(InvoiceItem, name) for name in ITEM_FIELDS]
+        row = {"type": "array", "prefixItems": columns, "minItems": len(columns), "maxItems": len(columns)}
+        return {"type": "array", "items": row}
+
+    model = InvoiceExtractedData.model_fields[section].annotation
+    properties = {short: _field_type(model, name) for name, short in fields.items()}
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def wire_schema(sections: tuple, optional: bool = False) -> dict:
+    """JSON schema of the compact answer for `sections`. With optional=True any section may be null."""
+    properties = {}
+    for section in sections:
+        schema = _section_schema(section)
+        properties[WIRE_KEYS[section][0]] = {"anyOf": [schema, {"type": "null"}]} if optional else schema
+    return {
+        "name": COMPACT_SCHEMA_NAME,
+        "schema": {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False},
+    }
+
+
+def expand(wire: dict) -> dict:
+    """Compact answer -> dict in the InvoiceExtractedData layout (sections absent on the wire stay absent)."""
+    data = {}
+    for section, (key, fields) in WIRE_KEYS.items():
+        if key not in wire:
+            continue
+        value = wire[key]
+        if value is None:
+            data[section] = None
+        elif section == "items":
+            data[section] = [dict(zip(ITEM_FIELDS, row)) for row in value]
+        else:
+            data[section] = {name: value.get(short) for name, short in fields.items()}
+    return data
+
+
+def compress(data: dict) -> dict:
+    """Inverse of expand(), for sections present in `data`."""
+    wire = {}
+    for section, (key, fields) in WIRE_KEYS.items():
+        if section not in data:
+            continue
+        value = data[section]
+        if value is None:
+            wire[key] = None
+        elif section == "items":
+            wire[key] = [[item.get(name) for name in ITEM_FIELDS] for item in value]
+        else:
+            wire[key] = {short: value.get(name) for name, short in fields.items()}
+    return wire
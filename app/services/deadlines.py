@@ -0,0 +1,67 @@
+import os
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.core.metrics import DEADLINE_EXCEEDED
+
+# Seconds one invoice may spend in each stage. The worker's threads pool ignores Celery's
+# time limits and a thread cannot be interrupted, so a stage runs on a helper thread and the
+# task stops waiting for it at the deadline. The helper finishes in the background or hits
+# its own I/O timeout (LLM_TIMEOUT_SECONDS for vLLM calls).
+STAGE_DEADLINES = {
+    "load": float(os.getenv("LOAD_DEADLINE_SECONDS", "60")),
+    "llm": float(os.getenv("LLM_DEADLINE_SECONDS", "120")),
+    "validation": float(os.getenv("VALIDATION_DEADLINE_SECONDS", "10")),
+}
+# OCR has no fixed deadline: Tesseract takes seconds per page, so a 30-page scan is given
+# this much for each page it has to recognise rather than the 60s that suits one page.
+OCR_DEADLINE_PER_PAGE_SECONDS = float(os.getenv("OCR_DEADLINE_PER_PAGE_SECONDS", "30"))
+# Bounds how many abandoned stages can pile up: once every helper of a stage is stuck, new
+# stages of that kind wait in line and time out too instead of starting more threads. Each
+# stage has its own helpers, so LLM calls stuck on a saturated backend cannot starve validation.
+STAGE_THREADS = int(os.getenv("STAGE_THREADS", "32"))
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} stage exceeded its {seconds:.0f}s deadline")
+        self.stage = stage
+
+
+def ocr_deadline(pages: int) -> float:
+    return OCR_DEADLINE_PER_PAGE_SECONDS * pages
+
+
+_cached_stage_executors = {}
+_stage_executors_lock = threading.Lock()
+
+def _get_stage_executor(stage: str) -> ThreadPoolExecutor:
+    with _stage_executors_lock:
+        if stage not in _cached_stage_executors:
+            _cached_stage_executors[stage] = ThreadPoolExecutor(max_workers=STAGE_THREADS, thread_name_prefix=f"stage-{stage}")
+        return _cached_stage_executors[stage]
+
+
+def run_with_deadline(stage: str, fn, *args, seconds: float | None = None):
+    """Runs fn(*args) and returns its result, or raises DeadlineExceeded once the stage's deadline
+    (or the given number of seconds) passes."""
+    seconds = STAGE_DEADLINES[stage] if seconds is None else seconds
+    # The context carries LangChain's callback and tracing state over to the helper thread
+    future = _get_stage_executor(stage).submit(contextvars.copy_context().run, fn, *args)
+    try:
+        return future.result(timeout=seconds)
+    except FutureTimeoutError:
+        future.cancel()
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage, seconds) from None
+
+
+async def await_with_deadline(stage: str, awaitable, seconds: float | None = None):
+    """Async counterpart: the awaitable is cancelled at the deadline."""
+    seconds = STAGE_DEADLINES[stage] if seconds is None else seconds
+    try:
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage, seconds) from None
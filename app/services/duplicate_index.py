@@ -0,0 +1,122 @@
+import os
+import re
+import math
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+DUPLICATE_INDEX_BACKEND = os.getenv("DUPLICATE_INDEX_BACKEND", "redis")  # redis | memory | none
+# Sizing of the memory index's Bloom filter: 50M invoices at 1% false positives is ~60 MB of bits and 7 hashes
+DUPLICATE_INDEX_CAPACITY = int(os.getenv("DUPLICATE_INDEX_CAPACITY", "50000000"))
+DUPLICATE_INDEX_FP_RATE = float(os.getenv("DUPLICATE_INDEX_FP_RATE", "0.01"))
+# Invoices are forgotten this long after they were first seen: an older resubmission is not flagged
+DUPLICATE_INDEX_RETENTION_DAYS = int(os.getenv("DUPLICATE_INDEX_RETENTION_DAYS", "400"))
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM_RE = re.compile(r"[^0-9A-Z]")
+
+
+def duplicate_key(seller_ice: str | None, invoice_number: str | None, total_ttc: float | None) -> str | None:
+    """
+    Normalised (seller ICE, invoice number, TTC): separators, spacing and case are dropped
+    so 'FAC-2025/001' and 'fac 2025 001' collide. None when the invoice cannot be identified.
+    """
+    ice = re.sub(r"\D", "", seller_ice or "")
+    number = _NON_ALNUM_RE.sub("", (invoice_number or "").upper())
+    if not ice or not number:
+        return None
+    ttc = f"{total_ttc:.2f}" if total_ttc is not None else "-"
+    return f"{ice}:{number}:{ttc}"
+
+
+def bloom_parameters(capacity: int, fp_rate: float) -> tuple[int, int]:
+    """Optimal bit count and hash count for `capacity` items at `fp_rate` false positives."""
+    bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def bloom_positions(key: str, bits: int, hashes: int) -> list:
+    # Kirsch-Mitzenmacher double hashing: k positions from two 64-bit halves of one digest
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class DuplicateIndex(ABC):
+    """Remembers every invoice seen, mapping each key to the first submission's reference."""
+
+    @abstractmethod
+    def check_and_add(self, key: str, reference: str) -> str | None:
+        """Returns the reference of an earlier submission with the same key, else records this one."""
+
+
+class MemoryDuplicateIndex(DuplicateIndex):
+    """
+    Single-process index, for local runs and tests. The Bloom filter answers the common case
+    (never seen) without touching the exact set; a Bloom hit is confirmed against the exact set.
+    """
+
+    def __init__(self, capacity: int = DUPLICATE_INDEX_CAPACITY, fp_rate: float = DUPLICATE_INDEX_FP_RATE):
+        self.bits, self.hashes = bloom_parameters(capacity, fp_rate)
+        self.filter = bytearray(math.ceil(self.bits / 8))
+        self.exact = {}
+        self._lock = threading.Lock()
+
+    def _might_contain(self, positions: list) -> bool:
+        return all(self.filter[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def check_and_add(self, key: str, reference: str) -> str | None:
+        positions = bloom_positions(key, self.bits, self.hashes)
+        with self._lock:
+            existing = self.exact.get(key) if self._might_contain(positions) else None
+            if existing is None:
+                self.exact[key] = reference
+                for p in positions:
+                    self.filter[p >> 3] |= 1 << (p & 7)
+        return existing if existing is not None and existing != reference else None
+
+
+class RedisDuplicateIndex(DuplicateIndex):
+    """
+    Shared by every worker and holds nothing in process. Each invoice is a Redis key expiring
+    after the retention period. The check is the write: SET NX records the key unless present
+    and the GET behind it in the same pipeline returns whichever reference won, so every
+    invoice costs one round trip and a Bloom filter in front would not save any.
+    """
+
+    ENTRY_PREFIX = "duplicate-index:entry:"
+
+    def __init__(self, client, retention_days: int = DUPLICATE_INDEX_RETENTION_DAYS):
+        self.client = client
+        self.ttl = retention_days * 24 * 3600
+
+    def check_and_add(self, key: str, reference: str) -> str | None:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self.ENTRY_PREFIX + key, reference, nx=True, ex=self.ttl)
+        pipe.get(self.ENTRY_PREFIX + key)
+        _, existing = pipe.execute()
+        existing = existing.decode() if isinstance(existing, bytes) else existing
+        return existing if existing is not None and existing != reference else None
+
+
+_cached_duplicate_index = None
+
+def get_duplicate_index() -> DuplicateIndex | None:
+    global _cached_duplicate_index
+    if DUPLICATE_INDEX_BACKEND == "none":
+        return None
+
+    if _cached_duplicate_index is None:
+        if DUPLICATE_INDEX_BACKEND == "memory":
+            _cached_duplicate_index = MemoryDuplicateIndex()
+        elif DUPLICATE_INDEX_BACKEND == "redis":
+            from app.core.redis_client import get_redis
+            _cached_duplicate_index = RedisDuplicateIndex(get_redis())
+        else:
+            raise ValueError(f"Unknown DUPLICATE_INDEX_BACKEND: {DUPLICATE_INDEX_BACKEND}")
+
+        logger.info(f"Duplicate index: {DUPLICATE_INDEX_BACKEND}")
+    return _cached_duplicate_index
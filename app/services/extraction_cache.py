@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from app.schemas.invoices import InvoiceExtractedData
+from app.core.metrics import CACHE_REQUESTS
+
+CACHE_BACKEND = os.getenv("EXTRACTION_CACHE_BACKEND", "redis")  # redis | disk | none
+CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "50000"))
+CACHE_DIR = Path(os.getenv("EXTRACTION_CACHE_DIR", "cache/extractions"))
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of the file content, read in chunks so large PDFs stay out of memory."""
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def cache_key(content_digest: str, version: str) -> str:
+    return f"{version}:{content_digest}"
+
+
+class RedisCacheBackend:
+    """
+    Entries are plain keys with a TTL. A sorted set scored by last access time
+    tracks recency so the least recently used entries are evicted past max_entries.
+    """
+
+    PREFIX = "extraction-cache:"
+    LRU_INDEX = "extraction-cache:lru"
+
+    def __init__(self, client, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> str | None:
+        value = self.client.get(self.PREFIX + key)
+        if value is None:
+            self.client.zrem(self.LRU_INDEX, key)
+            return None
+        self.client.zadd(self.LRU_INDEX, {key: time.time()})
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.PREFIX + key, value, ex=self.ttl)
+        pipe.zadd(self.LRU_INDEX, {key: time.time()})
+        pipe.zcard(self.LRU_INDEX)
+        *_, size = pipe.execute()
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [k for k, _ in self.client.zpopmin(self.LRU_INDEX, overflow)]
+            if evicted:
+                self.client.delete(*[self.PREFIX + (k.decode() if isinstance(k, bytes) else k) for k in evicted])
+
+
+class DiskCacheBackend:
+    """
+    One JSON file per entry. The stored timestamp drives the TTL and the file
+    mtime is bumped on every hit so it doubles as the LRU clock.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key.replace(':', '_')}.json"
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if time.time() - entry["stored_at"] > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+
+        os.utime(path)
+        return entry["value"]
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"stored_at": time.time(), "value": value}))
+        os.replace(tmp, path)
+
+        with self._lock:
+            entries = list(self.directory.glob("*.json"))
+            overflow = len(entries) - self.max_entries
+            if overflow > 0:
+                entries.sort(key=lambda p: p.stat().st_mtime)
+                for stale in entries[:overflow]:
+                    stale.unlink(missing_ok=True)
+
+
+class ExtractionCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, content_digest: str, version: str) -> InvoiceExtractedData | None:
+        try:
+            raw = self.backend.get(cache_key(content_digest, version))
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed: {e}")
+            raw = None
+
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_REQUESTS.labels("miss" if raw is None else "hit").inc()
+
+        if raw is None:
+            return None
+        return InvoiceExtractedData.model_validate_json(raw)
+
+    def set(self, content_digest: str, version: str, data: InvoiceExtractedData) -> None:
+        try:
+            self.backend.set(cache_key(content_digest, version), data.model_dump_json())
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cached_extraction_cache = None
+
+def get_extraction_cache() -> ExtractionCache | None:
+    global _cached_extraction_cache
+    if CACHE_BACKEND == "none":
+        return None
+
+    if _cached_extraction_cache is None:
+        if CACHE_BACKEND == "disk":
+            backend = DiskCacheBackend()
+        elif CACHE_BACKEND == "redis":
+            from app.core.redis_client import get_redis
+            backend = RedisCacheBackend(get_redis())
+        else:
+            raise ValueError(f"Unknown EXTRACTION_CACHE_BACKEND: {CACHE_BACKEND}")
+
+        logger.info(f"Initializing extraction cache (backend: {CACHE_BACKEND}, ttl: {CACHE_TTL}s)")
+        _cached_extraction_cache = ExtractionCache(backend)
+    return _cached_extraction_cache
@@ -1,44 +1,112 @@
+import asyncio
 import logging
 from pathlib import Path
-from app.services.ocr_engine import extract_invoice_data
+from app.services.ocr_engine import extract_invoice_data, aextract_invoice_data, EXTRACTION_VERSION
+from app.services.extraction_cache import get_extraction_cache, file_digest
 from app.services.validator import validate_invoice
-from app.schemas.invoices import ValidationResult
+from app.services.duplicate_index import get_duplicate_index
+from app.services.deadlines import run_with_deadline
+from app.schemas.invoices import ValidationResult, InvoiceExtractedData
+from app.core.metrics import STAGE_SECONDS
 
 
 logger = logging.getLogger(__name__)
 
-def process_invoice(file_path: str) -> ValidationResult:
+
+def _extract_with_cache(file_path: str, digest: str | None = None) -> InvoiceExtractedData:
+    cache = get_extraction_cache()
+    if cache is None:
+        return extract_invoice_data(file_path)
+
+    digest = digest or file_digest(file_path)
+
+    cached = cache.get(digest, EXTRACTION_VERSION)
+    if cached is not None:
+        logger.info(f"Extraction cache hit for {digest[:12]} ({cache.stats()})")
+        return cached
+
+    extracted_data = extract_invoice_data(file_path)
+    cache.set(digest, EXTRACTION_VERSION, extracted_data)
+    return extracted_data
+
+
+async def _aextract_with_cache(file_path: str, digest: str | None = None) -> InvoiceExtractedData:
+    cache = get_extraction_cache()
+    if cache is None:
+        return await aextract_invoice_data(file_path)
+
+    digest = digest or await asyncio.to_thread(file_digest, file_path)
+
+    cached = await asyncio.to_thread(cache.get, digest, EXTRACTION_VERSION)
+    if cached is not None:
+        logger.info(f"Extraction cache hit for {digest[:12]} ({cache.stats()})")
+        return cached
+
+    extracted_data = await aextract_invoice_data(file_path)
+    await asyncio.to_thread(cache.set, digest, EXTRACTION_VERSION, extracted_data)
+    return extracted_data
+
+
+def _check_path(file_path: str) -> Path:
     path = Path(file_path)
-    
+
     if not path.exists():
         raise FileNotFoundError(f"The file {file_path} does not exist.")
-    
+
     if not path.is_file():
         raise IsADirectoryError(f"{file_path} is a directory, not a file.")
-    
+
     if path.suffix.lower() != '.pdf':
         raise ValueError(f"Expected a .pdf file, but got {path.suffix}")
-    
-    filename = path.name
+
+    return path
+
+
+def _build_result(filename: str, extracted_data: InvoiceExtractedData, reference: str | None = None) -> ValidationResult:
+    logger.info(f"OCR Complete. Invoice #{extracted_data.meta.invoice_number}")
+
+    with STAGE_SECONDS.labels("validation").time():
+        # Reference is the task id: a retried task finds its own entry and is not flagged
+        issues = run_with_deadline("validation", validate_invoice, extracted_data, get_duplicate_index(), reference or filename)
+
+    is_valid = len(issues) == 0
+
+    if is_valid:
+        logger.info(f"Validation successful for {filename}")
+    else:
+        logger.warning(f"Validation failed for {filename} with {len(issues)} issues")
+
+    return ValidationResult(is_valid=is_valid, filename=filename, issues=issues, extracted_data=extracted_data)
+
+
+def process_invoice(file_path: str, filename: str | None = None, digest: str | None = None, reference: str | None = None) -> ValidationResult:
+    path = _check_path(file_path)
+
+    filename = filename or path.name
     logger.info(f"Processing file: {filename}")
 
     try:
-        extracted_data = extract_invoice_data(file_path)
+        extracted_data = _extract_with_cache(file_path, digest)
+
+        return _build_result(filename, extracted_data, reference)
+
+    except Exception as e:
+        logger.error(f"Pipeline crashed processing {filename}: {e}", exc_info=True)
+        raise e
 
-        logger.info(f"OCR Complete. Invoice #{extracted_data.meta.invoice_number}")
 
-        issues = validate_invoice(extracted_data)
+async def aprocess_invoice(file_path: str, filename: str | None = None, digest: str | None = None, reference: str | None = None) -> ValidationResult:
+    path = _check_path(file_path)
 
-        is_valid = len(issues) == 0
+    filename = filename or path.name
+    logger.info(f"Processing file: {filename}")
+
+    try:
+        extracted_data = await _aextract_with_cache(file_path, digest)
 
-        if is_valid:
-            logger.info(f"Validation successful for {filename}")
-        else:
-            logger.warning(f"Validation failed for {filename} with {len(issues)} issues")
+        # Off the event loop: the validation deadline blocks while it waits
+        return await asyncio.to_thread(_build_result, filename, extracted_data, reference)
 
-        return ValidationResult(is_valid=is_valid, filename=filename, issues=issues, extracted_data=extracted_data)
-    
     except Exception as e:
         logger.error(f"Pipeline crashed processing {filename}: {e}", exc_info=True)
         raise e
-
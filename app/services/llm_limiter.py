@@ -0,0 +1,161 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable
+from app.core.metrics import LLM_CONCURRENCY_LIMIT, LLM_LIMITER_WAIT_SECONDS, LLM_SHED
+
+# The limit starts at LLM_LIMIT_INITIAL and moves between the bounds: +1 per round of
+# requests answered within the latency target, x LLM_LIMIT_BACKOFF on a slow answer or
+# an overload error. LLM_MAX_IN_FLIGHT, the old fixed cap, is now the ceiling.
+LLM_LIMIT_MIN = int(os.getenv("LLM_LIMIT_MIN", "2"))
+LLM_LIMIT_MAX = int(os.getenv("LLM_MAX_IN_FLIGHT", "64"))
+LLM_LIMIT_INITIAL = int(os.getenv("LLM_LIMIT_INITIAL", "16"))
+LLM_LIMIT_BACKOFF = float(os.getenv("LLM_LIMIT_BACKOFF", "0.7"))
+# Per-request latency SLA. Above it vLLM is queueing rather than batching, so we send less.
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "20"))
+# Thread-pool tasks give up their slot wait after this long and are requeued instead
+LLM_SLOT_TIMEOUT_SECONDS = float(os.getenv("LLM_SLOT_TIMEOUT_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class BackendSaturated(Exception):
+    """No LLM slot freed up in time: the backend is saturated and the work should be requeued."""
+
+
+class _Waiter:
+    __slots__ = ("granted", "notify")
+
+    def __init__(self, notify: Callable[[], None]):
+        self.granted = False
+        self.notify = notify
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit around calls to one backend, shared by the worker's threads and
+    its event loop. Waiters are served first come, first served; a released slot is handed
+    straight to the next waiter so nobody can cut in.
+    """
+
+    def __init__(
+        self,
+        initial: int = LLM_LIMIT_INITIAL,
+        min_limit: int = LLM_LIMIT_MIN,
+        max_limit: int = LLM_LIMIT_MAX,
+        latency_target: float = LLM_LATENCY_TARGET_SECONDS,
+        backoff: float = LLM_LIMIT_BACKOFF,
+        is_overload: Callable[[BaseException], bool] = lambda error: False,
+    ):
+        self.min_limit, self.max_limit = min_limit, max(min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.is_overload = is_overload
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+        LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _wake_waiters(self):
+        """Hands free slots to queued waiters. Called with the lock held."""
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.notify()
+
+    def _try_enter(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if not self._waiters and self._has_capacity():
+                self.in_flight += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Withdraws a waiter that stopped waiting; True if a slot was granted to it meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _release(self, latency: float | None, overloaded: bool = False):
+        """latency is None when the call failed for a reason that says nothing about load."""
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded or (latency is not None and latency > self.latency_target):
+                # Requests already in flight will report the same congestion: back off once per window
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    logger.info(f"LLM backend congested, concurrency limit lowered to {int(self.limit)}")
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            LLM_CONCURRENCY_LIMIT.set(self.limit)
+            self._wake_waiters()
+
+    def _shed(self, timeout: float):
+        LLM_SHED.inc()
+        raise BackendSaturated(f"No LLM slot freed up within {timeout:.0f}s (limit {int(self.limit)}, in flight {self.in_flight})")
+
+    @contextmanager
+    def slot(self, timeout: float | None = LLM_SLOT_TIMEOUT_SECONDS):
+        """Blocking acquire for worker threads. Raises BackendSaturated after `timeout` seconds."""
+        requested = time.perf_counter()
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        if not self._try_enter(waiter) and not event.wait(timeout) and not self._abandon(waiter):
+            self._shed(timeout)
+        LLM_LIMITER_WAIT_SECONDS.observe(time.perf_counter() - requested)
+
+        with self._measure():
+            yield
+
+    @asynccontextmanager
+    async def aslot(self, timeout: float | None = None):
+        """Event-loop acquire. Waiting coroutines cost nothing, so by default they queue without a deadline."""
+        requested = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+        if not self._try_enter(waiter):
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    self._shed(timeout)
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self._release(None)
+                raise
+        LLM_LIMITER_WAIT_SECONDS.observe(time.perf_counter() - requested)
+
+        with self._measure():
+            yield
+
+    @contextmanager
+    def _measure(self):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as error:
+            overloaded = self.is_overload(error)
+            self._release(time.perf_counter() - started if overloaded else None, overloaded)
+            raise
+        self._release(time.perf_counter() - started)
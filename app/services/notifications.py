@@ -0,0 +1,78 @@
+import os
+import json
+import socket
+import logging
+import ipaddress
+from urllib.parse import urlsplit
+import httpx
+from app.core.redis_client import get_redis
+
+EVENT_CHANNEL_PREFIX = "invoice-events:"
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+# Hosts trusted as webhook targets even if they resolve to an internal address (e.g. an in-cluster receiver)
+WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+logger = logging.getLogger(__name__)
+
+
+class UnsafeCallbackUrl(ValueError):
+    pass
+
+
+def check_callback_url(url: str) -> None:
+    """
+    Webhooks are POSTed from inside the cluster, so a caller-supplied URL must not reach
+    Redis, vLLM or a metadata endpoint: every address the host resolves to has to be public,
+    unless the host is in WEBHOOK_ALLOWED_HOSTS. Raises UnsafeCallbackUrl.
+    """
+    parts = urlsplit(url)
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeCallbackUrl("callback_url has an invalid port.") from None
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeCallbackUrl("callback_url must be an http(s) URL.")
+
+    host = parts.hostname.lower()
+    if host in WEBHOOK_ALLOWED_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeCallbackUrl(f"callback_url host '{host}' does not resolve.") from None
+    for address in addresses:
+        # Private, loopback, link-local, carrier-grade NAT, reserved and IPv4-mapped ranges are not global
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise UnsafeCallbackUrl(f"callback_url host '{host}' resolves to a non-public address.")
+
+
+def task_event(task_id: str, result: dict) -> dict:
+    """Same shape as GET /invoices/status/{task_id}, plus the task id."""
+    return {"task_id": task_id, "status": "completed", "data": result}
+
+
+def batch_failures_event(batch_id: str, counts: dict) -> dict:
+    """A batch that finished with failed invoices; its chord is stored as failed, hence the distinct status."""
+    return {"task_id": batch_id, "status": "completed_with_failures", "data": counts}
+
+
+def failure_event(task_id: str, error: BaseException) -> dict:
+    """Same shape as GET /invoices/status/{task_id} for a failed task, plus the task id."""
+    return {"task_id": task_id, "status": "failed", "error": str(error)}
+
+
+def publish_task_event(task_id: str, event: dict) -> None:
+    """Pushes a finished task to SSE/WebSocket listeners. Never raises: the result is already stored."""
+    try:
+        get_redis().publish(EVENT_CHANNEL_PREFIX + task_id, json.dumps(event))
+    except Exception as e:
+        logger.warning(f"Could not publish event for task {task_id}: {e}")
+
+
+def deliver_webhook(callback_url: str, event: dict) -> None:
+    # Checked again at delivery: the name may resolve elsewhere than when the upload was accepted.
+    # Redirects are not followed (httpx default), so the checked host is the one contacted.
+    check_callback_url(callback_url)
+    response = httpx.post(callback_url, json=event, timeout=WEBHOOK_TIMEOUT)
+    response.raise_for_status()
+    logger.info(f"Webhook delivered to {callback_url} for task {event['task_id']}")
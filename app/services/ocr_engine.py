@@ -1,12 +1,74 @@
 import os
+import re
+import time
+import asyncio
+import hashlib
 import logging
+import threading
+from typing import List, Optional
+import openai
 from langchain_openai import ChatOpenAI
-from langchain_community.document_loaders import PyPDFLoader
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, Field, create_model
 from app.schemas.invoices import InvoiceExtractedData
+from app.core.metrics import STAGE_SECONDS, LLM_IN_FLIGHT, LLM_REQUEST_SECONDS, LLM_TOKENS, LLM_ERRORS, LLM_OUTPUT_TOKENS, LLM_PARSE_FAILURES
+from app.services.tokens import count_tokens
+from app.services.llm_limiter import AdaptiveLimiter, BackendSaturated
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.deadlines import DeadlineExceeded, run_with_deadline, await_with_deadline, ocr_deadline
+from app.services.compact_schema import FORMAT_INSTRUCTIONS, expand, wire_schema
+from app.services.pdf_text import PDF_TEXT_BACKEND, extract_text
+from app.services.page_ocr import OCR_ENABLED, OCR_VERSION, OCR_DPI, OCR_LANGUAGES, needs_ocr, ocr_pages
+from app.services.rule_extractor import RULES_VERSION, SECTIONS, extract_fields, missing_sections, merge_extraction
 
 VLLM_API_URL = os.getenv("VLLM_API_URL", "http://localhost:8001/v1")
 MODEL_NAME = "TheBloke/Mistral-7B-Instruct-v0.2-AWQ"
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "64"))
+# A request vLLM has not answered by then is stuck in its queue; one quick retry covers dropped connections
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "true").lower() == "true"
+# "structured": the answer follows InvoiceExtractedData's own JSON schema.
+# "compact": short keys and items as arrays (see app.services.compact_schema), far fewer output tokens.
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "structured")
+# Bump whenever compact_pages changes what reaches the rules and the LLM
+COMPACTION_VERSION = "3"
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Tracks in-flight requests, request latency and the token usage vLLM returns.
+    vLLM's own /metrics splits each request into prefill and decode time.
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+        LLM_IN_FLIGHT.inc()
+
+    def _finish(self, run_id) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_IN_FLIGHT.dec()
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        LLM_TOKENS.labels("prompt").inc(usage.get("prompt_tokens") or 0)
+        LLM_TOKENS.labels("completion").inc(usage.get("completion_tokens") or 0)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+        LLM_ERRORS.inc()
 
 
 _cached_llm = None
@@ -21,14 +83,53 @@ def _get_llm():
             openai_api_key="EMPTY",
             openai_api_base=VLLM_API_URL,
             temperature=0,
+            max_tokens=LLM_MAX_OUTPUT_TOKENS,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=LLM_MAX_RETRIES,
+            callbacks=[LLMMetricsCallback()],
         )
     return _cached_llm
 
+
+def _is_overload(error: BaseException) -> bool:
+    """Errors that mean vLLM is saturated, as opposed to a bad request or an unparseable answer."""
+    return isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+
+_cached_limiter = None
+
+def _get_llm_limiter() -> AdaptiveLimiter:
+    # One per process: the worker's threads and its event loop draw from the same limit
+    global _cached_limiter
+    if _cached_limiter is None:
+        _cached_limiter = AdaptiveLimiter(is_overload=_is_overload)
+    return _cached_limiter
+
+
+_cached_breaker = None
+
+def _get_llm_breaker() -> CircuitBreaker:
+    global _cached_breaker
+    if _cached_breaker is None:
+        _cached_breaker = CircuitBreaker(is_failure=_is_overload)
+    return _cached_breaker
+
+
+def is_transient(error: BaseException) -> bool:
+    """Failures worth retrying later: the LLM backend or Redis was down, saturated or too slow, not the invoice at fault."""
+    if isinstance(error, DeadlineExceeded):
+        # A slow validation is the duplicate index waiting on Redis. The retry reuses the task id as
+        # reference, so an entry the abandoned attempt still wrote does not flag it as a duplicate.
+        return error.stage in ("llm", "validation")
+    return _is_overload(error) or isinstance(error, (BackendSaturated, CircuitOpenError))
+
 logger = logging.getLogger(__name__)
 
 
-PROMPT_TEMPLATE = """
-You are an expert AI accountant specializing in Moroccan Tax Law (DGI).
+# The static instructions always come first and the invoice text last: every request
+# then shares the same token prefix, which vLLM's automatic prefix caching reuses
+# instead of recomputing the KV cache of the instruction block.
+SYSTEM_PROMPT = """You are an expert AI accountant specializing in Moroccan Tax Law (DGI).
 Your task is to extract structured invoice data from the provided raw text.
 
 GENERAL EXTRACTION RULES
@@ -102,38 +203,372 @@ ROBUSTNESS TO PDF TEXT
 OUTPUT
 - Return ONLY the structured data matching the required schema.
 - Do NOT include explanations, warnings, or validation logic.
+"""
 
-RAW INVOICE TEXT:
+USER_PROMPT = """RAW INVOICE TEXT:
 {text}
-
 """
 
+INSTRUCTIONS = f"{SYSTEM_PROMPT}\n{FORMAT_INSTRUCTIONS}" if EXTRACTION_MODE == "compact" else SYSTEM_PROMPT
+
+PROMPT_TEMPLATE = f"{INSTRUCTIONS}\n{USER_PROMPT}"
+
+# Mistral-Instruct v0.2's chat template rejects system messages, so by default the
+# instructions open the user turn instead. Enable for models that accept a system role.
+PROMPT_SYSTEM_ROLE = os.getenv("PROMPT_SYSTEM_ROLE", "false").lower() == "true"
+
+
+def build_prompt(system_role: bool = PROMPT_SYSTEM_ROLE) -> ChatPromptTemplate:
+    if system_role:
+        return ChatPromptTemplate.from_messages([("system", INSTRUCTIONS), ("human", USER_PROMPT)])
+    return ChatPromptTemplate.from_messages([("human", PROMPT_TEMPLATE)])
+
+_OCR_FINGERPRINT = f"{OCR_VERSION}:{OCR_DPI}:{OCR_LANGUAGES}" if OCR_ENABLED else "no-ocr"
+
+
+# Changes whenever the model, the prompt or its roles, the extraction rules or the compaction change,
+# so cached extractions from an older pipeline are never served.
+def _extraction_version(prompt_template: str, system_role: bool) -> str:
+    fingerprint = f"{MODEL_NAME}\n{EXTRACTION_MODE}\n{PDF_TEXT_BACKEND}\n{RULES_VERSION}\n{COMPACTION_VERSION if PROMPT_COMPACTION else 'raw'}\n{_OCR_FINGERPRINT}\n{prompt_template}"
+    if system_role:
+        fingerprint += "\nsystem-role"
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+
+EXTRACTION_VERSION = _extraction_version(PROMPT_TEMPLATE, PROMPT_SYSTEM_ROLE)
+
+
+# --- Token Budget ---
+# See app.services.tokens for how tokens are estimated.
+
+MAX_MODEL_LEN = int(os.getenv("MAX_MODEL_LEN", "2048"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "640"))
+CHAT_TEMPLATE_OVERHEAD = 32
+
+
+PROMPT_TOKENS = count_tokens(PROMPT_TEMPLATE.replace("{text}", ""))
+TEXT_TOKEN_BUDGET = MAX_MODEL_LEN - LLM_MAX_OUTPUT_TOKENS - PROMPT_TOKENS - CHAT_TEMPLATE_OVERHEAD
+
+
+def _split_line(line: str, budget: int) -> List[str]:
+    """Halves a line longer than the budget (at a space when there is one) until every part fits."""
+    if len(line) < 2 or count_tokens(line) + 1 <= budget:
+        return [line]
+    middle = len(line) // 2
+    cut = line.rfind(" ", 0, middle + 1)
+    left, right = (line[:cut], line[cut + 1:]) if cut > 0 else (line[:middle], line[middle:])
+    return _split_line(left, budget) + _split_line(right, budget)
+
+
+def _split_to_budget(text: str, budget: int) -> List[str]:
+    """Splits an oversized page on line boundaries into pieces that each fit the budget."""
+    pieces, current, current_tokens = [], [], 0
+    for line in (part for line in text.splitlines() for part in _split_line(line, budget)):
+        line_tokens = count_tokens(line) + 1
+        if current and current_tokens + line_tokens > budget:
+            pieces.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_pages(pages: List[str], budget: int = TEXT_TOKEN_BUDGET) -> List[str]:
+    """Packs consecutive pages into as few chunks as fit the token budget."""
+    chunks, current, current_tokens = [], [], 0
+    for page in pages:
+        for piece in _split_to_budget(page, budget):
+            piece_tokens = count_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > budget:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+# --- Text Compaction ---
+# PyPDF output is full of layout whitespace, repeated page headers/footers and legal
+# boilerplate. Every token of it costs prefill time, so it is stripped before the
+# rules and the LLM see the text. Lines carrying identifiers or amounts are never dropped.
+
+_WHITESPACE_RE = re.compile(r"[ \t\u00a0\u202f]+")
+# Only explicit markers ("Page 2", "p. 2/3", "2/3", "- 2 -"): a bare number is a quantity or an amount
+_PAGE_MARKER_RE = re.compile(
+    r"^(?:page\s*\d+(?:\s*(?:/|sur|of)\s*\d+)?|p\.?\s*\d+\s*(?:/|sur|of)\s*\d+|\d+\s*/\s*\d+|-\s*\d+\s*-)$",
+    re.IGNORECASE,
+)
+_KEEP_RE = re.compile(
+    r"\b(?:I\.?C\.?E|I\.?F|R\.?C|T\.?P|CNSS|Patente|Identifiant|Total|Montant|T\.?V\.?A|H\.?T|T\.?T\.?C|"
+    r"Net|Facture|Date|Client|Factur[ée])\b|الرقم الضريبي",
+    re.IGNORECASE,
+)
+# Running headers and footers are looked for this many lines from either edge of a page
+_EDGE_LINES = 8
+# Two decimal amounts on a line: a line item, which may legitimately repeat across pages
+_ITEM_LIKE_RE = re.compile(r"\d[.,]\d{2}\b.*\d[.,]\d{2}\b")
+_BOILERPLATE_RE = re.compile(
+    r"conditions g[ée]n[ée]rales|p[ée]nalit[ée]s? de retard|en cas de retard|tout litige|tribunal|"
+    r"escompte|merci de votre (?:confiance|visite)|r[ée]serve de propri[ée]t[ée]|"
+    r"document g[ée]n[ée]r[ée]|imprim[ée] le|www\.|https?://",
+    re.IGNORECASE,
+)
+
+
+def _is_noise(line: str) -> bool:
+    if _KEEP_RE.search(line):
+        return False
+    if not any(c.isalnum() for c in line):
+        return True
+    return bool(_PAGE_MARKER_RE.match(line) or _BOILERPLATE_RE.search(line))
+
+
+def _edge_slots(lines: List[str]) -> list:
+    """(line, side, offset) of the lines near the top and the bottom of a page."""
+    top = [(line, "top", i) for i, line in enumerate(lines[:_EDGE_LINES])]
+    bottom = [(line, "bottom", i) for i, line in enumerate(reversed(lines[-_EDGE_LINES:]))]
+    return top + bottom
+
+
+def compact_pages(pages: List[str]) -> List[str]:
+    """
+    Collapses whitespace, drops empty/noise lines and the running headers and footers:
+    a line found at the same offset from the top or the bottom of most pages is kept
+    on the first of them only. Any other repeat is content: two identical line items
+    are two line items.
+    """
+    page_lines = [
+        [line for line in (_WHITESPACE_RE.sub(" ", raw).strip() for raw in page.splitlines()) if line and not _is_noise(line)]
+        for page in pages
+    ]
+
+    slot_count = {}
+    for lines in page_lines:
+        for slot in set(_edge_slots(lines)):
+            slot_count[slot] = slot_count.get(slot, 0) + 1
+    running = {
+        slot for slot, count in slot_count.items()
+        if count > 1 and count > len(pages) / 2 and not _ITEM_LIKE_RE.search(slot[0])
+    }
+
+    seen = set()
+    compacted = []
+    for lines in page_lines:
+        slots = {slot for slot in _edge_slots(lines) if slot in running}
+        drop = {i if side == "top" else len(lines) - 1 - i for (_, side, i) in slots & seen}
+        seen |= slots
+        compacted.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return compacted
+
+
+# --- Schemas ---
+
+@lru_cache(maxsize=None)
+def _partial_schema(sections: tuple, optional: bool = False) -> type[BaseModel]:
+    """
+    Schema restricted to the sections the rules could not fill, so the LLM only decodes those.
+    With optional=True every section may be null: used for chunks of a multi-page invoice,
+    where the totals or the parties are usually on a single page.
+    """
+    if set(sections) == set(SECTIONS) and not optional:
+        return InvoiceExtractedData
+
+    fields = {}
+    for name in sections:
+        field = InvoiceExtractedData.model_fields[name]
+        if optional:
+            fields[name] = (Optional[field.annotation], Field(None, description=field.description))
+        else:
+            fields[name] = (field.annotation, field)
+    return create_model("InvoicePartialData", __doc__=InvoiceExtractedData.__doc__, **fields)
+
+
+def _read_pages(pdf_path: str) -> List[str]:
+    pages = extract_text(pdf_path)
+    if not pages:
+        raise ValueError("PDF is empty or unreadable")
+    return pages
 
-def extract_invoice_data(pdf_path: str) -> InvoiceExtractedData:
-    loader = PyPDFLoader(pdf_path)
-    docs = loader.load()
 
-    if not docs:
-        raise ValueError("PDF is empty or unreadable")
+def _scanned_pages(pages: List[str]) -> int:
+    return sum(needs_ocr(page) for page in pages) if OCR_ENABLED else 0
+
 
-    content = docs[0].page_content
+def _prepare_pages(pages: List[str]) -> List[str]:
+    # An empty prompt would only make the LLM invent an invoice
+    if all(needs_ocr(page) for page in pages):
+        raise ValueError("PDF has no extractable text")
 
     logger.debug("="*50)
-    logger.debug(f"RAW PDF CONTENT START\n{content}")
+    logger.debug(f"RAW PDF CONTENT START ({len(pages)} pages)\n" + "\n".join(pages))
     logger.debug("RAW PDF CONTENT END")
     logger.debug("="*50)
-    
-    llm = _get_llm()
 
-    structured_llm = llm.with_structured_output(InvoiceExtractedData)
-    
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+    if PROMPT_COMPACTION:
+        tokens_before = count_tokens("\n".join(pages))
+        pages = compact_pages(pages)
+        tokens_after = count_tokens("\n".join(pages))
+        saved = 1 - tokens_after / tokens_before if tokens_before else 0.0
+        logger.info(f"Text compaction: {tokens_before} -> {tokens_after} tokens ({saved:.0%} saved)")
+
+    return pages
+
+
+def _load_pages(pdf_path: str) -> List[str]:
+    """Text of every page, OCR filling in the scanned ones. OCR runs under a deadline of its own
+    that grows with the number of pages it has to recognise."""
+    with STAGE_SECONDS.labels("load").time():
+        pages = run_with_deadline("load", _read_pages, pdf_path)
+
+    scanned = _scanned_pages(pages)
+    if scanned:
+        with STAGE_SECONDS.labels("ocr").time():
+            pages = run_with_deadline("ocr", ocr_pages, pdf_path, pages, seconds=ocr_deadline(scanned))
+    return _prepare_pages(pages)
+
+
+async def _aload_pages(pdf_path: str) -> List[str]:
+    with STAGE_SECONDS.labels("load").time():
+        pages = await await_with_deadline("load", asyncio.to_thread(_read_pages, pdf_path))
+
+    scanned = _scanned_pages(pages)
+    if scanned:
+        with STAGE_SECONDS.labels("ocr").time():
+            pages = await await_with_deadline("ocr", asyncio.to_thread(ocr_pages, pdf_path, pages), ocr_deadline(scanned))
+    return _prepare_pages(pages)
+
+
+def _unwrap(output: dict, parse) -> BaseModel:
+    """Records the answer's output tokens, and whether it parsed, before handing back the model."""
+    usage = output["raw"].usage_metadata or {}
+    LLM_OUTPUT_TOKENS.labels(EXTRACTION_MODE).observe(usage.get("output_tokens", 0))
+    try:
+        if output["parsing_error"] is not None:
+            raise output["parsing_error"]
+        if output["parsed"] is None:
+            raise ValueError("LLM answer did not match the extraction schema")
+        return parse(output["parsed"])
+    except Exception:
+        LLM_PARSE_FAILURES.labels(EXTRACTION_MODE).inc()
+        raise
+
+
+@lru_cache(maxsize=None)
+def _get_chain(sections: tuple, optional: bool = False):
+    """Built once per worker for each schema variant, then reused by every call."""
+    schema = _partial_schema(sections, optional)
+    if EXTRACTION_MODE == "compact":
+        structured_llm = _get_llm().with_structured_output(wire_schema(sections, optional), method="json_schema", include_raw=True)
+        parse = lambda wire: schema.model_validate(expand(wire))
+    else:
+        structured_llm = _get_llm().with_structured_output(schema, include_raw=True)
+        parse = lambda parsed: parsed
+    return build_prompt() | structured_llm | RunnableLambda(lambda output: _unwrap(output, parse))
+
+
+def _build_chain(missing: List[str], optional: bool = False):
+    return _get_chain(tuple(missing), optional)
+
+
+def _plan_extraction(pages: List[str]) -> tuple[dict, List[str], List[str]]:
+    with STAGE_SECONDS.labels("rules").time():
+        rule_fields = extract_fields("\n".join(pages))
+        missing = missing_sections(rule_fields)
+
+    if not missing:
+        logger.info("Rule extraction filled every field, skipping LLM")
+        return rule_fields, missing, []
+
+    chunks = chunk_pages(pages)
+    logger.info(
+        f"Rule extraction incomplete, asking LLM for: {', '.join(missing)} "
+        f"({len(pages)} pages -> {len(chunks)} chunks, budget {TEXT_TOKEN_BUDGET} tokens)"
+    )
+    return rule_fields, missing, chunks
+
+
+def _reduce_chunks(results: List[BaseModel]) -> dict:
+    """
+    Merges per-chunk partial extractions in page order: identifiers take the first
+    value found, items are concatenated and totals come from the last chunk that has them.
+    """
+    merged = {}
+    for result in results:
+        for section, value in result.model_dump().items():
+            if value is None:
+                continue
+            if section == "items":
+                merged.setdefault("items", []).extend(value)
+            elif section == "financials":
+                merged["financials"] = value
+            else:
+                current = merged.setdefault(section, {})
+                for name, field_value in value.items():
+                    if current.get(name) is None:
+                        current[name] = field_value
+    return merged
+
+
+def _invoke_limited(chain, text: str):
+    # The breaker comes first: while vLLM is down, calls fail at once instead of queueing for a slot
+    with _get_llm_breaker().guard(), _get_llm_limiter().slot():
+        return chain.invoke({"text": text})
+
+
+def _extract_with_llm(missing: List[str], chunks: List[str]) -> dict:
+    if len(chunks) == 1:
+        return _invoke_limited(_build_chain(missing), chunks[0]).model_dump()
+
+    chain = _build_chain(missing, optional=True)
+    results = RunnableLambda(lambda chunk: _invoke_limited(chain, chunk)).batch(
+        chunks, config={"max_concurrency": LLM_MAX_IN_FLIGHT},
+    )
+    return _reduce_chunks(results)
+
+
+def extract_invoice_data(pdf_path: str) -> InvoiceExtractedData:
+    pages = _load_pages(pdf_path)
+
+    rule_fields, missing, chunks = _plan_extraction(pages)
+    if not missing:
+        return merge_extraction(rule_fields)
+
+    with STAGE_SECONDS.labels("llm").time():
+        llm_data = run_with_deadline("llm", _extract_with_llm, missing, chunks)
+    return merge_extraction(rule_fields, llm_data)
+
+
+# --- Async Pipeline ---
+# One event loop can keep far more requests in flight than the thread pool, letting
+# vLLM's continuous batching fill the GPU. The adaptive limiter caps what we send at once.
+
+async def _ainvoke_bounded(chain, text: str):
+    with _get_llm_breaker().guard():
+        async with _get_llm_limiter().aslot():
+            return await chain.ainvoke({"text": text})
+
 
-    chain = prompt | structured_llm
+async def _aextract_with_llm(missing: List[str], chunks: List[str]) -> dict:
+    if len(chunks) == 1:
+        return (await _ainvoke_bounded(_build_chain(missing), chunks[0])).model_dump()
 
-    result = chain.invoke({"text": content})
+    chain = _build_chain(missing, optional=True)
+    results = await asyncio.gather(*(_ainvoke_bounded(chain, chunk) for chunk in chunks))
+    return _reduce_chunks(results)
 
-    return result
 
+async def aextract_invoice_data(pdf_path: str) -> InvoiceExtractedData:
+    pages = await _aload_pages(pdf_path)
 
+    rule_fields, missing, chunks = _plan_extraction(pages)
+    if not missing:
+        return merge_extraction(rule_fields)
 
+    # Includes the wait for a limiter slot, as that is part of the LLM's cost under load
+    with STAGE_SECONDS.labels("llm").time():
+        llm_data = await await_with_deadline("llm", _aextract_with_llm(missing, chunks))
+    return merge_extraction(rule_fields, llm_data)
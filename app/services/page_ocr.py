@@ -0,0 +1,164 @@
+import os
+import hashlib
+import logging
+import multiprocessing
+from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pypdf import PdfReader
+from app.services.extraction_cache import CACHE_BACKEND, CACHE_TTL, CACHE_MAX_ENTRIES, RedisCacheBackend, DiskCacheBackend
+from app.core.metrics import OCR_PAGES
+
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "fra+ara+eng")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_CACHE_BACKEND = os.getenv("OCR_CACHE_BACKEND", CACHE_BACKEND)  # redis | disk | none
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "cache/ocr")
+# A page with fewer letters and digits than this is treated as having no text layer
+OCR_MIN_TEXT_CHARS = 20
+# Bump whenever rasterisation or recognition settings change what a page yields
+OCR_VERSION = "1"
+
+logger = logging.getLogger(__name__)
+
+
+def needs_ocr(text: str) -> bool:
+    return sum(c.isalnum() for c in text) < OCR_MIN_TEXT_CHARS
+
+
+def _stream_bytes(obj) -> bytes:
+    try:
+        return obj.get_data()
+    except Exception:
+        return b""
+
+
+def page_fingerprint(page) -> str:
+    """
+    SHA-256 of what a page draws: its content stream and the raw data of its images.
+    The same scanned page embedded in another PDF hashes the same.
+    """
+    sha = hashlib.sha256()
+    contents = page.get_contents()
+    if contents is not None:
+        sha.update(_stream_bytes(contents))
+
+    xobjects = (page.get("/Resources") or {}).get("/XObject") or {}
+    for name in sorted(xobjects):
+        sha.update(name.encode())
+        sha.update(_stream_bytes(xobjects[name].get_object()))
+    return sha.hexdigest()
+
+
+def _recognize_page(pdf_path: str, index: int, dpi: int, languages: str) -> str:
+    """Runs in a pool process: rasterises one page and returns Tesseract's text."""
+    import pypdfium2
+    import pytesseract
+
+    try:
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            image = pdf[index].render(scale=dpi / 72, grayscale=True).to_pil()
+        finally:
+            pdf.close()
+        return pytesseract.image_to_string(image, lang=languages)
+    except Exception as e:
+        # pytesseract's exceptions cannot be unpickled, which would break the whole pool
+        raise RuntimeError(f"OCR failed on page {index + 1}: {type(e).__name__}: {e}") from None
+
+
+# --- OCR Page Cache ---
+
+class OcrRedisBackend(RedisCacheBackend):
+    PREFIX = "ocr-cache:"
+    LRU_INDEX = "ocr-cache:lru"
+
+
+_cached_ocr_cache = None
+
+def get_ocr_cache():
+    global _cached_ocr_cache
+    if OCR_CACHE_BACKEND == "none":
+        return None
+
+    if _cached_ocr_cache is None:
+        if OCR_CACHE_BACKEND == "disk":
+            _cached_ocr_cache = DiskCacheBackend(OCR_CACHE_DIR, CACHE_TTL, CACHE_MAX_ENTRIES)
+        elif OCR_CACHE_BACKEND == "redis":
+            from app.core.redis_client import get_redis
+            _cached_ocr_cache = OcrRedisBackend(get_redis())
+        else:
+            raise ValueError(f"Unknown OCR_CACHE_BACKEND: {OCR_CACHE_BACKEND}")
+    return _cached_ocr_cache
+
+
+def _ocr_cache_key(fingerprint: str) -> str:
+    return f"{OCR_VERSION}:{OCR_DPI}:{OCR_LANGUAGES}:{fingerprint}"
+
+
+def _cache_call(method: str, *args):
+    cache = get_ocr_cache()
+    if cache is None:
+        return None
+    try:
+        return getattr(cache, method)(*args)
+    except Exception as e:
+        logger.warning(f"OCR cache {method} failed: {e}")
+        return None
+
+
+# --- Process Pool ---
+# Tesseract is CPU bound, so pages are recognised in separate processes. Spawned rather
+# than forked: the Celery worker runs a thread pool and forking a threaded process is unsafe.
+
+_ocr_executor = None
+
+def _get_ocr_executor() -> ProcessPoolExecutor:
+    global _ocr_executor
+    if _ocr_executor is None:
+        logger.info(f"Starting OCR process pool ({OCR_WORKERS} workers, {OCR_DPI} dpi, {OCR_LANGUAGES})")
+        _ocr_executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _ocr_executor
+
+
+def _reset_ocr_executor(broken: ProcessPoolExecutor) -> None:
+    """A crashed child (e.g. killed for memory) breaks the pool for good: the next call starts a new one."""
+    global _ocr_executor
+    broken.shutdown(wait=False, cancel_futures=True)
+    if _ocr_executor is broken:
+        _ocr_executor = None
+
+
+def ocr_pages(pdf_path: str, pages: List[str]) -> List[str]:
+    """Replaces the text of every page without a text layer by its OCR text, in page order."""
+    targets = [index for index, text in enumerate(pages) if needs_ocr(text)]
+    if not targets:
+        return pages
+
+    reader = PdfReader(pdf_path)
+    executor = None
+    pages = list(pages)
+    pending = {}
+    for index in targets:
+        fingerprint = page_fingerprint(reader.pages[index])
+        cached = _cache_call("get", _ocr_cache_key(fingerprint))
+        if cached is not None:
+            OCR_PAGES.labels("cached").inc()
+            pages[index] = cached
+        else:
+            executor = executor or _get_ocr_executor()
+            future = executor.submit(_recognize_page, pdf_path, index, OCR_DPI, OCR_LANGUAGES)
+            pending[index] = (fingerprint, future)
+
+    for index, (fingerprint, future) in pending.items():
+        try:
+            pages[index] = future.result()
+        except BrokenProcessPool:
+            _reset_ocr_executor(executor)
+            raise
+        OCR_PAGES.labels("recognized").inc()
+        _cache_call("set", _ocr_cache_key(fingerprint), pages[index])
+
+    logger.info(f"OCR: {len(targets)} pages without text layer, {len(targets) - len(pending)} from cache")
+    return pages
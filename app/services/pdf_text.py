@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Sequence
+from app.services.rule_extractor import ICE_RE, IF_RE
+from app.core.metrics import PDF_TEXT_SECONDS, PDF_TEXT_QUALITY
+
+# Picked with `python -m benchmarks.pdf_text`: the fastest backend that keeps the footer identifiers
+PDF_TEXT_BACKEND = os.getenv("PDF_TEXT_BACKEND", "pypdfium2")  # pypdfium2 | pypdf | pdfminer
+
+logger = logging.getLogger(__name__)
+
+# PDFium is not thread-safe, and the workers run a threads pool plus to_thread calls on the
+# async path: every pdfium call in this process goes through this lock. Extraction takes a
+# few milliseconds per invoice, so serialising it costs little next to the LLM.
+_PDFIUM_LOCK = threading.Lock()
+
+
+class TextBackend(ABC):
+    """Returns the text layer of the requested pages (all pages when `pages` is None), one string per page."""
+
+    name = ""
+
+    @abstractmethod
+    def extract(self, pdf_path: str, pages: Sequence[int] | None = None) -> List[str]:
+        ...
+
+
+class PypdfBackend(TextBackend):
+    """Pure Python, what PyPDFLoader wrapped. Only the requested pages are parsed."""
+
+    name = "pypdf"
+
+    def extract(self, pdf_path: str, pages: Sequence[int] | None = None) -> List[str]:
+        from pypdf import PdfReader
+
+        reader = PdfReader(pdf_path)
+        indices = range(len(reader.pages)) if pages is None else pages
+        return [reader.pages[i].extract_text() or "" for i in indices]
+
+
+class PdfminerBackend(TextBackend):
+    """pdfminer.six layout analysis: slowest, but groups text into reading-order blocks."""
+
+    name = "pdfminer"
+
+    def extract(self, pdf_path: str, pages: Sequence[int] | None = None) -> List[str]:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LAParams, LTTextContainer
+
+        texts = []
+        for layout in extract_pages(pdf_path, page_numbers=None if pages is None else set(pages), laparams=LAParams()):
+            texts.append("".join(element.get_text() for element in layout if isinstance(element, LTTextContainer)))
+        return texts
+
+
+class PdfiumBackend(TextBackend):
+    """PDFium through pypdfium2: native code, by far the fastest. Calls are serialised by _PDFIUM_LOCK."""
+
+    name = "pypdfium2"
+
+    def extract(self, pdf_path: str, pages: Sequence[int] | None = None) -> List[str]:
+        import pypdfium2
+
+        with _PDFIUM_LOCK:
+            pdf = pypdfium2.PdfDocument(pdf_path)
+            try:
+                indices = range(len(pdf)) if pages is None else pages
+                texts = []
+                for i in indices:
+                    textpage = pdf[i].get_textpage()
+                    # PDFium ends lines with CRLF; the rules and the prompt expect LF
+                    texts.append(textpage.get_text_range().replace("\r\n", "\n"))
+                    textpage.close()
+                return texts
+            finally:
+                pdf.close()
+
+
+TEXT_BACKENDS = {backend.name: backend for backend in (PdfiumBackend, PypdfBackend, PdfminerBackend)}
+
+
+def get_text_backend(name: str = PDF_TEXT_BACKEND) -> TextBackend:
+    if name not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown PDF_TEXT_BACKEND: {name} (expected one of {', '.join(TEXT_BACKENDS)})")
+    return TEXT_BACKENDS[name]()
+
+
+def text_quality(text: str) -> dict:
+    """The footer identifiers are what layout-sensitive backends tend to lose or garble."""
+    return {
+        "chars": len(text),
+        "has_ice": ICE_RE.search(text) is not None,
+        "has_if": IF_RE.search(text) is not None,
+    }
+
+
+def extract_text(pdf_path: str, pages: Sequence[int] | None = None, backend: TextBackend | None = None) -> List[str]:
+    """Extracts the requested pages and records how long it took and whether the identifiers survived."""
+    backend = backend or get_text_backend()
+
+    start = time.perf_counter()
+    texts = backend.extract(pdf_path, pages)
+    elapsed = time.perf_counter() - start
+
+    quality = text_quality("\n".join(texts))
+    PDF_TEXT_SECONDS.labels(backend.name).observe(elapsed)
+    PDF_TEXT_QUALITY.labels(backend.name, "intact" if quality["has_ice"] and quality["has_if"] else "missing_ids").inc()
+    logger.info(
+        f"Text extraction ({backend.name}): {len(texts)} pages in {elapsed * 1000:.1f} ms, "
+        f"{quality['chars']} chars, ICE {'found' if quality['has_ice'] else 'missing'}, "
+        f"IF {'found' if quality['has_if'] else 'missing'}"
+    )
+    return texts
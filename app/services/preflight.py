@@ -0,0 +1,60 @@
+import os
+import logging
+from pathlib import Path
+from pypdf import PdfReader, PasswordType
+from app.schemas.invoices import PreflightDecision, PreflightReport
+from app.services.tokens import count_tokens
+from app.services.page_ocr import OCR_ENABLED
+
+PREFLIGHT_MAX_PAGES = int(os.getenv("PREFLIGHT_MAX_PAGES", "30"))
+PREFLIGHT_MAX_TOKENS = int(os.getenv("PREFLIGHT_MAX_TOKENS", "20000"))
+# Only the first pages are read: enough to tell a text PDF from a scan without paying for all of them
+PREFLIGHT_SAMPLE_PAGES = int(os.getenv("PREFLIGHT_SAMPLE_PAGES", "3"))
+PREFLIGHT_MIN_TEXT_CHARS = 20
+
+logger = logging.getLogger(__name__)
+
+
+def _reject(reason: str, **fields) -> PreflightReport:
+    return PreflightReport(decision=PreflightDecision.REJECT, reason=reason, **fields)
+
+
+def preflight(pdf_path: str | Path) -> PreflightReport:
+    """
+    Cheap admission check run before an upload is queued: parses the cross-reference
+    table, counts pages, samples the text layer and estimates the prompt size.
+    """
+    try:
+        reader = PdfReader(str(pdf_path), strict=False)
+        encrypted = reader.is_encrypted
+        # Owner-password-only PDFs open with an empty user password
+        if encrypted and reader.decrypt("") == PasswordType.NOT_DECRYPTED:
+            return _reject("PDF is password protected.", encrypted=True)
+        pages = len(reader.pages)
+    except Exception as e:
+        logger.info(f"Preflight could not parse {Path(pdf_path).name}: {e}")
+        return _reject(f"PDF is corrupt or unreadable: {e}")
+
+    if pages == 0:
+        return _reject("PDF has no pages.", encrypted=encrypted)
+    if pages > PREFLIGHT_MAX_PAGES:
+        return _reject(f"PDF has {pages} pages, the limit is {PREFLIGHT_MAX_PAGES}.", pages=pages, encrypted=encrypted)
+
+    sampled = min(pages, PREFLIGHT_SAMPLE_PAGES)
+    try:
+        sample = "\n".join(reader.pages[i].extract_text() or "" for i in range(sampled))
+    except Exception as e:
+        return _reject(f"PDF text layer is unreadable: {e}", pages=pages, encrypted=encrypted)
+
+    has_text_layer = sum(c.isalnum() for c in sample) >= PREFLIGHT_MIN_TEXT_CHARS
+    estimated_tokens = count_tokens(sample) * pages // sampled
+    fields = {"pages": pages, "encrypted": encrypted, "has_text_layer": has_text_layer, "estimated_tokens": estimated_tokens}
+
+    if not has_text_layer:
+        if OCR_ENABLED:
+            return PreflightReport(decision=PreflightDecision.OCR, **fields)
+        return _reject("PDF has no text layer (scanned or image-only) and OCR is disabled.", **fields)
+    if estimated_tokens > PREFLIGHT_MAX_TOKENS:
+        return _reject(f"PDF text is too long (~{estimated_tokens} tokens, limit {PREFLIGHT_MAX_TOKENS}).", **fields)
+
+    return PreflightReport(decision=PreflightDecision.ACCEPT, **fields)
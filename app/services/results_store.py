@@ -0,0 +1,156 @@
+import logging
+from datetime import date, datetime, timezone
+from sqlalchemy import JSON, Boolean, Date, DateTime, Float, Integer, String, func, select
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.database import Base, get_session
+from app.schemas.invoices import ValidationResult
+from app.services.validator import rule_versions
+
+logger = logging.getLogger(__name__)
+
+RESULTS_MAX_PAGE_SIZE = 500
+
+
+class StoredResult(Base):
+    """One completed ValidationResult. The searchable fields are copied out of the payload and indexed."""
+
+    __tablename__ = "invoice_results"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id: Mapped[str | None] = mapped_column(String(64), unique=True)
+    digest: Mapped[str | None] = mapped_column(String(64), index=True)
+    filename: Mapped[str] = mapped_column(String(255))
+    is_valid: Mapped[bool] = mapped_column(Boolean, index=True)
+    invoice_number: Mapped[str | None] = mapped_column(String(64), index=True)
+    invoice_date: Mapped[date | None] = mapped_column(Date, index=True)
+    seller_ice: Mapped[str | None] = mapped_column(String(32), index=True)
+    client_ice: Mapped[str | None] = mapped_column(String(32), index=True)
+    total_ttc: Mapped[float | None] = mapped_column(Float)
+    issue_count: Mapped[int] = mapped_column(Integer, default=0)
+    issues: Mapped[list] = mapped_column(JSON)
+    extracted_data: Mapped[dict] = mapped_column(JSON)
+    # Rule name -> version the issues were computed with; NULL for results stored before versioning
+    rule_versions: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+def parse_invoice_date(date_str: str | None) -> date | None:
+    """Same DD/MM/YYYY reading as the validator; anything else is left unindexed."""
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str.replace("-", "/").replace(".", "/"), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def _columns(result: ValidationResult) -> dict:
+    data = result.extracted_data
+    return {
+        "filename": result.filename,
+        "is_valid": result.is_valid,
+        "invoice_number": data.meta.invoice_number,
+        "invoice_date": parse_invoice_date(data.meta.date),
+        "seller_ice": data.seller.ice,
+        "client_ice": data.client.ice,
+        "total_ttc": data.financials.total_ttc,
+        "issue_count": len(result.issues),
+        "issues": [issue.model_dump(mode="json") for issue in result.issues],
+        "extracted_data": data.model_dump(mode="json"),
+        "rule_versions": rule_versions(),
+    }
+
+
+def save_result(result: ValidationResult, task_id: str | None = None, digest: str | None = None) -> int:
+    """Inserts the result, or replaces it when the task already stored one (retries)."""
+    with get_session() as session, session.begin():
+        row = session.scalar(select(StoredResult).where(StoredResult.task_id == task_id)) if task_id else None
+        if row is None:
+            row = StoredResult(task_id=task_id)
+            session.add(row)
+        for name, value in _columns(result).items():
+            setattr(row, name, value)
+        row.digest = digest
+        row.created_at = datetime.now(timezone.utc)
+        session.flush()
+        return row.id
+
+
+def to_dict(row: StoredResult, include_data: bool = False) -> dict:
+    summary = {
+        "id": row.id,
+        "task_id": row.task_id,
+        "filename": row.filename,
+        "is_valid": row.is_valid,
+        "invoice_number": row.invoice_number,
+        "invoice_date": row.invoice_date.isoformat() if row.invoice_date else None,
+        "seller_ice": row.seller_ice,
+        "client_ice": row.client_ice,
+        "total_ttc": row.total_ttc,
+        "issue_count": row.issue_count,
+        "created_at": row.created_at.isoformat(),
+    }
+    if include_data:
+        summary["issues"] = row.issues
+        summary["extracted_data"] = row.extracted_data
+    return summary
+
+
+def result_filters(
+    seller_ice: str | None = None,
+    client_ice: str | None = None,
+    invoice_number: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    is_valid: bool | None = None,
+) -> list:
+    filters = []
+    if seller_ice:
+        filters.append(StoredResult.seller_ice == seller_ice)
+    if client_ice:
+        filters.append(StoredResult.client_ice == client_ice)
+    if invoice_number:
+        filters.append(StoredResult.invoice_number == invoice_number)
+    if date_from:
+        filters.append(StoredResult.invoice_date >= date_from)
+    if date_to:
+        filters.append(StoredResult.invoice_date <= date_to)
+    if is_valid is not None:
+        filters.append(StoredResult.is_valid == is_valid)
+    return filters
+
+
+def query_results(
+    seller_ice: str | None = None,
+    client_ice: str | None = None,
+    invoice_number: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    is_valid: bool | None = None,
+    page: int = 1,
+    page_size: int = 50,
+    include_data: bool = False,
+) -> dict:
+    filters = result_filters(seller_ice, client_ice, invoice_number, date_from, date_to, is_valid)
+    page_size = min(page_size, RESULTS_MAX_PAGE_SIZE)
+    with get_session() as session:
+        total = session.scalar(select(func.count()).select_from(StoredResult).where(*filters))
+        rows = session.scalars(
+            select(StoredResult).where(*filters)
+            .order_by(StoredResult.id.desc())
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        ).all()
+
+    return {
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "items": [to_dict(row, include_data) for row in rows],
+    }
+
+
+def get_result(result_id: int) -> dict | None:
+    with get_session() as session:
+        row = session.get(StoredResult, result_id)
+    return to_dict(row, include_data=True) if row else None
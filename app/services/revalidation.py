@@ -0,0 +1,172 @@
+"""
+Replays the current validation rules over stored extractions, so a rule change costs CPU
+seconds instead of another LLM pass over the PDFs.
+
+Each stored result records the rule versions its issues were computed with. Only rules whose
+version changed (or that are new) are re-run; issues of unchanged rules are kept as stored and
+issues of removed rules are dropped. Duplicate flags are kept: that check is not replayable.
+
+    python -m app.services.revalidation --date-from 2025-01-01 > diff.ndjson
+    python -m app.services.revalidation --date-from 2025-01-01 --write
+
+Nothing is written back without --write: a bare run only reports the diff.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import date
+from typing import Iterator, List
+from sqlalchemy import select
+from app.core.database import get_session
+from app.schemas.invoices import ErrorType, InvoiceExtractedData
+from app.services.results_store import StoredResult, result_filters
+from app.services.validator import DUPLICATE_RULE, RULES, Rule, rule_versions, run_rules
+
+# Results loaded, re-run and written back per transaction
+REVALIDATION_PAGE_SIZE = int(os.getenv("REVALIDATION_PAGE_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+def stale_rules(stored_versions: dict | None, full: bool = False) -> List[Rule]:
+    """Rules to re-run for a result validated with `stored_versions` (all of them if unknown or `full`)."""
+    if full or not stored_versions:
+        return list(RULES)
+    return [r for r in RULES if stored_versions.get(r.name) != r.version]
+
+
+def _rule_of(issue: dict) -> str | None:
+    # Results stored before issues were tagged: only the duplicate flag can be attributed
+    if issue.get("rule") is None and issue["error_type"] == ErrorType.DUPLICATE_INVOICE.value:
+        return DUPLICATE_RULE
+    return issue.get("rule")
+
+
+def replay(extracted_data: dict, issues: List[dict], stale: List[Rule], timings: dict | None = None) -> List[dict]:
+    """
+    New issue list for one stored result: fresh issues for the `stale` rules, stored ones for
+    the rest, in the same order a full validation would report them.
+    """
+    data = InvoiceExtractedData.model_validate(extracted_data)
+    fresh = {}
+    for issue in run_rules(data, stale, timings):
+        fresh.setdefault(issue.rule, []).append(issue.model_dump(mode="json"))
+
+    stale_names = {r.name for r in stale}
+    replayed = []
+    for r in RULES:
+        if r.name in stale_names:
+            replayed += fresh.get(r.name, [])
+        else:
+            replayed += [issue for issue in issues if _rule_of(issue) == r.name]
+    return replayed + [issue for issue in issues if _rule_of(issue) == DUPLICATE_RULE]
+
+
+def _needs_replay(row: StoredResult, stale: List[Rule], current: dict) -> bool:
+    # A removed rule leaves nothing stale but its issues still have to go
+    return bool(stale) or row.rule_versions != current
+
+
+def revalidate(
+    full: bool = False,
+    dry_run: bool = False,
+    page_size: int = REVALIDATION_PAGE_SIZE,
+    **filters,
+) -> Iterator[dict]:
+    """
+    Re-validates the stored results matching `filters` (see result_filters) and yields one
+    diff per result whose issues changed, then a summary with the time spent in each rule.
+    With dry_run nothing is written back.
+    """
+    current = rule_versions()
+    where = result_filters(**filters)
+    timings, runs = {}, {}
+    scanned = revalidated = changed = failed = 0
+    started = time.perf_counter()
+    last_id = 0
+
+    while True:
+        diffs = []
+        with get_session() as session, session.begin():
+            rows = session.scalars(
+                select(StoredResult).where(StoredResult.id > last_id, *where).order_by(StoredResult.id).limit(page_size)
+            ).all()
+            if not rows:
+                break
+
+            for row in rows:
+                last_id = row.id
+                scanned += 1
+                stale = stale_rules(row.rule_versions, full)
+                if not _needs_replay(row, stale, current):
+                    continue
+
+                try:
+                    issues = replay(row.extracted_data, row.issues, stale, timings)
+                except Exception as e:
+                    logger.warning(f"Could not re-validate result {row.id}: {e}")
+                    failed += 1
+                    diffs.append({"id": row.id, "task_id": row.task_id, "error": str(e)})
+                    continue
+                revalidated += 1
+                for r in stale:
+                    runs[r.name] = runs.get(r.name, 0) + 1
+
+                added = [issue for issue in issues if issue not in row.issues]
+                removed = [issue for issue in row.issues if issue not in issues]
+                if added or removed:
+                    changed += 1
+                    diffs.append({
+                        "id": row.id,
+                        "task_id": row.task_id,
+                        "filename": row.filename,
+                        "was_valid": row.is_valid,
+                        "is_valid": not issues,
+                        "rules": [r.name for r in stale],
+                        "added": added,
+                        "removed": removed,
+                    })
+
+                if not dry_run:
+                    row.issues, row.issue_count, row.is_valid = issues, len(issues), not issues
+                    row.rule_versions = current
+
+        # Yielded outside the transaction: a slow reader must not hold the database
+        yield from diffs
+
+    yield {"summary": {
+        "scanned": scanned,
+        "revalidated": revalidated,
+        "changed": changed,
+        "failed": failed,
+        "dry_run": dry_run,
+        "rule_versions": current,
+        "rule_runs": runs,
+        "rule_seconds": {name: round(seconds, 6) for name, seconds in timings.items()},
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Re-run every rule, not only those whose version changed")
+    parser.add_argument("--write", action="store_true", help="Update the stored results (by default the diff is only printed)")
+    parser.add_argument("--seller-ice")
+    parser.add_argument("--client-ice")
+    parser.add_argument("--invoice-number")
+    parser.add_argument("--date-from", type=date.fromisoformat, help="Invoice date lower bound (YYYY-MM-DD)")
+    parser.add_argument("--date-to", type=date.fromisoformat, help="Invoice date upper bound (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    for line in revalidate(
+        full=args.full, dry_run=not args.write, seller_ice=args.seller_ice, client_ice=args.client_ice,
+        invoice_number=args.invoice_number, date_from=args.date_from, date_to=args.date_to,
+    ):
+        sys.stdout.write(json.dumps(line) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import re
+import logging
+from typing import List
+from app.schemas.invoices import InvoiceExtractedData
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a rule changes so cached extractions are invalidated.
+RULES_VERSION = "1"
+
+SECTIONS = ("meta", "seller", "client", "items", "financials")
+
+# Fields that must be filled before the LLM can be skipped for a section.
+# Addresses and RC are best-effort: they are kept when found but never block the fast path.
+REQUIRED_FIELDS = {
+    "meta": ("invoice_number", "date"),
+    "seller": ("name", "ice", "if_"),
+    "client": ("name", "ice"),
+}
+
+# --- 1. Compiled Patterns ---
+
+_AMOUNT = r"\d{1,3}(?:[ \u00a0\u202f.,]\d{3})*(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+_DECIMAL_AMOUNT = r"\d{1,3}(?:[ \u00a0\u202f.,]\d{3})*[.,]\d{2}|\d+[.,]\d{2}"
+
+ICE_RE = re.compile(r"\bI\.?C\.?E\.?\b(?P<label>[^:\d\n]{0,20})[:：°]?\s*(?P<value>\d(?:[ .-]?\d){14})(?!\d)", re.IGNORECASE)
+IF_RE = re.compile(r"(?:\bI\.F\.?|\bIF\b|Identifiant\s+Fiscal|الرقم الضريبي)\s*(?:N°|n°)?\s*[:：]?\s*(?P<value>\d{5,10})(?!\d)", re.IGNORECASE)
+RC_RE = re.compile(r"(?:\bR\.C\.?|\bRC\b|Registre\s+de\s+Commerce)\s*(?:N°|n°)?\s*[:：]?\s*(?P<value>\d{1,10})(?!\d)", re.IGNORECASE)
+INVOICE_NUMBER_RE = re.compile(
+    r"(?:Facture\s*(?:N°|No\.?|Num(?:éro|ero)?|#)|N°\s*(?:de\s+)?Facture|Invoice\s*(?:No\.?|#|Number))"
+    r"\s*[:：]?\s*(?P<value>[A-Z0-9][A-Z0-9/_.-]*\d[A-Z0-9/_.-]*)",
+    re.IGNORECASE,
+)
+DATE_RE = re.compile(
+    r"\bDate(?:\s+(?:de\s+)?(?:la\s+)?(?:facture|facturation|d'émission|d’émission))?\s*[:：]?\s*"
+    r"(?P<value>\d{1,2}[/.-]\d{1,2}[/.-]\d{4})",
+    re.IGNORECASE,
+)
+CLIENT_HEADER_RE = re.compile(r"^\s*(?:FACTUR[ÉE]\s+(?:À|A|AU\s+CLIENT)|CLIENT)\s*[:：]?\s*(?P<rest>.*)$", re.IGNORECASE)
+LEGAL_FORM_RE = re.compile(r"\b(?:S\.?A\.?R\.?L\.?(?:\s*A\.?U\.?)?|SARLAU|S\.?A\.?|S\.?N\.?C\.?)\s*$", re.IGNORECASE)
+ITEM_LINE_RE = re.compile(
+    rf"^(?P<description>.*?[A-Za-zÀ-ÿ].*?)\s+(?P<quantity>\d+(?:[.,]\d+)?)\s+"
+    rf"(?P<unit_price>{_DECIMAL_AMOUNT})\s*(?:DH|MAD)?\s+(?P<total_line>{_DECIMAL_AMOUNT})\s*(?:DH|MAD)?\s*$",
+    re.IGNORECASE,
+)
+AMOUNT_AT_END_RE = re.compile(rf"(?P<value>{_AMOUNT})\s*(?:DH|MAD|DHS)?\s*$", re.IGNORECASE)
+
+TOTAL_HT_RE = re.compile(r"\b(?:Total|Montant)\s+H\.?T\.?\b", re.IGNORECASE)
+TOTAL_TTC_RE = re.compile(r"\b(?:Total|Montant)\s+T\.?T\.?C\.?\b|\bNet\s+[àa]\s+payer\b", re.IGNORECASE)
+TOTAL_TVA_RE = re.compile(r"\b(?:Total\s+|Montant\s+)?T\.?V\.?A\.?\b", re.IGNORECASE)
+TOTAL_LINE_RE = re.compile(r"^\s*(?:Total|Montant|Net|T\.?V\.?A)", re.IGNORECASE)
+
+
+# --- 2. Helpers ---
+
+def parse_amount(raw: str) -> float | None:
+    """Parses French/Moroccan formatted amounts: '2 000,00', '2.000,00', '2,000.00', '2000.00'."""
+    value = re.sub(r"[ \u00a0\u202f]", "", raw.strip())
+    if not value:
+        return None
+
+    if "," in value and "." in value:
+        decimal_sep = "," if value.rfind(",") > value.rfind(".") else "."
+        thousands_sep = "." if decimal_sep == "," else ","
+        value = value.replace(thousands_sep, "").replace(decimal_sep, ".")
+    elif "," in value:
+        head, _, tail = value.rpartition(",")
+        value = f"{head.replace(',', '')}.{tail}" if len(tail) <= 2 else value.replace(",", "")
+    elif value.count(".") > 1 or ("." in value and len(value.rpartition(".")[2]) == 3):
+        value = value.replace(".", "")
+
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _unique(values: List[str]) -> str | None:
+    """A rule is only confident when every match agrees."""
+    distinct = set(values)
+    return distinct.pop() if len(distinct) == 1 else None
+
+
+def _client_block(lines: List[str]) -> tuple[int, int] | None:
+    for index, line in enumerate(lines):
+        if CLIENT_HEADER_RE.match(line):
+            return index, min(index + 6, len(lines))
+    return None
+
+
+# --- 3. Field Rules ---
+
+def _extract_identifiers(text: str, lines: List[str], fields: dict) -> None:
+    block = _client_block(lines)
+    client_span = None
+    if block:
+        start = sum(len(line) + 1 for line in lines[:block[0]])
+        end = sum(len(line) + 1 for line in lines[:block[1]])
+        client_span = (start, end)
+
+    seller_ices, client_ices = [], []
+    for match in ICE_RE.finditer(text):
+        value = re.sub(r"\D", "", match.group("value"))
+        in_client_block = client_span and client_span[0] <= match.start() < client_span[1]
+        if "client" in match.group("label").lower() or in_client_block:
+            client_ices.append(value)
+        else:
+            seller_ices.append(value)
+
+    fields["seller"]["ice"] = _unique(seller_ices)
+    fields["client"]["ice"] = _unique(client_ices)
+    fields["seller"]["if_"] = _unique([m.group("value") for m in IF_RE.finditer(text)])
+    fields["seller"]["rc"] = _unique([m.group("value") for m in RC_RE.finditer(text)])
+
+
+def _extract_meta(text: str, lines: List[str], fields: dict) -> None:
+    fields["meta"]["invoice_number"] = _unique([m.group("value") for m in INVOICE_NUMBER_RE.finditer(text)])
+
+    dates = []
+    for line in lines:
+        if "échéance" in line.lower() or "echeance" in line.lower():
+            continue
+        dates += [m.group("value") for m in DATE_RE.finditer(line)]
+    fields["meta"]["date"] = _unique(dates)
+
+
+def _extract_names(lines: List[str], fields: dict) -> None:
+    block = _client_block(lines)
+    header_index = block[0] if block else len(lines)
+
+    for line in lines[:header_index]:
+        candidate = line.strip()
+        if candidate and LEGAL_FORM_RE.search(candidate) and not any(c.isdigit() for c in candidate):
+            fields["seller"]["name"] = candidate
+            break
+
+    if block:
+        rest = CLIENT_HEADER_RE.match(lines[header_index]).group("rest").strip()
+        following = [line.strip() for line in lines[header_index + 1:block[1]] if line.strip()]
+        name = rest or (following[0] if following else None)
+        if name and not ICE_RE.search(name) and not any(c.isdigit() for c in name):
+            fields["client"]["name"] = name
+
+
+def _extract_totals(lines: List[str]) -> dict | None:
+    totals = {"total_ht": [], "total_tva": [], "total_ttc": []}
+
+    for line in lines:
+        amount_match = AMOUNT_AT_END_RE.search(line)
+        if not amount_match:
+            continue
+        label = line[:amount_match.start()]
+        amount = parse_amount(amount_match.group("value"))
+        if amount is None:
+            continue
+
+        if TOTAL_TTC_RE.search(label):
+            totals["total_ttc"].append(amount)
+        elif TOTAL_HT_RE.search(label):
+            totals["total_ht"].append(amount)
+        elif TOTAL_TVA_RE.search(label) and TOTAL_LINE_RE.match(label):
+            totals["total_tva"].append(amount)
+
+    if not all(totals.values()):
+        return None
+
+    financials = {name: values[-1] for name, values in totals.items()}
+
+    # Only trust the totals block when it is internally consistent. Anything else goes
+    # to the LLM so the validator still sees what is actually written on the invoice.
+    if abs(financials["total_ht"] + financials["total_tva"] - financials["total_ttc"]) > 0.05:
+        return None
+    return financials
+
+
+def _extract_items(lines: List[str], total_ht: float | None) -> List[dict] | None:
+    if total_ht is None:
+        return None
+
+    items = []
+    for line in lines:
+        if TOTAL_LINE_RE.match(line):
+            continue
+        match = ITEM_LINE_RE.match(line.strip())
+        if not match:
+            continue
+
+        item = {
+            "description": match.group("description").strip(),
+            "quantity": parse_amount(match.group("quantity")),
+            "unit_price": parse_amount(match.group("unit_price")),
+            "total_line": parse_amount(match.group("total_line")),
+        }
+        if None in item.values() or abs(item["quantity"] * item["unit_price"] - item["total_line"]) > 0.10:
+            return None
+        items.append(item)
+
+    if not items or abs(sum(item["total_line"] for item in items) - total_ht) > 0.05:
+        return None
+    return items
+
+
+# --- 4. Public API ---
+
+def extract_fields(text: str) -> dict:
+    """
+    Runs the deterministic rules over the raw PDF text.
+    Returns a partial extraction shaped like InvoiceExtractedData, with None
+    wherever a rule did not find a single unambiguous value.
+    """
+    lines = text.splitlines()
+    fields = {
+        "meta": {"invoice_number": None, "date": None},
+        "seller": {"name": None, "address": None, "ice": None, "if_": None, "rc": None},
+        "client": {"name": None, "address": None, "ice": None, "if_": None, "rc": None},
+        "items": None,
+        "financials": None,
+    }
+
+    _extract_identifiers(text, lines, fields)
+    _extract_meta(text, lines, fields)
+    _extract_names(lines, fields)
+    fields["financials"] = _extract_totals(lines)
+    fields["items"] = _extract_items(lines, (fields["financials"] or {}).get("total_ht"))
+
+    return fields
+
+
+def missing_sections(fields: dict) -> List[str]:
+    missing = []
+    for section in SECTIONS:
+        if section in REQUIRED_FIELDS:
+            if any(fields[section][name] is None for name in REQUIRED_FIELDS[section]):
+                missing.append(section)
+        elif fields[section] is None:
+            missing.append(section)
+    return missing
+
+
+def merge_extraction(fields: dict, llm_data: dict | None = None) -> InvoiceExtractedData:
+    """Overlays the rule results on top of the LLM output. Rule values win: they are only set when unambiguous."""
+    merged = dict(llm_data or {})
+
+    for section in SECTIONS:
+        rule_value = fields[section]
+        if section in REQUIRED_FIELDS:
+            base = dict(merged.get(section) or {})
+            base.update({name: value for name, value in rule_value.items() if value is not None})
+            merged[section] = base
+        elif rule_value is not None:
+            merged[section] = rule_value
+
+    # Chunked extraction makes every section optional: a document where neither the rules nor
+    # the LLM found lines or totals still validates, and the validator reports what is missing
+    if merged.get("items") is None:
+        merged["items"] = []
+    if merged.get("financials") is None:
+        merged["financials"] = {}
+
+    return InvoiceExtractedData.model_validate(merged)
@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+from app.celery_app import INTERACTIVE_QUEUE, BULK_QUEUE, PRIORITY_STEPS
+from app.core.redis_client import get_redis, get_async_redis
+from app.schemas.invoices import PreflightDecision, PreflightReport
+
+# Invoices above this prompt size (or needing OCR) take long enough to go to the bulk queue even when sent alone
+INTERACTIVE_MAX_TOKENS = int(os.getenv("INTERACTIVE_MAX_TOKENS", "3000"))
+# Every this many invoices a tenant already has waiting lowers the priority of its next ones by one step
+TENANT_FAIR_SHARE_STEP = int(os.getenv("TENANT_FAIR_SHARE_STEP", "100"))
+TENANT_HEADER = "X-Tenant-ID"
+# Reverse proxies (comma-separated addresses) that authenticate callers and set TENANT_HEADER for them.
+# The header of anyone else is ignored: the tenant is then the caller's address, as for the rate limiter.
+TENANT_TRUSTED_PROXIES = {h.strip() for h in os.getenv("TENANT_TRUSTED_PROXIES", "").split(",") if h.strip()}
+DEFAULT_TENANT = "default"
+TENANT_LOAD_PREFIX = "tenant-load:"
+# The backlog is counted in hourly buckets and only the last TENANT_LOAD_WINDOW_SECONDS count:
+# slots of a task that never reports back (lost message, killed worker) age out even for a busy tenant
+TENANT_LOAD_BUCKET_SECONDS = 3600
+TENANT_LOAD_WINDOW_SECONDS = int(os.getenv("TENANT_LOAD_WINDOW_SECONDS", str(24 * 3600)))
+# A bucket lives until it has left the window, whether it was last touched by a reserve or a release
+TENANT_LOAD_KEY_TTL_SECONDS = TENANT_LOAD_WINDOW_SECONDS + TENANT_LOAD_BUCKET_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def choose_queue(report: PreflightReport) -> str:
+    if report.decision == PreflightDecision.OCR or report.estimated_tokens > INTERACTIVE_MAX_TOKENS:
+        return BULK_QUEUE
+    return INTERACTIVE_QUEUE
+
+
+def tenant_priority(waiting: int) -> int:
+    """0 for a tenant with nothing queued, one step lower per TENANT_FAIR_SHARE_STEP waiting invoices."""
+    return min(PRIORITY_STEPS[-1], waiting // TENANT_FAIR_SHARE_STEP)
+
+
+def _load_key(queue: str, tenant: str, bucket: int) -> str:
+    return f"{TENANT_LOAD_PREFIX}{queue}:{tenant}:{bucket}"
+
+
+def _window() -> range:
+    current = int(time.time() // TENANT_LOAD_BUCKET_SECONDS)
+    return range(current - TENANT_LOAD_WINDOW_SECONDS // TENANT_LOAD_BUCKET_SECONDS + 1, current + 1)
+
+
+async def reserve_slots(tenant: str, queue: str, count: int) -> tuple[list, int]:
+    """
+    Counts `count` new invoices against the tenant's backlog on `queue` and returns their priorities,
+    with the bucket they were counted in (for tenant_headers).
+    A tenant's first invoices go out at top priority and its tail sinks, so a small batch from
+    another tenant overtakes a 5,000-invoice dump instead of waiting behind all of it.
+    """
+    window = _window()
+    bucket = window[-1]
+    key = _load_key(queue, tenant, bucket)
+    try:
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.mget([_load_key(queue, tenant, b) for b in window])
+            pipe.incrby(key, count).expire(key, TENANT_LOAD_KEY_TTL_SECONDS)
+            counts, _, _ = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read the backlog of tenant {tenant}: {e}")
+        return [0] * count, bucket
+    # A bucket goes negative when a release lands after its reservations aged out
+    waiting = sum(max(0, int(c)) for c in counts if c is not None)
+    return [tenant_priority(waiting + i) for i in range(count)], bucket
+
+
+def tenant_headers(tenant: str, queue: str, count: int, bucket: int) -> dict:
+    """Message headers telling the worker whose backlog to release once the task is done."""
+    return {"tenant": tenant, "tenant_queue": queue, "tenant_slots": count, "tenant_bucket": bucket}
+
+
+def tenant_headers_of(request) -> dict:
+    """The tenant headers a running task was sent with, for the message that retries it."""
+    if getattr(request, "tenant_bucket", None) is None:
+        return {}
+    return tenant_headers(request.tenant, request.tenant_queue, request.tenant_slots, request.tenant_bucket)
+
+
+def tenant_from_header(value: str | None) -> str:
+    tenant = "".join(c for c in (value or "") if c.isalnum() or c in "-_.:")[:64]
+    return tenant or DEFAULT_TENANT
+
+
+def tenant_of(client_host: str | None, header: str | None) -> str:
+    """The tenant a trusted proxy named, else the caller's address: a client cannot pick a fresh tenant per upload."""
+    if header and client_host in TENANT_TRUSTED_PROXIES:
+        return tenant_from_header(header)
+    return tenant_from_header(client_host)
+
+
+def release_slots(tenant: str, queue: str, count: int, bucket: int) -> None:
+    key = _load_key(queue, tenant, bucket)
+    try:
+        get_redis().pipeline().decrby(key, count).expire(key, TENANT_LOAD_KEY_TTL_SECONDS).execute()
+    except Exception as e:
+        logger.warning(f"Could not update the backlog of tenant {tenant}: {e}")
+
+
+async def arelease_slots(tenant: str, queue: str, count: int, bucket: int) -> None:
+    """release_slots for the API, when the reserved tasks could not be published."""
+    key = _load_key(queue, tenant, bucket)
+    try:
+        async with get_async_redis().pipeline() as pipe:
+            await pipe.decrby(key, count).expire(key, TENANT_LOAD_KEY_TTL_SECONDS).execute()
+    except Exception as e:
+        logger.warning(f"Could not update the backlog of tenant {tenant}: {e}")
+
+
+def release_request_slots(request) -> None:
+    """Releases the slots of a finished, revoked or expired task (messages sent without them are ignored)."""
+    if getattr(request, "tenant_bucket", None) is not None:
+        release_slots(request.tenant, request.tenant_queue, request.tenant_slots, request.tenant_bucket)
@@ -0,0 +1,11 @@
+import math
+
+
+# Mistral's tokenizer splits numbers into single digits, and invoice text is digit heavy,
+# so digits are counted one token each and the rest at ~3.5 characters per token.
+# Deliberately conservative: overshooting the vLLM context length fails the request.
+# Kept apart from ocr_engine so the API can estimate sizes without loading the LLM stack.
+
+def count_tokens(text: str) -> int:
+    digits = sum(c.isdigit() for c in text)
+    return digits + math.ceil((len(text) - digits) / 3.5)
@@ -1,11 +1,54 @@
+import time
 import logging
-from typing import List
+from typing import Callable, List
 from app.schemas.invoices import InvoiceExtractedData, ValidationIssue, Financials, ErrorType, InvoiceItem
+from app.services.duplicate_index import DuplicateIndex, duplicate_key
 from datetime import datetime, timedelta
 
 
 logger = logging.getLogger(__name__)
 
+# Issues from the duplicate check carry this rule name. It is not in the registry: it records
+# the invoice in the index, so replaying it over stored results would flag every one of them.
+DUPLICATE_RULE = "duplicate_invoice"
+
+
+class Rule:
+    __slots__ = ("name", "version", "check")
+
+    def __init__(self, name: str, version: int, check: Callable[[InvoiceExtractedData], List[ValidationIssue]]):
+        self.name, self.version, self.check = name, version, check
+
+
+# Registration order is the order issues are reported in
+RULES: List[Rule] = []
+
+
+def rule(name: str, version: int = 1):
+    """Registers a check. Bump `version` whenever its logic changes: stored results are then re-run for it."""
+    def register(check):
+        RULES.append(Rule(name, version, check))
+        return check
+    return register
+
+
+def rule_versions() -> dict:
+    return {r.name: r.version for r in RULES}
+
+
+def run_rules(data: InvoiceExtractedData, rules: List[Rule] | None = None, timings: dict | None = None) -> List[ValidationIssue]:
+    """Runs `rules` (default: all) in registry order and tags each issue with its rule. Adds seconds per rule to `timings`."""
+    issues = []
+    for r in RULES if rules is None else rules:
+        started = time.perf_counter()
+        found = r.check(data)
+        if timings is not None:
+            timings[r.name] = timings.get(r.name, 0.0) + time.perf_counter() - started
+        for issue in found:
+            issue.rule = r.name
+        issues += found
+    return issues
+
 
 def _validate_ice(ice: str | None, entity_type: str = "Seller") -> List[ValidationIssue]:
     issues = []
@@ -75,7 +118,8 @@ def _validate_math_integrity(data: InvoiceExtractedData) -> List[ValidationIssue
 
     calculated_total_ht = sum(item.total_line for item in data.items)
 
-    if abs(calculated_total_ht - financials.total_ht) > 1.00:
+    # Missing totals are reported by the required-metadata rule
+    if financials.total_ht is not None and abs(calculated_total_ht - financials.total_ht) > 1.00:
         issues.append(ValidationIssue(
             field="Total HT",
             error_type=ErrorType.MATH_MISMATCH,
@@ -85,6 +129,9 @@ def _validate_math_integrity(data: InvoiceExtractedData) -> List[ValidationIssue
             )
         ))
 
+    if None in (financials.total_ht, financials.total_tva, financials.total_ttc):
+        return issues
+
     expected_ttc = financials.total_ht + financials.total_tva
 
     if abs(expected_ttc - financials.total_ttc) > 0.50:
@@ -105,7 +152,7 @@ def _validate_math_integrity(data: InvoiceExtractedData) -> List[ValidationIssue
 def _validate_tax_consistency(financials: Financials) -> List[ValidationIssue]:
     issues = []
     
-    if financials.total_ht == 0:
+    if not financials.total_ht or financials.total_tva is None:
         return issues
     
     implied_rate = financials.total_tva / financials.total_ht
@@ -167,6 +214,14 @@ def _validate_required_metadata(data: InvoiceExtractedData) -> List[ValidationIs
             message="Client Name is missing. We cannot verify who was billed."
         ))
 
+    for field, value in (("Total HT", data.financials.total_ht), ("Total TVA", data.financials.total_tva), ("Total TTC", data.financials.total_ttc)):
+        if value is None:
+            issues.append(ValidationIssue(
+                field=field,
+                error_type=ErrorType.MISSING_DATA,
+                message=f"{field} is missing."
+            ))
+
     return issues
 
 
@@ -208,18 +263,68 @@ def _validate_date_logic(date_str: str | None) -> List[ValidationIssue]:
 
     return issues
 
-def validate_invoice(data: InvoiceExtractedData) -> List[ValidationIssue]:
+# --- Rule registry ---
+
+@rule("seller_ice", version=1)
+def _check_seller_ice(data: InvoiceExtractedData) -> List[ValidationIssue]:
+    return _validate_ice(data.seller.ice, entity_type="Seller")
+
+@rule("client_ice", version=1)
+def _check_client_ice(data: InvoiceExtractedData) -> List[ValidationIssue]:
+    return _validate_ice(data.client.ice, entity_type="Client")
+
+@rule("math_integrity", version=2)
+def _check_math_integrity(data: InvoiceExtractedData) -> List[ValidationIssue]:
+    return _validate_math_integrity(data)
+
+@rule("tax_consistency", version=2)
+def _check_tax_consistency(data: InvoiceExtractedData) -> List[ValidationIssue]:
+    return _validate_tax_consistency(data.financials)
+
+@rule("required_metadata", version=2)
+def _check_required_metadata(data: InvoiceExtractedData) -> List[ValidationIssue]:
+    return _validate_required_metadata(data)
+
+@rule("date_logic", version=1)
+def _check_date_logic(data: InvoiceExtractedData) -> List[ValidationIssue]:
+    return _validate_date_logic(data.meta.date)
+
+
+def _validate_uniqueness(data: InvoiceExtractedData, index: DuplicateIndex, reference: str) -> List[ValidationIssue]:
+    key = duplicate_key(data.seller.ice, data.meta.invoice_number, data.financials.total_ttc)
+    if key is None:
+        return []  # Missing ICE or number is already reported; nothing to match on
+
+    try:
+        first_seen = index.check_and_add(key, reference)
+    except Exception as e:
+        # The index is a cross-check, an outage must not fail the invoice itself
+        logger.warning(f"Duplicate index unavailable: {e}")
+        return []
+
+    if first_seen is None:
+        return []
+    return [ValidationIssue(
+        field="Invoice Number",
+        error_type=ErrorType.DUPLICATE_INVOICE,
+        rule=DUPLICATE_RULE,
+        message=f"Invoice {data.meta.invoice_number} from seller {data.seller.ice} with the same total was already submitted ({first_seen})."
+    )]
+
+
+def validate_invoice(data: InvoiceExtractedData, duplicate_index: DuplicateIndex | None = None, reference: str | None = None) -> List[ValidationIssue]:
+    """
+    Runs every check on one invoice. With a `duplicate_index`, the invoice is also
+    recorded under `reference` and flagged if another submission got there first.
+    """
     issues = []
 
     logger.info(f"Validating Invoice: {data.meta.invoice_number}")
     
     try:
-        issues += _validate_ice(data.seller.ice, entity_type="Seller")
-        issues += _validate_ice(data.client.ice, entity_type="Client")
-        issues += _validate_math_integrity(data)
-        issues += _validate_tax_consistency(data.financials)
-        issues += _validate_required_metadata(data)
-        issues += _validate_date_logic(data.meta.date)
+        issues += run_rules(data)
+        if duplicate_index is not None:
+            issues += _validate_uniqueness(data, duplicate_index, reference or "unknown")
 
     except Exception as e:
         logger.error(f"Validation crashed: {e}", exc_info=True)
@@ -1,32 +1,253 @@
 import os
-from app.celery_app import celery_app
-from app.services.invoice import process_invoice
+import json
+import time
+import asyncio
+import threading
+import httpx
+from celery.signals import task_postrun, task_prerun, task_revoked, worker_init
+from celery.utils.time import get_exponential_backoff_interval
+from app.celery_app import (
+    celery_app, PROCESS_INVOICE_TASK, PROCESS_INVOICE_CHUNK_TASK, AGGREGATE_BATCH_TASK, DELIVER_WEBHOOK_TASK,
+    BATCH_FAILED_TASK, BATCH_KEY_PREFIX,
+)
+from app.core.redis_client import get_redis
+from app.services.invoice import process_invoice, aprocess_invoice
+from app.services.ocr_engine import is_transient
+from app.services.deadlines import STAGE_DEADLINES, ocr_deadline
+from app.services.preflight import PREFLIGHT_MAX_PAGES
+from app.services.notifications import task_event, failure_event, batch_failures_event, publish_task_event, deliver_webhook
+from app.services.blob_store import get_blob_store, start_blob_sweeper
+from app.services.results_store import save_result
+from app.services.scheduling import release_request_slots, tenant_headers_of
+from app.core.metrics import STAGE_SECONDS, QUEUE_WAIT_SECONDS, TASK_RETRIES, record_outcome, start_worker_metrics_server
 from celery.utils.log import get_task_logger
 
 logger = get_task_logger(__name__)
 
-@celery_app.task(bind=True)
-def process_invoice_task(self, file_path: str):
-    logger.info(f"Started processing invoice: {file_path}")
+# Transient LLM failures (backend down, saturated or past its deadline) are retried with
+# exponential backoff and full jitter: 5s, 10s, 20s... capped at RETRY_BACKOFF_MAX_SECONDS.
+TASK_MAX_RETRIES = int(os.getenv("TASK_MAX_RETRIES", "6"))
+RETRY_BACKOFF_SECONDS = int(os.getenv("RETRY_BACKOFF_SECONDS", "5"))
+RETRY_BACKOFF_MAX_SECONDS = int(os.getenv("RETRY_BACKOFF_MAX_SECONDS", "300"))
+# Enforced by the prefork and gevent pools. The threads pool ignores them, which is why
+# every stage also has its own deadline (app.services.deadlines), OCR's sized for the longest scan.
+TASK_SOFT_TIME_LIMIT = int(os.getenv("TASK_SOFT_TIME_LIMIT", str(int(sum(STAGE_DEADLINES.values()) + ocr_deadline(PREFLIGHT_MAX_PAGES)) + 30)))
+TASK_TIME_LIMIT = int(os.getenv("TASK_TIME_LIMIT", str(TASK_SOFT_TIME_LIMIT + 30)))
+
+
+def _retry_countdown(retries: int) -> int:
+    return get_exponential_backoff_interval(RETRY_BACKOFF_SECONDS, retries, RETRY_BACKOFF_MAX_SECONDS, full_jitter=True)
+
+
+@worker_init.connect
+def _start_metrics_server(**kwargs):
+    start_worker_metrics_server()
+
+
+@worker_init.connect
+def _start_blob_sweeper(**kwargs):
+    start_blob_sweeper()
+
+
+@task_prerun.connect
+def _observe_queue_wait(task=None, **kwargs):
+    # Stamped by the before_task_publish handler in app.celery_app
+    enqueued_at = getattr(task.request, "enqueued_at", None)
+    if enqueued_at:
+        QUEUE_WAIT_SECONDS.labels(task.name).observe(max(0.0, time.time() - enqueued_at))
+
+
+@task_postrun.connect
+def _release_tenant_slots(task=None, state=None, **kwargs):
+    # Counted by reserve_slots when the API enqueued the task; a retry is still in the backlog
+    if state != "RETRY":
+        release_request_slots(task.request)
+
+
+@task_revoked.connect
+def _release_revoked_slots(request=None, **kwargs):
+    # Revoked and expired messages are dropped before they run, so task_postrun never sees them
+    release_request_slots(request)
+
+
+def _serialize(validation) -> dict:
+    with STAGE_SECONDS.labels("serialization").time():
+        return validation.model_dump()
+
+
+def _persist(validation, task_id: str, digest: str):
+    """The durable copy outlives the Redis result; failing to write it must not fail the invoice."""
+    try:
+        save_result(validation, task_id=task_id, digest=digest)
+    except Exception as e:
+        logger.warning(f"Could not store result of task {task_id}: {e}")
+
+
+def _publish(task_id: str, event: dict, callback_url: str | None = None):
+    publish_task_event(task_id, event)
+    if callback_url:
+        deliver_webhook_task.delay(callback_url, event)
+
+
+def _notify(task_id: str, result: dict, callback_url: str | None = None):
+    _publish(task_id, task_event(task_id, result), callback_url)
+
+
+def _fail(task_id: str, error: Exception, filename: str | None, callback_url: str | None = None):
+    record_outcome({"error": str(error), "status": "failed", "filename": filename})
+    _publish(task_id, failure_event(task_id, error), callback_url)
+
+
+@celery_app.task(
+    name=DELIVER_WEBHOOK_TASK,
+    autoretry_for=(httpx.HTTPError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=8,
+)
+def deliver_webhook_task(callback_url: str, event: dict):
+    deliver_webhook(callback_url, event)
+
+
+@celery_app.task(bind=True, name=PROCESS_INVOICE_TASK, soft_time_limit=TASK_SOFT_TIME_LIMIT, time_limit=TASK_TIME_LIMIT)
+def process_invoice_task(self, digest: str, filename: str | None = None, callback_url: str | None = None):
+    """
+    Blobs are content-addressed and shared between identical uploads, so they are not deleted here:
+    the blob sweeper removes them once BLOB_TTL_SECONDS pass without a new upload of the same file.
+    A failed invoice fails the task (FAILURE state) after a failure event is published.
+    """
+    logger.info(f"Started processing invoice: {filename} ({digest[:12]})")
     try:
         logger.debug("Sending file to pipeline...")
-        result = process_invoice(file_path)
+        with get_blob_store().fetch(digest) as path:
+            validation = process_invoice(str(path), filename=filename, digest=digest, reference=self.request.id)
+        result = _serialize(validation)
+        _persist(validation, self.request.id, digest)
         logger.debug("Pipeline complete.")
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.debug(f"Deleted temp file: {file_path}")
-
-        return result.model_dump()
-    
     except Exception as e:
-        logger.error(f"Processing failed for {file_path}: {e}", exc_info=True)
-        return {"error": str(e), "status": "failed"}
-    
-    finally:
-        if os.path.exists(file_path):
+        if is_transient(e) and self.request.retries < TASK_MAX_RETRIES:
+            # Frees this thread while the backend recovers; the invoice goes back to the queue
+            countdown = _retry_countdown(self.request.retries)
+            logger.warning(f"Transient failure for {filename}, retrying in {countdown}s: {e}")
+            TASK_RETRIES.labels(type(e).__name__).inc()
+            raise self.retry(exc=e, countdown=countdown, headers=tenant_headers_of(self.request))
+
+        logger.error(f"Processing failed for {filename} ({digest[:12]}): {e}", exc_info=True)
+        _fail(self.request.id, e, filename, callback_url)
+        raise
+
+    record_outcome(result)
+    _notify(self.request.id, result, callback_url)
+    return result
+
+
+# --- Async Worker Mode ---
+# Every chunk task of this process shares one event loop. Its coroutines queue on the same
+# adaptive LLM limiter as the thread-pool tasks, without a deadline as waiting is free there.
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="pipeline-event-loop", daemon=True).start()
+    return _event_loop
+
+
+async def _process_chunk(task, invoices: list) -> list:
+    async def attempt(invoice: dict):
+        digest = invoice["digest"]
+        with get_blob_store().fetch(digest) as path:
+            validation = await aprocess_invoice(str(path), filename=invoice["filename"], digest=digest, reference=invoice["task_id"])
+        await asyncio.to_thread(_persist, validation, invoice["task_id"], digest)
+        return _serialize(validation)
+
+    async def run_one(invoice: dict) -> dict:
+        task_id, filename = invoice["task_id"], invoice["filename"]
+        for retries in range(TASK_MAX_RETRIES + 1):
             try:
-                os.remove(file_path)
-                logger.info(f"Deleted temp file: {file_path}")
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to delete file: {cleanup_error}")
\ No newline at end of file
+                result = await attempt(invoice)
+                break
+            except Exception as e:
+                if is_transient(e) and retries < TASK_MAX_RETRIES:
+                    # Sleeping here costs a coroutine, not a thread: retry in place
+                    countdown = _retry_countdown(retries)
+                    logger.warning(f"Transient failure for {filename}, retrying in {countdown}s: {e}")
+                    TASK_RETRIES.labels(type(e).__name__).inc()
+                    await asyncio.sleep(countdown)
+                    continue
+
+                logger.error(f"Processing failed for {filename} ({invoice['digest'][:12]}): {e}", exc_info=True)
+                # Each invoice reports under its own task id, failures as FAILURE like single tasks
+                await asyncio.to_thread(task.backend.mark_as_failure, task_id, e)
+                await asyncio.to_thread(_fail, task_id, e, filename, invoice.get("callback_url"))
+                return {"error": str(e), "status": "failed", "filename": filename}
+
+        record_outcome(result)
+        await asyncio.to_thread(task.backend.store_result, task_id, result, "SUCCESS")
+        await asyncio.to_thread(_notify, task_id, result, invoice.get("callback_url"))
+        return result
+
+    return await asyncio.gather(*(run_one(invoice) for invoice in invoices))
+
+
+@celery_app.task(bind=True, name=PROCESS_INVOICE_CHUNK_TASK)
+def process_invoice_chunk_task(self, invoices: list):
+    """
+    Processes a chunk of invoices concurrently on the worker's event loop.
+    Each item is a dict with the blob digest, filename, the task_id to report under
+    and an optional callback_url.
+    """
+    logger.info(f"Started processing chunk of {len(invoices)} invoices")
+    future = asyncio.run_coroutine_threadsafe(_process_chunk(self, invoices), _get_event_loop())
+    return future.result()
+
+
+def _batch_counts(results: list) -> dict:
+    failed = sum(1 for r in results if "error" in r)
+    valid = sum(1 for r in results if "error" not in r and r.get("is_valid"))
+    return {"total": len(results), "valid": valid, "invalid": len(results) - failed - valid, "failed": failed}
+
+
+@celery_app.task(name=AGGREGATE_BATCH_TASK)
+def aggregate_batch_task(results: list, batch_id: str | None = None, callback_url: str | None = None):
+    """Chord body: runs once every invoice of a batch has been processed."""
+    # Chunked batches return one list of results per chunk
+    results = [r for chunk in results for r in (chunk if isinstance(chunk, list) else [chunk])]
+
+    counts = _batch_counts(results)
+    logger.info(f"Batch complete: {counts['total']} invoices, {counts['valid']} valid, {counts['failed']} failed")
+
+    if batch_id:
+        _notify(batch_id, counts, callback_url)
+
+    return {**counts, "results": results}
+
+
+@celery_app.task(name=BATCH_FAILED_TASK)
+def batch_failed_task(request, exc, traceback, batch_id: str | None = None, callback_url: str | None = None):
+    """
+    Chord error callback. A failed invoice fails its task, and Celery then skips the chord
+    body, so this counts the outcomes from the batch manifest and sends the batch event instead.
+    """
+    raw = get_redis().get(BATCH_KEY_PREFIX + batch_id) if batch_id else None
+    if raw is None:
+        logger.error(f"Batch {batch_id} failed and its manifest is gone: {exc}")
+        return
+
+    backend = celery_app.backend
+    task_ids = [task["task_id"] for task in json.loads(raw)["tasks"]]
+    metas = [backend.decode_result(value) if value else None for value in backend.mget([backend.get_key_for_task(t) for t in task_ids])]
+    results = [
+        meta["result"] if meta and meta["status"] == "SUCCESS" else {"error": str(meta["result"]) if meta else "missing result"}
+        for meta in metas
+    ]
+
+    counts = _batch_counts(results)
+    logger.info(f"Batch complete with failures: {counts['total']} invoices, {counts['valid']} valid, {counts['failed']} failed")
+    _publish(batch_id, batch_failures_event(batch_id, counts), callback_url)
@@ -0,0 +1,217 @@
+"""
+OpenAI-compatible stub standing in for vLLM, so the pipeline can be benchmarked on a CPU-only box.
+
+Answers /v1/chat/completions with JSON matching the requested schema: json_schema response
+formats (including the compact extraction schema) and tool calls are both supported. Values the rule extractor can read from the
+prompt are echoed back, and placeholders fill the rest. Latency is simulated as a fixed
+delay plus a per-output-token delay.
+
+    python -m benchmarks.fake_vllm --port 8001 --latency-ms 300 --ms-per-token 15
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.rule_extractor import extract_fields
+from app.services.tokens import count_tokens
+from app.services.compact_schema import COMPACT_SCHEMA_NAME, compress
+
+PLACEHOLDERS = {
+    "ice": "000000000000000",
+    "if_": "00000000",
+    "date": "01/01/2025",
+    "invoice_number": "FAC-0000",
+}
+
+
+def _resolve(schema: dict, defs: dict) -> dict:
+    if "$ref" in schema:
+        return _resolve(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"]
+            return _resolve(options[0], defs) if options else {"type": "null"}
+    return schema
+
+
+def sample(schema: dict, defs: dict, hint=None, name: str = ""):
+    """Builds a value matching `schema`, preferring `hint` (the rules' reading) where it has one."""
+    schema = _resolve(schema, defs)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((option for option in kind if option != "null"), "null")
+
+    if "prefixItems" in schema:
+        hint = hint if isinstance(hint, list) else []
+        return [sample(column, defs, hint[i] if i < len(hint) else None) for i, column in enumerate(schema["prefixItems"])]
+    if kind == "object":
+        hint = hint if isinstance(hint, dict) else {}
+        return {key: sample(prop, defs, hint.get(key), key) for key, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        if isinstance(hint, list) and hint:
+            return [sample(schema.get("items", {}), defs, item) for item in hint]
+        return [sample(schema.get("items", {}), defs)]
+    if hint is not None:
+        return hint
+    if kind in ("number", "integer"):
+        return 0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return PLACEHOLDERS.get(name, "N/A")
+
+
+def _prompt_text(messages: list) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content or "")
+    return "\n".join(parts)
+
+
+def build_completion(request: dict) -> tuple[dict, int]:
+    """Returns the chat completion body and the number of output tokens it stands for."""
+    text = _prompt_text(request.get("messages", []))
+    fields = extract_fields(text)
+
+    message = {"role": "assistant", "content": None}
+    response_format = request.get("response_format") or {}
+    tools = request.get("tools") or []
+
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        if response_format["json_schema"].get("name") == COMPACT_SCHEMA_NAME:
+            fields = compress(fields)
+        message["content"] = json.dumps(sample(schema, schema.get("$defs", {}), fields))
+        arguments = message["content"]
+    elif tools:
+        function = tools[0]["function"]
+        schema = function["parameters"]
+        arguments = json.dumps(sample(schema, schema.get("$defs", {}), fields))
+        message["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": arguments},
+        }]
+    else:
+        message["content"] = arguments = json.dumps(fields)
+
+    output_tokens = max(1, count_tokens(arguments))
+    prompt_tokens = max(1, count_tokens(text))
+    body = {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if "tool_calls" in message else "stop",
+            "logprobs": None,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": prompt_tokens + output_tokens,
+        },
+    }
+    return body, output_tokens
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeVLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": "not found"})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        body, output_tokens = build_completion(request)
+
+        time.sleep(self.server.latency + output_tokens * self.server.seconds_per_token)
+        self.server.requests += 1
+        self.server.output_tokens += output_tokens
+        self._send(200, body)
+
+
+class FakeVLLMServer:
+    """Runs the stub on a background thread. Usable as a context manager; `url` is the /v1 base."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, ms_per_token: float = 0.0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency_ms / 1000
+        self.httpd.seconds_per_token = ms_per_token / 1000
+        self.httpd.requests = 0
+        self.httpd.output_tokens = 0
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-vllm", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    @property
+    def output_tokens(self) -> int:
+        return self.httpd.output_tokens
+
+    def start(self) -> "FakeVLLMServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeVLLMServer(args.host, args.port, args.latency_ms, args.ms_per_token)
+    print(f"Fake vLLM listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
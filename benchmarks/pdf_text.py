@@ -0,0 +1,65 @@
+"""
+Compares the PDF text backends on speed and on whether the footer identifiers survive.
+
+Prints the mean extraction time per invoice and the share of invoices whose seller ICE
+and IF are still readable. It then recommends the fastest backend that keeps as many
+identifiers as the best one. Set that as PDF_TEXT_BACKEND.
+
+    python -m benchmarks.pdf_text [invoice.pdf ...] --count 30 --pages 2
+"""
+import time
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from benchmarks.synthetic import generate_corpus
+from app.services.pdf_text import TEXT_BACKENDS, text_quality
+
+
+def run(paths: list, backends: list, repeat: int = 3) -> dict:
+    report = {}
+    for name in backends:
+        backend = TEXT_BACKENDS[name]()
+        timings, intact = [], 0
+        for path in paths:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                texts = backend.extract(str(path))
+                timings.append((time.perf_counter() - start) * 1000)
+            quality = text_quality("\n".join(texts))
+            intact += quality["has_ice"] and quality["has_if"]
+        report[name] = {
+            "mean_ms": statistics.fmean(timings),
+            "p90_ms": sorted(timings)[int(0.9 * (len(timings) - 1))],
+            "intact_share": intact / len(paths),
+        }
+    return report
+
+
+def recommend(report: dict) -> str:
+    best_quality = max(stats["intact_share"] for stats in report.values())
+    candidates = [name for name, stats in report.items() if stats["intact_share"] >= best_quality]
+    return min(candidates, key=lambda name: report[name]["mean_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", type=Path, help="Real invoices to use instead of a synthetic corpus")
+    parser.add_argument("--count", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--items", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=list(TEXT_BACKENDS), choices=list(TEXT_BACKENDS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = args.pdfs or generate_corpus(Path(workdir), args.count, pages=args.pages, items=args.items, noise=3)
+        report = run(paths, args.backends, args.repeat)
+
+    for name, stats in report.items():
+        print(f"{name:>10}: mean {stats['mean_ms']:7.2f} ms | p90 {stats['p90_ms']:7.2f} ms | ICE+IF intact {stats['intact_share']:.0%}")
+    print(f"Recommended PDF_TEXT_BACKEND={recommend(report)}")
+
+
+if __name__ == "__main__":
+    main()
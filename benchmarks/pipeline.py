@@ -0,0 +1,181 @@
+"""
+Stage-by-stage micro-benchmark of the invoice pipeline, runnable on a CPU-only box.
+
+Generates a synthetic corpus, points the pipeline at the fake vLLM server and runs each
+invoice through the production code path (process_invoice, then the worker's serialisation).
+Stage times are read from the invoice_stage_seconds histogram those functions already feed:
+PDF loading, OCR, rule extraction, LLM calls, validation and serialisation. A stage an invoice
+skips (OCR on a text PDF, the LLM when the rules filled everything) records nothing for it.
+
+    python -m benchmarks.pipeline --invoices 50 --llm-share 0.5 --latency-ms 0
+    python -m benchmarks.pipeline --save benchmarks/baseline.json
+    python -m benchmarks.pipeline --check benchmarks/baseline.json --tolerance 1.5
+    EXTRACTION_MODE=compact python -m benchmarks.pipeline --ms-per-token 15
+
+--check exits with status 1 when any stage's median or p90 is slower than the baseline by
+more than the tolerance factor. Baselines are machine-specific: record them on the CI runner.
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+from benchmarks.synthetic import generate_corpus
+from benchmarks.fake_vllm import FakeVLLMServer
+from app.core.metrics import STAGE_SECONDS
+from app.services import ocr_engine, extraction_cache, duplicate_index
+from app.services.invoice import process_invoice
+from app.schemas.invoices import ValidationResult
+from app.worker import _serialize
+
+STAGES = ("load", "ocr", "rules", "llm", "validation", "serialization")
+# Stages this fast are dominated by timer noise, so they get an absolute allowance on top of the factor
+NOISE_FLOOR_MS = 0.5
+
+
+def _stage_seconds() -> dict:
+    """Total seconds observed so far per stage, from the process's STAGE_SECONDS histogram."""
+    totals = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_sum"):
+                totals[sample.labels["stage"]] = sample.value
+    return totals
+
+
+def use_llm_server(url: str):
+    """Repoints the cached LLM client and chains at another OpenAI-compatible server."""
+    ocr_engine.VLLM_API_URL = url
+    ocr_engine._cached_llm = None
+    ocr_engine._get_chain.cache_clear()
+
+
+def use_no_shared_state():
+    """No extraction cache (repeats would be cache hits) and no duplicate index (repeats would be flagged)."""
+    extraction_cache.CACHE_BACKEND = "none"
+    duplicate_index.DUPLICATE_INDEX_BACKEND = "none"
+
+
+def run_invoice(pdf_path: Path, timings: dict) -> ValidationResult:
+    """Runs one invoice like the worker does and appends the milliseconds each stage took to `timings`."""
+    before = _stage_seconds()
+    result = process_invoice(str(pdf_path))
+    _serialize(result)
+
+    for stage, total in _stage_seconds().items():
+        if stage in timings and total != before.get(stage):
+            timings[stage].append((total - before.get(stage, 0.0)) * 1000)
+    return result
+
+
+def _summary(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p90_ms": round(ordered[int(0.9 * (len(ordered) - 1))], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir, FakeVLLMServer(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token) as server:
+        use_llm_server(server.url)
+        use_no_shared_state()
+        paths = generate_corpus(
+            Path(workdir), args.invoices, pages=args.pages, items=args.items,
+            noise=args.noise, llm_share=args.llm_share, seed=args.seed,
+        )
+
+        # Warm-up, up to the first invoice needing the LLM: builds the chains and the HTTP client outside the timed runs
+        for path in paths:
+            run_invoice(path, {stage: [] for stage in STAGES})
+            if server.requests:
+                break
+        warmup_requests, warmup_tokens = server.requests, server.output_tokens
+
+        timings = {stage: [] for stage in STAGES}
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for path in paths:
+                run_invoice(path, timings)
+        elapsed = time.perf_counter() - start
+        llm_requests = server.requests - warmup_requests
+        output_tokens = server.output_tokens - warmup_tokens
+
+    processed = args.invoices * args.repeat
+    return {
+        "config": {key: getattr(args, key) for key in ("invoices", "pages", "items", "noise", "llm_share", "latency_ms", "ms_per_token", "repeat", "seed")},
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "stages": {stage: _summary(values) for stage, values in timings.items() if values},
+        "throughput_per_s": round(processed / elapsed, 2),
+        "llm_requests": llm_requests,
+        "extraction_mode": ocr_engine.EXTRACTION_MODE,
+        "output_tokens_per_request": round(output_tokens / llm_requests, 1) if llm_requests else 0,
+    }
+
+
+def check(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns one message per regressed stage. The p90 is checked as well as the median:
+    with a mixed corpus the median is the rules-only path and the p90 the LLM path.
+    """
+    regressions = []
+    for stage, stats in report["stages"].items():
+        reference = baseline["stages"].get(stage)
+        if reference is None:
+            continue
+        for metric in ("median_ms", "p90_ms"):
+            allowed = reference[metric] * tolerance + NOISE_FLOOR_MS
+            if stats[metric] > allowed:
+                regressions.append(f"{stage}: {metric} {stats[metric]:.2f} > {allowed:.2f} (baseline {reference[metric]:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--noise", type=int, default=3)
+    parser.add_argument("--llm-share", type=float, default=0.3, help="Fraction of invoices the rules cannot fill")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay of the fake vLLM server")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="Per-output-token delay of the fake vLLM server")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="Write the report as the new baseline")
+    parser.add_argument("--check", type=Path, help="Compare against a baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if args.check:
+        # Reuse the baseline's workload so the comparison is like for like
+        baseline = json.loads(args.check.read_text())
+        for key, value in baseline["config"].items():
+            setattr(args, key, value)
+
+    report = run(args)
+
+    print(f"{'stage':>14} | {'median':>9} | {'p90':>9} | {'mean':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:>14} | {stats['median_ms']:7.2f}ms | {stats['p90_ms']:7.2f}ms | {stats['mean_ms']:7.2f}ms")
+    print(f"throughput: {report['throughput_per_s']} invoices/s, {report['llm_requests']} LLM requests "
+          f"({report['extraction_mode']} mode, {report['output_tokens_per_request']} output tokens each)")
+
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.save}")
+
+    if args.check:
+        regressions = check(report, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.check} (tolerance x{args.tolerance})")
+
+
+if __name__ == "__main__":
+    main()
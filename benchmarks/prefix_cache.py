@@ -0,0 +1,82 @@
+"""
+Time-to-first-token benchmark for the extraction prompt layout.
+
+Compares the prefix-stable layout used by the pipeline ("split") with a layout
+that puts the invoice text first ("text_first"), which defeats vLLM's automatic
+prefix caching and shows what the instruction block costs when it is recomputed.
+
+    python -m benchmarks.prefix_cache --requests 20 [invoice.pdf ...]
+"""
+import time
+import random
+import argparse
+import statistics
+from openai import OpenAI
+from langchain_core.messages import convert_to_openai_messages
+from app.services.ocr_engine import (
+    VLLM_API_URL, MODEL_NAME, SYSTEM_PROMPT, USER_PROMPT, build_prompt, _load_pages,
+)
+
+SAMPLE_TEXT = """TECH SOLUTIONS SARL
+FACTURE N° FAC-{number}
+Date : {day:02d}/01/2025
+FACTURÉ À
+Client SA
+Service A 1 1 000,00 1 000,00
+Total HT 1 000,00 DH
+TVA (20%) 200,00 DH
+Total TTC 1 200,00 DH
+ICE : 123456789012345 | IF : 12345678 | RC : 98765
+"""
+
+
+def _messages(layout: str, text: str) -> list:
+    if layout == "split":
+        return convert_to_openai_messages(build_prompt().format_messages(text=text))
+    return [{"role": "user", "content": f"{USER_PROMPT.format(text=text)}\n{SYSTEM_PROMPT}"}]
+
+
+def _time_to_first_token(client: OpenAI, messages: list) -> float:
+    start = time.perf_counter()
+    stream = client.chat.completions.create(model=MODEL_NAME, messages=messages, max_tokens=8, temperature=0, stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            elapsed = time.perf_counter() - start
+            stream.close()
+            return elapsed
+    return time.perf_counter() - start
+
+
+def run(texts: list, layouts: list) -> dict:
+    client = OpenAI(base_url=VLLM_API_URL, api_key="EMPTY")
+    report = {}
+    for layout in layouts:
+        timings = [_time_to_first_token(client, _messages(layout, text)) for text in texts]
+        warm = timings[1:] or timings
+        report[layout] = {
+            "cold_ms": timings[0] * 1000,
+            "median_ms": statistics.median(warm) * 1000,
+            "p90_ms": sorted(warm)[int(0.9 * (len(warm) - 1))] * 1000,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", help="Invoices to use as prompt text (defaults to synthetic text)")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--layouts", nargs="+", default=["text_first", "split"], choices=["text_first", "split"])
+    args = parser.parse_args()
+
+    if args.pdfs:
+        texts = ["\n".join(_load_pages(pdf)) for pdf in args.pdfs]
+        texts = (texts * (args.requests // len(texts) + 1))[:args.requests]
+    else:
+        texts = [SAMPLE_TEXT.format(number=random.randint(1000, 9999), day=i % 28 + 1) for i in range(args.requests)]
+
+    for layout, stats in run(texts, args.layouts).items():
+        print(f"{layout:>10}: cold {stats['cold_ms']:7.1f} ms | median {stats['median_ms']:7.1f} ms | p90 {stats['p90_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
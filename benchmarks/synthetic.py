@@ -0,0 +1,168 @@
+"""
+Synthetic Moroccan invoice PDFs for the benchmarks.
+
+Writes minimal text-layer PDFs by hand (Helvetica, WinAnsi encoding) so no PDF
+library is needed. Invoices vary in page count, item count and noise lines.
+With rule_friendly=False the labels are reworded. The rule extractor then misses
+the header, and the pipeline has to ask the LLM.
+
+    python -m benchmarks.synthetic out_dir --count 20 --pages 2 --items 30
+"""
+import random
+import argparse
+from pathlib import Path
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+LINES_PER_PAGE = 60
+
+SELLERS = ["TECH SOLUTIONS SARL", "ATLAS DISTRIBUTION SA", "MAGHREB SERVICES SARL AU", "SOUSS TRADING SARL"]
+CLIENTS = ["Client SA", "Royal Import SARL", "Casa Logistique SA", "Fès Industries SARL"]
+CITIES = ["Casablanca", "Rabat", "Tanger", "Agadir", "Marrakech"]
+PRODUCTS = ["Service de maintenance", "Licence logiciel", "Câble réseau Cat6", "Écran 24 pouces", "Formation Excel", "Support technique"]
+NOISE = [
+    "Conditions générales de vente disponibles sur demande",
+    "Merci pour votre confiance",
+    "Page générée automatiquement - ne pas modifier",
+    "Pénalités de retard : 1,5% par mois",
+    "Tél : 05 22 00 00 00 | contact@example.ma",
+]
+
+
+def _amount(value: float) -> str:
+    whole, cents = f"{value:.2f}".split(".")
+    groups = []
+    while whole:
+        groups.insert(0, whole[-3:])
+        whole = whole[:-3]
+    return f"{' '.join(groups)},{cents}"
+
+
+def invoice_lines(rng: random.Random, items: int = 5, noise: int = 0, rule_friendly: bool = True) -> list:
+    seller, client = rng.choice(SELLERS), rng.choice(CLIENTS)
+    number = f"FAC-2025-{rng.randint(1, 9999):04d}"
+    date = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025"
+    ice = "".join(rng.choice("0123456789") for _ in range(15))
+    client_ice = "".join(rng.choice("0123456789") for _ in range(15))
+
+    if rule_friendly:
+        header = [seller, f"{rng.randint(1, 200)} Bd Zerktouni, {rng.choice(CITIES)}", f"FACTURE N° {number}", f"Date : {date}"]
+        client_block = ["FACTURÉ À", client, f"ICE Client : {client_ice}"]
+    else:
+        header = [seller, f"Réf. pièce {number} émise le {date}"]
+        client_block = [f"Destinataire {client}", f"Identifiant commun {client_ice}"]
+
+    lines = header + [""] + client_block + ["", "Désignation Qté P.U. Total"]
+
+    total_ht = 0.0
+    for _ in range(items):
+        quantity = rng.randint(1, 20)
+        unit_price = round(rng.uniform(10, 5000), 2)
+        line_total = round(quantity * unit_price, 2)
+        total_ht += line_total
+        lines.append(f"{rng.choice(PRODUCTS)} {quantity} {_amount(unit_price)} {_amount(line_total)}")
+        if noise and rng.random() < noise / 10:
+            lines.append(rng.choice(NOISE))
+
+    total_ht = round(total_ht, 2)
+    tva = round(total_ht * 0.2, 2)
+    lines += [
+        "",
+        f"Total HT {_amount(total_ht)} DH",
+        f"TVA (20%) {_amount(tva)} DH",
+        f"Total TTC {_amount(total_ht + tva)} DH",
+        "",
+        f"ICE : {ice} | IF : {rng.randint(10**7, 10**8 - 1)} | RC : {rng.randint(10**4, 10**5 - 1)}",
+    ]
+    lines += [rng.choice(NOISE) for _ in range(noise)]
+    return lines
+
+
+def _escape(line: str) -> bytes:
+    raw = line.encode("cp1252", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _content_stream(lines: list) -> bytes:
+    ops = [b"BT /F1 10 Tf 12 TL 50 800 Td"]
+    for line in lines:
+        ops.append(b"(" + _escape(line) + b") Tj T*")
+    ops.append(b"ET")
+    return b"\n".join(ops)
+
+
+def write_pdf(path: Path, pages: list) -> None:
+    """Writes one text-only page per entry of `pages` (a list of lines each)."""
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % len(pages),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    for page_id, lines in zip(page_ids, pages):
+        stream = _content_stream(lines)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] " % (PAGE_WIDTH, PAGE_HEIGHT)
+            + b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1)
+        )
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for number in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[number]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(out))
+
+
+def generate_invoice(path: Path, pages: int = 1, items: int = 5, noise: int = 0,
+                     rule_friendly: bool = True, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    lines = invoice_lines(rng, items, noise, rule_friendly)
+
+    # Spread the lines over the requested page count, overflowing onto extra pages if needed
+    per_page = max(-(-len(lines) // pages), 1)
+    per_page = min(per_page, LINES_PER_PAGE)
+    chunks = [lines[i:i + per_page] for i in range(0, len(lines), per_page)]
+
+    write_pdf(path, chunks)
+    return Path(path)
+
+
+def generate_corpus(directory: Path, count: int, pages: int = 1, items: int = 5, noise: int = 0,
+                    llm_share: float = 0.0, seed: int = 0) -> list:
+    """`llm_share` is the fraction of invoices written so that the rules cannot fill them."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        paths.append(generate_invoice(
+            directory / f"invoice_{i:04d}.pdf", pages=pages, items=items, noise=noise,
+            rule_friendly=rng.random() >= llm_share, seed=seed + i,
+        ))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--noise", type=int, default=0, help="Boilerplate lines added per invoice")
+    parser.add_argument("--llm-share", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.out_dir, args.count, args.pages, args.items, args.noise, args.llm_share, args.seed)
+    print(f"Wrote {len(paths)} invoices to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import pytest
+from app.core import database
+from app.schemas.invoices import ValidationResult
+from tests.test_validator import create_valid_invoice
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A results database of its own under tmp_path."""
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite:///{tmp_path / 'results.db'}")
+    monkeypatch.setattr(database, "_cached_engine", None)
+    monkeypatch.setattr(database, "_cached_sessionmaker", None)
+
+
+@pytest.fixture
+def make_result():
+    """Builds a validation result for a valid invoice with the given number, dated that day of January 2025."""
+    def make(number: str, day: int, is_valid: bool = True) -> ValidationResult:
+        data = create_valid_invoice()
+        data.meta.invoice_number = number
+        data.meta.date = f"{day:02d}/01/2025"
+        return ValidationResult(is_valid=is_valid, filename=f"{number}.pdf", issues=[], extracted_data=data)
+    return make
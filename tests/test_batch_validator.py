@@ -0,0 +1,52 @@
+import random
+from datetime import datetime, timedelta
+from app.services.batch_validator import validate_invoices, validate_records
+from app.services.validator import validate_invoice
+from app.schemas.invoices import InvoiceExtractedData
+
+
+def _random_invoice(rng: random.Random) -> InvoiceExtractedData:
+    items = []
+    for index in range(rng.randint(0, 4)):
+        quantity = rng.choice([1, 2, 3, 0.5])
+        unit_price = rng.choice([100.0, 250.5, 1000.0])
+        total_line = quantity * unit_price + rng.choice([0, 0, 0, 5.0])
+        items.append({"description": f"Service {index}", "quantity": quantity, "unit_price": unit_price, "total_line": total_line})
+
+    total_ht = sum(item["total_line"] for item in items) + rng.choice([0, 0, 10.0])
+    total_tva = round(total_ht * rng.choice([0.20, 0.14, 0.18]), 2)
+    date = (datetime.now() + timedelta(days=rng.choice([-400, -30, 0, 30]))).strftime(rng.choice(["%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"]))
+
+    return InvoiceExtractedData.model_validate({
+        "meta": {"invoice_number": rng.choice(["FAC-1", None]), "date": rng.choice([date, date, None])},
+        "seller": {"name": rng.choice(["ACME SARL", None]), "ice": rng.choice(["123456789012345", "123 456", "12A", None]), "if_": rng.choice(["1234", None])},
+        "client": {"name": "Client SA", "ice": rng.choice(["999999999999999", "", "9999-9999-9999-999"])},
+        "items": items,
+        "financials": {"total_ht": total_ht, "total_tva": total_tva, "total_ttc": total_ht + total_tva + rng.choice([0, 0, 3.0])},
+    })
+
+
+def test_bulk_validation_matches_single_invoice_validation():
+    rng = random.Random(42)
+    invoices = [_random_invoice(rng) for _ in range(300)]
+
+    assert validate_invoices(invoices) == [validate_invoice(invoice) for invoice in invoices]
+
+def test_bulk_validation_of_stored_records_matches_models():
+    rng = random.Random(7)
+    invoices = [_random_invoice(rng) for _ in range(100)]
+
+    assert validate_records([invoice.model_dump() for invoice in invoices]) == validate_invoices(invoices)
+
+def test_bulk_validation_handles_empty_input():
+    assert validate_invoices([]) == []
+
+def test_bulk_validation_matches_when_totals_are_missing():
+    rng = random.Random(3)
+    invoices = [_random_invoice(rng) for _ in range(20)]
+    for n, invoice in enumerate(invoices):
+        invoice.financials.total_tva = None if n % 2 else invoice.financials.total_tva
+        invoice.financials.total_ht = None if n % 3 == 0 else invoice.financials.total_ht
+
+    assert validate_invoices(invoices) == [validate_invoice(invoice) for invoice in invoices]
+    assert validate_records([invoice.model_dump() for invoice in invoices]) == validate_invoices(invoices)
@@ -0,0 +1,33 @@
+from benchmarks.synthetic import generate_invoice
+from benchmarks.fake_vllm import FakeVLLMServer
+from benchmarks.pipeline import STAGES, run_invoice, check
+from app.services import ocr_engine, extraction_cache, duplicate_index
+
+
+def test_pipeline_runs_against_fake_vllm(tmp_path, monkeypatch):
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=2, items=12, noise=2, rule_friendly=False)
+
+    with FakeVLLMServer() as server:
+        monkeypatch.setattr(ocr_engine, "VLLM_API_URL", server.url)
+        monkeypatch.setattr(ocr_engine, "_cached_llm", None)
+        monkeypatch.setattr(extraction_cache, "CACHE_BACKEND", "none")
+        monkeypatch.setattr(duplicate_index, "DUPLICATE_INDEX_BACKEND", "none")
+        ocr_engine._get_chain.cache_clear()
+        try:
+            timings = {stage: [] for stage in STAGES}
+            result = run_invoice(pdf, timings)
+        finally:
+            ocr_engine._get_chain.cache_clear()
+
+        assert server.requests >= 1
+
+    # A text PDF is never OCRed; every other stage of the real pipeline ran once
+    assert {stage: len(values) for stage, values in timings.items()} == {stage: int(stage != "ocr") for stage in STAGES}
+    assert len(result.extracted_data.items) == 12
+
+def test_check_flags_slower_stages():
+    baseline = {"stages": {"load": {"median_ms": 10.0, "p90_ms": 12.0}}}
+    report = {"stages": {"load": {"median_ms": 30.0, "p90_ms": 12.0}}}
+
+    assert len(check(report, baseline, tolerance=1.5)) == 1
+    assert check(baseline, baseline, tolerance=1.5) == []
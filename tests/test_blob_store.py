@@ -0,0 +1,75 @@
+import io
+import hashlib
+import pytest
+from app.services.blob_store import LocalBlobStore, NotAPdfError, UploadTooLargeError, store_stream
+
+PDF_BYTES = b"%PDF-1.4\n" + b"0" * 5000 + b"\n%%EOF"
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = LocalBlobStore(tmp_path)
+
+    first = store_stream(io.BytesIO(PDF_BYTES), store, chunk_size=1000)
+    second = store_stream(io.BytesIO(PDF_BYTES), store, chunk_size=1000)
+
+    assert first == second == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert len(list(tmp_path.rglob("*.pdf"))) == 1
+    assert not any(store.staging.iterdir())
+    with store.fetch(first) as path:
+        assert path.read_bytes() == PDF_BYTES
+
+def test_oversized_upload_is_rejected_and_discarded(tmp_path):
+    store = LocalBlobStore(tmp_path)
+
+    with pytest.raises(UploadTooLargeError):
+        store_stream(io.BytesIO(PDF_BYTES), store, max_bytes=2000, chunk_size=1000)
+
+    assert not any(store.staging.iterdir())
+    assert not list(tmp_path.rglob("*.pdf"))
+
+def test_non_pdf_content_is_rejected(tmp_path):
+    store = LocalBlobStore(tmp_path)
+
+    with pytest.raises(NotAPdfError):
+        store_stream(io.BytesIO(b"MZ" + b"\x00" * 4000), store, chunk_size=1000)
+    with pytest.raises(NotAPdfError):
+        store_stream(io.BytesIO(b"tiny"), store)
+
+def test_sweep_removes_only_expired_blobs_and_reupload_refreshes(tmp_path):
+    import os, time
+    store = LocalBlobStore(tmp_path)
+    old = store_stream(io.BytesIO(PDF_BYTES), store)
+    fresh = store_stream(io.BytesIO(PDF_BYTES + b"\n"), store)
+    abandoned = store.staging_path()
+    abandoned.write_bytes(b"%PDF-")
+
+    past = time.time() - 7200
+    for path in (store._path(old), store._path(fresh), abandoned):
+        os.utime(path, (past, past))
+    store_stream(io.BytesIO(PDF_BYTES + b"\n"), store)  # Uploaded again: kept
+
+    assert store.sweep(max_age=3600) == 2
+    assert not store.exists(old) and store.exists(fresh)
+    assert not abandoned.exists()
+
+def test_oversized_request_bodies_are_refused_before_they_are_received(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import invoices
+    monkeypatch.setitem(invoices.UPLOAD_BODY_LIMITS, "/invoices/validate", 4096)
+    monkeypatch.setattr(invoices, "get_blob_store", lambda: pytest.fail("the handler must not run"))
+    client = TestClient(app)
+    pdf = b"%PDF-1.4\n" + b"x" * 8192
+
+    declared = client.post("/invoices/validate", files={"file": ("big.pdf", pdf, "application/pdf")})
+    assert declared.status_code == 413
+
+    # Without a Content-Length the body is counted as it arrives
+    def chunked():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.pdf\"\r\n\r\n"
+        for i in range(0, len(pdf), 1024):
+            yield pdf[i:i + 1024]
+        yield b"\r\n--b--\r\n"
+
+    streamed = client.post("/invoices/validate", content=chunked(), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert streamed.status_code == 413
@@ -0,0 +1,54 @@
+import pytest
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def _fail(breaker, error=ConnectionError):
+    with pytest.raises(error):
+        with breaker.guard():
+            raise error
+
+
+def test_circuit_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60, is_failure=lambda e: isinstance(e, ConnectionError))
+
+    _fail(breaker)
+    _fail(breaker, ValueError)  # Not a backend failure: neither counted nor resetting
+    _fail(breaker)
+    assert breaker.state == CircuitBreaker.CLOSED
+    _fail(breaker)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pytest.fail("the call must not run while the circuit is open")
+
+def test_a_single_probe_decides_after_the_reset_delay():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    _fail(breaker)
+
+    with breaker.guard():
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            with breaker.guard():
+                pass
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    _fail(breaker)
+    _fail(breaker)  # The probe fails: open again
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_a_call_admitted_before_the_circuit_opened_does_not_end_the_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0, is_failure=lambda e: isinstance(e, ConnectionError))
+    stale = breaker.guard()
+    stale.__enter__()
+    _fail(breaker)
+    probe = breaker.guard()
+    probe.__enter__()
+
+    stale.__exit__(ValueError, ValueError("late answer"), None)
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pass
+
+    probe.__exit__(None, None, None)
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,64 @@
+import json
+import time
+import asyncio
+import httpx
+from app.client import InvoiceClient
+
+
+def _run(handler, scenario, **kwargs):
+    async def main():
+        async with InvoiceClient("http://api", transport=httpx.MockTransport(handler), **kwargs) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+def test_uploads_are_bounded_and_wait_out_rate_limits():
+    state = {"in_flight": 0, "peak": 0, "calls": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["calls"] += 1
+        if state["calls"] == 2:
+            return httpx.Response(429, headers={"Retry-After": "1"}, json={"error": "Rate limit exceeded"})
+        if b'filename="bad.pdf"' in request.content:
+            return httpx.Response(422, json={"detail": {"message": "Encrypted PDF"}})
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return httpx.Response(200, json={"task_id": f"task-{state['calls']}"})
+
+    files = [(f"{n}.pdf", b"%PDF") for n in range(12)] + [("bad.pdf", b"%PDF")]
+    started = time.monotonic()
+    answers = _run(handler, lambda client: client.submit_many(files), max_concurrency=3)
+
+    assert time.monotonic() - started >= 1
+    assert state["peak"] <= 3
+    assert all("task_id" in answer for answer in answers[:-1])
+    assert answers[-1] == {"filename": "bad.pdf", "status": "failed", "status_code": 422, "error": "Encrypted PDF"}
+
+def test_wait_all_streams_small_sets_and_polls_large_ones():
+    polls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/invoices/events":
+            body = "".join(
+                f"event: task\ndata: {json.dumps({'task_id': task_id, 'status': 'completed', 'data': {}})}\n\n"
+                for task_id in request.url.params["ids"].split(",")
+            )
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, text=": keep-alive\n\n" + body)
+
+        ids = json.loads(request.content)["ids"]
+        polls.append(len(ids))
+        # The first poll finds half of the tasks finished
+        done = ids if len(polls) > 1 else ids[::2]
+        return httpx.Response(200, json={"tasks": [
+            {"task_id": task_id, "status": "completed" if task_id in done else "pending"} for task_id in ids
+        ]})
+
+    streamed = _run(handler, lambda client: client.wait_all(["a", "b", "c"]))
+    assert [result["status"] for result in streamed.values()] == ["completed"] * 3
+    assert polls == []
+
+    many = [f"task-{n}" for n in range(250)]
+    polled = _run(handler, lambda client: client.wait_all(many, poll_interval=0))
+    assert all(result["status"] == "completed" for result in polled.values())
+    assert polls[0] == 250 and len(polls) == 2
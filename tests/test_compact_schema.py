@@ -0,0 +1,46 @@
+import json
+from prometheus_client import REGISTRY
+from app.services import ocr_engine
+from app.services.compact_schema import compress, expand, wire_schema
+from app.services.rule_extractor import SECTIONS
+from benchmarks.fake_vllm import FakeVLLMServer
+from tests.test_validator import create_valid_invoice
+
+
+def test_wire_format_round_trips_and_is_shorter():
+    data = create_valid_invoice().model_dump()
+    data["items"] *= 10
+
+    wire = compress(data)
+
+    assert expand(wire) == {section: data[section] for section in SECTIONS}
+    assert wire["it"][0] == ["Service A", 1.0, 1000.0, 1000.0]
+    # Keys are most of a multi-item answer
+    assert len(json.dumps(wire)) < 0.5 * len(json.dumps(data))
+
+def test_optional_sections_may_be_null():
+    schema = wire_schema(("items", "financials"), optional=True)["schema"]
+
+    assert set(schema["properties"]) == {"it", "t"}
+    assert {"type": "null"} in schema["properties"]["t"]["anyOf"]
+    assert expand({"it": [], "t": None}) == {"items": [], "financials": None}
+
+def test_compact_mode_maps_answers_back_to_the_models(monkeypatch):
+    def sample(name, mode):
+        return REGISTRY.get_sample_value(name, {"mode": mode}) or 0.0
+
+    before = sample("llm_output_tokens_count", "compact")
+
+    with FakeVLLMServer() as server:
+        monkeypatch.setattr(ocr_engine, "EXTRACTION_MODE", "compact")
+        monkeypatch.setattr(ocr_engine, "VLLM_API_URL", server.url)
+        monkeypatch.setattr(ocr_engine, "_cached_llm", None)
+        ocr_engine._get_chain.cache_clear()
+        try:
+            result = ocr_engine._build_chain(["seller", "items"]).invoke({"text": "ICE : 123456789012345\nService A 2 50,00 100,00"})
+        finally:
+            ocr_engine._get_chain.cache_clear()
+
+    assert result.seller.ice == "123456789012345"
+    assert isinstance(result.items, list) and result.items[0].description
+    assert sample("llm_output_tokens_count", "compact") == before + 1
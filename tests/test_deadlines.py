@@ -0,0 +1,33 @@
+import time
+import asyncio
+import pytest
+from app.services import deadlines
+from app.services.deadlines import DeadlineExceeded, await_with_deadline, run_with_deadline
+
+
+def test_stage_returns_its_result_or_is_abandoned_at_the_deadline(monkeypatch):
+    monkeypatch.setitem(deadlines.STAGE_DEADLINES, "load", 0.05)
+
+    assert run_with_deadline("load", sum, [1, 2]) == 3
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded) as error:
+        run_with_deadline("load", time.sleep, 1)
+    assert time.perf_counter() - started < 0.5
+    assert error.value.stage == "load"
+
+def test_async_stage_is_cancelled_at_the_deadline(monkeypatch):
+    monkeypatch.setitem(deadlines.STAGE_DEADLINES, "llm", 0.05)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(await_with_deadline("llm", asyncio.sleep(1)))
+
+def test_stuck_llm_stages_do_not_starve_validation(monkeypatch):
+    monkeypatch.setattr(deadlines, "STAGE_THREADS", 1)
+    monkeypatch.setattr(deadlines, "_cached_stage_executors", {})
+    monkeypatch.setitem(deadlines.STAGE_DEADLINES, "llm", 0.05)
+
+    with pytest.raises(DeadlineExceeded):
+        run_with_deadline("llm", time.sleep, 0.5)
+    # The only llm helper is still stuck; validation has helpers of its own
+    assert run_with_deadline("validation", sum, [1, 2]) == 3
@@ -0,0 +1,82 @@
+from app.services.duplicate_index import MemoryDuplicateIndex, RedisDuplicateIndex, bloom_parameters, bloom_positions, duplicate_key
+from app.services.validator import validate_invoice
+from app.schemas.invoices import ErrorType
+from tests.test_validator import create_valid_invoice
+
+
+class FakeRedis:
+    """Strings behind a pipeline; counts round trips."""
+
+    def __init__(self):
+        self.strings, self.ttls = {}, {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.queued = []
+
+    def set(self, key, value, nx=False, ex=None):
+        def run(strings):
+            if nx and key in strings:
+                return None
+            strings[key], self.redis.ttls[key] = value.encode(), ex
+            return True
+        self.queued.append(run)
+
+    def get(self, key):
+        self.queued.append(lambda strings: strings.get(key))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [command(self.redis.strings) for command in self.queued]
+
+
+def test_key_ignores_formatting_of_ice_and_number():
+    assert duplicate_key("001 234 567 000 089", "fac-2025/001", 2400) == duplicate_key("001234567000089", "FAC 2025 001", 2400.001)
+    assert duplicate_key("001234567000089", "FAC-2025-001", 2400) != duplicate_key("001234567000089", "FAC-2025-001", 2401)
+    assert duplicate_key(None, "FAC-2025-001", 2400) is None
+
+def test_resubmission_is_flagged_but_a_retry_is_not():
+    index = MemoryDuplicateIndex(capacity=1000)
+    invoice = create_valid_invoice()
+    baseline = validate_invoice(invoice)
+
+    assert validate_invoice(invoice, index, reference="task-1") == baseline
+    assert validate_invoice(invoice, index, reference="task-1") == baseline
+
+    invoice.meta.invoice_number = "fac 2025 001"
+    issues = validate_invoice(invoice, index, reference="task-2")
+    assert issues[:-1] == baseline
+    assert issues[-1].error_type == ErrorType.DUPLICATE_INVOICE
+    assert "task-1" in issues[-1].message
+
+def test_bloom_filter_keeps_false_positives_near_target():
+    bits, hashes = bloom_parameters(50_000_000, 0.01)
+    assert bits / 8 / 2**20 < 64 and hashes == 7
+
+    index = MemoryDuplicateIndex(capacity=10_000, fp_rate=0.01)
+    for n in range(10_000):
+        index.check_and_add(f"seen-{n}", "ref")
+    hits = sum(index._might_contain(bloom_positions(f"new-{n}", index.bits, index.hashes)) for n in range(10_000))
+    assert hits / 10_000 < 0.02
+
+def test_redis_index_is_shared_by_workers_at_one_round_trip_per_check():
+    redis = FakeRedis()
+    worker_a = RedisDuplicateIndex(redis, retention_days=30)
+    worker_b = RedisDuplicateIndex(redis, retention_days=30)
+
+    assert worker_a.check_and_add("k1", "task-1") is None
+    assert redis.round_trips == 1
+    assert redis.ttls["duplicate-index:entry:k1"] == 30 * 24 * 3600
+
+    # Nothing is cached in process: the other worker sees the key at once, a retry is not a duplicate
+    assert worker_b.check_and_add("k1", "task-2") == "task-1"
+    assert worker_a.check_and_add("k1", "task-1") is None
+    assert worker_b.check_and_add("k2", "task-2") is None
+    assert worker_a.check_and_add("k2", "task-3") == "task-2"
+    assert redis.round_trips == 5
@@ -0,0 +1,90 @@
+import json
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from starlette.testclient import WebSocketDenialResponse
+from app.routers import invoices
+
+
+class FakePubSub:
+    """Hands out the queued messages in order; None stands for a heartbeat tick with nothing published."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = ()
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        self.channels = channels
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        await asyncio.sleep(0)
+        message = self.messages.pop(0) if self.messages else None
+        return None if message is None else {"data": json.dumps(message)}
+
+    async def unsubscribe(self):
+        pass
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """Wires _task_events to a fake pubsub and a result backend where 'done' is already finished and 'late' finishes after one check."""
+    checks = {}
+
+    def get_task_status(task_id):
+        checks[task_id] = checks.get(task_id, 0) + 1
+        if task_id == "done" or (task_id == "late" and checks[task_id] > 1):
+            return {"status": "completed", "data": {"filename": f"{task_id}.pdf"}}
+        return {"status": "pending"}
+
+    def wire(messages):
+        pubsub = FakePubSub(messages)
+        monkeypatch.setattr(invoices, "get_async_redis", lambda: type("Redis", (), {"pubsub": lambda self: pubsub})())
+        monkeypatch.setattr(invoices, "get_task_status", get_task_status)
+        return pubsub
+
+    from app.main import app
+    return TestClient(app), wire
+
+def test_sse_stream_combines_stored_results_published_events_and_backend_fallback(events):
+    client, wire = events
+    pubsub = wire([{"task_id": "pushed", "status": "completed", "data": {}}, None])
+
+    response = client.get("/invoices/events", params={"ids": "done,pushed,late"})
+    body = response.text
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert pubsub.channels == ("invoice-events:done", "invoice-events:pushed", "invoice-events:late")
+    finished = [json.loads(line[len("data: "):])["task_id"] for line in body.splitlines() if line.startswith("data: ")]
+    # Stored result first, then the published event, then the heartbeat re-check of the backend
+    assert finished == ["done", "pushed", "late"]
+    assert body.index(": keep-alive") > body.index('"pushed"')
+    assert pubsub.closed
+
+def test_websocket_sends_finished_tasks_and_rejects_empty_ids(events):
+    client, wire = events
+    wire([{"task_id": "pushed", "status": "failed", "error": "boom"}])
+
+    with client.websocket_connect("/invoices/ws?ids=done,pushed") as websocket:
+        received = [websocket.receive_json(), websocket.receive_json()]
+    assert [event["task_id"] for event in received] == ["done", "pushed"]
+    assert received[1]["error"] == "boom"
+
+    with pytest.raises(WebSocketDenialResponse) as denied:
+        with client.websocket_connect("/invoices/ws?ids=,"):
+            pass
+    assert denied.value.status_code == 400
+    assert client.get("/invoices/events", params={"ids": ","}).status_code == 400
+
+def test_streams_limit_the_id_count(events):
+    client, _ = events
+    ids = ",".join(f"task-{i}" for i in range(invoices.STATUS_MAX_IDS + 1))
+
+    assert client.get("/invoices/events", params={"ids": ids}).status_code == 400
+    with pytest.raises(WebSocketDenialResponse) as denied:
+        with client.websocket_connect(f"/invoices/ws?ids={ids}"):
+            pass
+    assert denied.value.status_code == 400
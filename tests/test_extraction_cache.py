@@ -0,0 +1,43 @@
+import os
+import time
+from app.services.extraction_cache import DiskCacheBackend, ExtractionCache
+from tests.test_validator import create_valid_invoice
+
+
+def test_cache_roundtrip_counts_hits_and_misses(tmp_path):
+    cache = ExtractionCache(DiskCacheBackend(tmp_path))
+    data = create_valid_invoice()
+
+    assert cache.get("abc", "v1") is None
+    cache.set("abc", "v1", data)
+
+    assert cache.get("abc", "v1") == data
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_cache_is_scoped_to_extraction_version(tmp_path):
+    cache = ExtractionCache(DiskCacheBackend(tmp_path))
+    cache.set("abc", "v1", create_valid_invoice())
+
+    assert cache.get("abc", "v2") is None
+
+def test_disk_backend_expires_entries(tmp_path):
+    backend = DiskCacheBackend(tmp_path, ttl=0)
+    backend.set("k", "value")
+    time.sleep(0.01)
+
+    assert backend.get("k") is None
+
+def test_disk_backend_evicts_least_recently_used(tmp_path):
+    backend = DiskCacheBackend(tmp_path, max_entries=2)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    os.utime(backend._path("a"), (1, 1))
+    os.utime(backend._path("b"), (2, 2))
+    backend.get("a")  # "a" becomes the most recently used
+
+    backend.set("c", "3")
+
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    assert backend.get("c") == "3"
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from app.services.llm_limiter import AdaptiveLimiter, BackendSaturated
+
+
+def test_limit_grows_on_fast_answers_and_backs_off_on_overload():
+    limiter = AdaptiveLimiter(initial=4, min_limit=1, max_limit=8, latency_target=1.0, is_overload=lambda e: isinstance(e, TimeoutError))
+
+    for _ in range(20):
+        with limiter.slot():
+            pass
+    assert limiter.limit > 6
+
+    before = limiter.limit
+    with pytest.raises(TimeoutError):
+        with limiter.slot():
+            raise TimeoutError
+    assert limiter.limit == pytest.approx(before * 0.7)
+
+    # A bad answer says nothing about load
+    with pytest.raises(ValueError):
+        with limiter.slot():
+            raise ValueError
+    assert limiter.limit == pytest.approx(before * 0.7)
+    assert limiter.in_flight == 0
+
+def test_waiters_are_shed_when_no_slot_frees_up():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+
+    with limiter.slot():
+        with pytest.raises(BackendSaturated):
+            with limiter.slot(timeout=0.05):
+                pass
+    assert limiter.in_flight == 0 and not limiter._waiters
+
+def test_async_callers_never_exceed_the_limit():
+    limiter = AdaptiveLimiter(initial=3, min_limit=3, max_limit=3)
+    peak = running = 0
+
+    async def call():
+        nonlocal peak, running
+        async with limiter.aslot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(20)))
+
+    asyncio.run(main())
+    assert peak == 3 and limiter.in_flight == 0
@@ -0,0 +1,38 @@
+from prometheus_client import REGISTRY
+from app.core.metrics import record_outcome
+from app.services import ocr_engine
+from benchmarks.fake_vllm import FakeVLLMServer
+from tests.test_validator import create_valid_invoice
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_record_outcome_counts_status_and_error_types():
+    before_failed = _sample("invoice_results_total", status="failed")
+    before_invalid = _sample("invoice_results_total", status="invalid")
+    before_math = _sample("invoice_issues_total", error_type="MATH_MISMATCH")
+
+    record_outcome({"error": "boom", "status": "failed", "filename": "a.pdf"})
+    record_outcome({
+        "is_valid": False,
+        "issues": [{"field": "financials", "error_type": "MATH_MISMATCH", "message": "x"}],
+        "extracted_data": create_valid_invoice().model_dump(),
+    })
+
+    assert _sample("invoice_results_total", status="failed") == before_failed + 1
+    assert _sample("invoice_results_total", status="invalid") == before_invalid + 1
+    assert _sample("invoice_issues_total", error_type="MATH_MISMATCH") == before_math + 1
+
+def test_llm_calls_report_tokens_and_latency(monkeypatch):
+    before_tokens = _sample("llm_tokens_total", kind="completion")
+    before_requests = _sample("llm_request_seconds_count")
+
+    with FakeVLLMServer() as server:
+        monkeypatch.setattr(ocr_engine, "VLLM_API_URL", server.url)
+        monkeypatch.setattr(ocr_engine, "_cached_llm", None)
+        ocr_engine._get_llm().invoke("ping")
+
+    assert _sample("llm_tokens_total", kind="completion") > before_tokens
+    assert _sample("llm_request_seconds_count") == before_requests + 1
+    assert _sample("llm_requests_in_flight") == 0
@@ -0,0 +1,66 @@
+import json
+import httpx
+import socket
+import pytest
+from app.services import notifications
+from app.services.notifications import UnsafeCallbackUrl, check_callback_url
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "ftp://93.184.216.34/hook",
+    "http:///hook",
+])
+def test_internal_and_malformed_callback_urls_are_rejected(url):
+    with pytest.raises(UnsafeCallbackUrl):
+        check_callback_url(url)
+
+def test_hostnames_are_checked_on_what_they_resolve_to(monkeypatch):
+    resolved = {"redis": "172.18.0.2", "hooks.example.com": "93.184.216.34"}
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, port, **kwargs: [(None, None, None, "", (resolved[host], port))])
+
+    check_callback_url("https://hooks.example.com/invoices")
+    with pytest.raises(UnsafeCallbackUrl):
+        check_callback_url("http://redis:6379")
+
+    monkeypatch.setattr(notifications, "WEBHOOK_ALLOWED_HOSTS", {"redis"})
+    check_callback_url("http://redis:6379")
+
+def test_task_events_are_published_and_redis_errors_swallowed(monkeypatch):
+    published = []
+
+    class Redis:
+        def publish(self, channel, message):
+            published.append((channel, json.loads(message)))
+
+    monkeypatch.setattr(notifications, "get_redis", Redis)
+    notifications.publish_task_event("task-1", notifications.task_event("task-1", {"is_valid": True}))
+    assert published == [("invoice-events:task-1", {"task_id": "task-1", "status": "completed", "data": {"is_valid": True}})]
+
+    def unavailable():
+        raise ConnectionError("redis down")
+    monkeypatch.setattr(notifications, "get_redis", unavailable)
+    notifications.publish_task_event("task-2", {"task_id": "task-2"})
+
+def test_webhook_task_retries_failed_deliveries_and_refuses_internal_targets(monkeypatch):
+    from app.worker import deliver_webhook_task
+    answers = iter([500, 200])
+    posts = []
+
+    def post(url, json=None, timeout=None):
+        posts.append(url)
+        return httpx.Response(next(answers), request=httpx.Request("POST", url))
+
+    monkeypatch.setattr(notifications.httpx, "post", post)
+    event = {"task_id": "task-1", "status": "completed", "data": {}}
+
+    assert deliver_webhook_task.apply(args=["http://93.184.216.34/hook", event]).successful()
+    assert posts == ["http://93.184.216.34/hook"] * 2
+
+    result = deliver_webhook_task.apply(args=["http://127.0.0.1:6379", event])
+    assert isinstance(result.result, UnsafeCallbackUrl)
+    assert len(posts) == 2
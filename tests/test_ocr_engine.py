@@ -0,0 +1,137 @@
+import time
+import pytest
+from langchain_core.runnables import RunnableLambda
+from app.services import deadlines, ocr_engine
+from app.services.deadlines import DeadlineExceeded
+from app.services.ocr_engine import (
+    EXTRACTION_VERSION, INSTRUCTIONS, PROMPT_TEMPLATE, build_prompt, chunk_pages, compact_pages, count_tokens,
+    _extraction_version, _get_chain, _load_pages, _partial_schema, _reduce_chunks, is_transient,
+)
+
+
+def test_small_pages_are_packed_into_one_chunk():
+    pages = ["Page one", "Page two", "Page three"]
+
+    assert chunk_pages(pages, budget=100) == ["Page one\nPage two\nPage three"]
+
+def test_chunks_respect_the_token_budget():
+    page = "\n".join(f"Service {i} 1 100,00 100,00" for i in range(200))
+
+    chunks = chunk_pages([page, page], budget=300)
+
+    assert len(chunks) > 2
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+    assert "\n".join(chunks).count("Service") == 400
+
+def test_a_line_longer_than_the_budget_is_split():
+    line = " ".join(f"word{i}" for i in range(500))
+
+    chunks = chunk_pages([line + "\nTotal TTC 100,00", "x" * 3000], budget=100)
+
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    assert "\n".join(chunks).count("word") == 500
+
+def test_chunk_results_are_merged_in_page_order():
+    schema = _partial_schema(("seller", "items", "financials"), optional=True)
+    first = schema.model_validate({
+        "seller": {"name": "Tech Solutions SARL", "ice": None},
+        "items": [{"description": "A", "quantity": 1, "unit_price": 10, "total_line": 10}],
+    })
+    last = schema.model_validate({
+        "seller": {"name": "Other", "ice": "123456789012345"},
+        "items": [{"description": "B", "quantity": 2, "unit_price": 5, "total_line": 10}],
+        "financials": {"total_ht": 20, "total_tva": 4, "total_ttc": 24},
+    })
+
+    merged = _reduce_chunks([first, last])
+
+    assert merged["seller"]["name"] == "Tech Solutions SARL"
+    assert merged["seller"]["ice"] == "123456789012345"
+    assert [item["description"] for item in merged["items"]] == ["A", "B"]
+    assert merged["financials"]["total_ttc"] == 24
+
+def test_compaction_drops_repeated_headers_and_boilerplate():
+    first = "ACME SARL    Casablanca\n\n   Page 1/2\nService A 1 100,00 100,00\n-------\nConditions générales de vente\n"
+    second = "ACME SARL    Casablanca\nPage 2/2\nService A 1 100,00 100,00\nTotal HT 200,00\n"
+
+    compacted = compact_pages([first, second])
+
+    assert compacted == [
+        "ACME SARL Casablanca\nService A 1 100,00 100,00",
+        "Service A 1 100,00 100,00\nTotal HT 200,00",
+    ]
+
+def test_compaction_keeps_footer_identifiers():
+    footer = "Capital social : 100 000 DH | ICE : 123456789012345 | IF : 12345678 | RC : 98765"
+
+    compacted = compact_pages(["Conditions générales\n" + footer, footer])
+
+    assert compacted == [footer, ""]
+
+def test_compaction_only_drops_lines_repeated_at_the_page_edges():
+    bodies = ["Service A\nLivraison express\nService B", "Service C", "Service D\nService E\nLivraison express\nService F\nService G"]
+    pages = [f"ACME SARL Casablanca\n{body}\nTél 0522 00 00 00" for body in bodies]
+
+    first, second, third = compact_pages(pages)
+
+    assert first == pages[0]
+    assert second == "Service C"
+    # Repeated, but not at the same place on most pages: part of the invoice
+    assert third == "Service D\nService E\nLivraison express\nService F\nService G"
+
+def test_compaction_drops_page_markers_but_keeps_bare_numbers():
+    # Column layouts put a line item's quantity and unit price on lines of their own
+    page = "Maintenance serveur\n12\n350\n- 1 -\nPage 1 sur 2\n1/2"
+
+    assert compact_pages([page]) == ["Maintenance serveur\n12\n350"]
+
+def test_prompt_opens_the_user_turn_unless_a_system_role_is_requested():
+    [message] = build_prompt().format_messages(text="Facture N° 42")
+    assert message.type == "human"
+    assert message.content.startswith(INSTRUCTIONS) and message.content.rstrip().endswith("Facture N° 42")
+
+    system, human = build_prompt(system_role=True).format_messages(text="Facture N° 42")
+    assert (system.type, system.content) == ("system", INSTRUCTIONS)
+    assert human.type == "human" and human.content.strip().endswith("Facture N° 42")
+
+def test_extraction_version_follows_the_prompt():
+    assert _extraction_version(PROMPT_TEMPLATE, False) == EXTRACTION_VERSION
+    assert _extraction_version(PROMPT_TEMPLATE + "- Dates are DD/MM/YYYY.\n", False) != EXTRACTION_VERSION
+    assert _extraction_version(PROMPT_TEMPLATE, True) != EXTRACTION_VERSION
+
+def test_chains_are_built_once_per_schema_variant(monkeypatch):
+    built = []
+
+    class FakeLLM:
+        def with_structured_output(self, schema, **kwargs):
+            built.append(schema)
+            return RunnableLambda(lambda prompt: {"raw": None, "parsed": None, "parsing_error": None})
+
+    monkeypatch.setattr(ocr_engine, "_get_llm", FakeLLM)
+    _get_chain.cache_clear()
+    try:
+        chain = _get_chain(("items", "financials"))
+        assert _get_chain(("items", "financials")) is chain
+        assert _get_chain(("items", "financials"), True) is not chain
+        assert len(built) == 2
+    finally:
+        _get_chain.cache_clear()
+
+def test_ocr_has_a_deadline_per_scanned_page_apart_from_loading(monkeypatch):
+    def slow_ocr(pdf_path, pages):
+        time.sleep(0.1 * len(pages))
+        return [f"FACTURE N° FAC-{i} page {i} Total HT 100,00" for i in range(len(pages))]
+
+    monkeypatch.setattr(ocr_engine, "OCR_ENABLED", True)
+    monkeypatch.setattr(ocr_engine, "extract_text", lambda pdf_path, pages=None: ["", "", ""])
+    monkeypatch.setattr(ocr_engine, "ocr_pages", slow_ocr)
+    monkeypatch.setitem(deadlines.STAGE_DEADLINES, "load", 0.05)
+
+    # Three scanned pages take longer than loading is allowed, but not longer than three pages of OCR
+    monkeypatch.setattr(deadlines, "OCR_DEADLINE_PER_PAGE_SECONDS", 0.3)
+    assert len(_load_pages("scan.pdf")) == 3
+
+    monkeypatch.setattr(deadlines, "OCR_DEADLINE_PER_PAGE_SECONDS", 0.05)
+    with pytest.raises(DeadlineExceeded) as error:
+        _load_pages("scan.pdf")
+    assert error.value.stage == "ocr" and not is_transient(error.value)
@@ -0,0 +1,43 @@
+import shutil
+import pytest
+import pypdfium2
+from pypdf import PdfReader
+from app.services import page_ocr
+from app.services.page_ocr import needs_ocr, ocr_pages, page_fingerprint, _ocr_cache_key
+from app.services.extraction_cache import DiskCacheBackend
+from benchmarks.synthetic import generate_invoice
+
+
+def _scan(pdf_path, out_path):
+    """Rasterises a text PDF into an image-only PDF, like a scanner would."""
+    pdf = pypdfium2.PdfDocument(str(pdf_path))
+    images = [page.render(scale=200 / 72).to_pil().convert("RGB") for page in pdf]
+    pdf.close()
+    images[0].save(out_path, save_all=True, append_images=images[1:], resolution=200)
+    return out_path
+
+def test_scanned_pages_are_fingerprinted_and_served_from_cache(tmp_path, monkeypatch):
+    scan = _scan(generate_invoice(tmp_path / "invoice.pdf", items=3), tmp_path / "scan.pdf")
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(scan.read_bytes())
+
+    fingerprint = page_fingerprint(PdfReader(scan).pages[0])
+    assert fingerprint == page_fingerprint(PdfReader(copy).pages[0])
+    assert needs_ocr(PdfReader(scan).pages[0].extract_text())
+
+    cache = DiskCacheBackend(tmp_path / "cache")
+    cache.set(_ocr_cache_key(fingerprint), "FACTURE N° FAC-1")
+    monkeypatch.setattr(page_ocr, "_cached_ocr_cache", cache)
+    monkeypatch.setattr(page_ocr, "_get_ocr_executor", lambda: pytest.fail("cache hit must not OCR"))
+
+    assert ocr_pages(str(copy), [""]) == ["FACTURE N° FAC-1"]
+
+@pytest.mark.skipif(shutil.which("tesseract") is None, reason="tesseract is not installed")
+def test_scanned_invoice_is_recognised(tmp_path, monkeypatch):
+    scan = _scan(generate_invoice(tmp_path / "invoice.pdf", items=3), tmp_path / "scan.pdf")
+    monkeypatch.setattr(page_ocr, "OCR_CACHE_BACKEND", "none")
+
+    text = ocr_pages(str(scan), [""])[0]
+
+    assert "FACTURE" in text.upper()
+    assert "Total TTC" in text
@@ -0,0 +1,38 @@
+import pytest
+from app.services.pdf_text import TEXT_BACKENDS, get_text_backend, extract_text, text_quality
+from benchmarks.synthetic import generate_invoice
+
+
+@pytest.mark.parametrize("name", list(TEXT_BACKENDS))
+def test_backends_keep_the_footer_identifiers(tmp_path, name):
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=2, items=20)
+
+    pages = get_text_backend(name).extract(str(pdf))
+
+    assert len(pages) == 2
+    assert "FACTURE" in pages[0]
+    quality = text_quality(pages[-1])
+    assert quality["has_ice"] and quality["has_if"]
+
+def test_only_requested_pages_are_returned(tmp_path):
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=3, items=30)
+
+    for name in TEXT_BACKENDS:
+        pages = extract_text(str(pdf), [1], backend=get_text_backend(name))
+        assert len(pages) == 1
+        assert "FACTURE" not in pages[0]
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_text_backend("tika")
+
+def test_pdfium_backend_is_safe_from_many_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=2, items=20)
+    backend = get_text_backend("pypdfium2")
+    expected = backend.extract(str(pdf))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: backend.extract(str(pdf)), range(32)))
+
+    assert all(result == expected for result in results)
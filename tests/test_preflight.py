@@ -0,0 +1,56 @@
+from pypdf import PdfReader, PdfWriter
+from app.schemas.invoices import PreflightDecision
+from app.services import preflight as preflight_module
+from app.services.preflight import preflight
+from benchmarks.synthetic import generate_invoice, write_pdf
+
+
+def test_text_invoice_is_accepted_with_estimates(tmp_path):
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=2, items=20)
+
+    report = preflight(pdf)
+
+    assert report.decision == PreflightDecision.ACCEPT
+    assert report.pages == 2
+    assert report.has_text_layer
+    assert report.estimated_tokens > 100
+
+def test_image_only_files_are_routed_to_ocr_and_corrupt_ones_rejected(tmp_path, monkeypatch):
+    write_pdf(tmp_path / "scan.pdf", [[], []])
+    (tmp_path / "broken.pdf").write_bytes(b"%PDF-1.4\n" + b"garbage" * 200)
+
+    scan = preflight(tmp_path / "scan.pdf")
+    broken = preflight(tmp_path / "broken.pdf")
+
+    assert scan.decision == PreflightDecision.OCR and not scan.has_text_layer
+    assert broken.decision == PreflightDecision.REJECT and "corrupt" in broken.reason
+
+    monkeypatch.setattr(preflight_module, "OCR_ENABLED", False)
+    assert preflight(tmp_path / "scan.pdf").decision == PreflightDecision.REJECT
+
+def test_page_limit_and_password_are_enforced(tmp_path, monkeypatch):
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=3, items=30)
+    monkeypatch.setattr(preflight_module, "PREFLIGHT_MAX_PAGES", 2)
+    assert preflight(pdf).decision == PreflightDecision.REJECT
+
+    writer = PdfWriter(clone_from=PdfReader(pdf))
+    writer.encrypt(user_password="secret", algorithm="RC4-128")
+    writer.write(tmp_path / "locked.pdf")
+
+    locked = preflight(tmp_path / "locked.pdf")
+    assert locked.decision == PreflightDecision.REJECT and locked.encrypted
+
+def test_rejected_upload_leaves_the_shared_blob_to_the_sweeper(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import invoices
+    from app.services.blob_store import LocalBlobStore
+    store = LocalBlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(invoices, "get_blob_store", lambda: store)
+    broken = b"%PDF-1.4\n" + b"garbage" * 200
+
+    response = TestClient(app).post("/invoices/validate", files={"file": ("broken.pdf", broken, "application/pdf")})
+
+    assert response.status_code == 422
+    # A concurrent upload of the same file may be about to read it
+    assert len(list((tmp_path / "blobs").glob("??/??/*.pdf"))) == 1
@@ -0,0 +1,54 @@
+from datetime import date
+from fastapi.testclient import TestClient
+from app.core import database
+from app.services.results_store import save_result, query_results
+
+
+def test_results_are_filtered_and_paginated(store, make_result):
+    for i in range(1, 8):
+        save_result(make_result(f"FAC-{i}", day=i, is_valid=i % 2 == 0), task_id=f"task-{i}")
+
+    assert query_results(invoice_number="FAC-3")["total"] == 1
+    assert query_results(is_valid=True)["total"] == 3
+    assert query_results(date_from=date(2025, 1, 3), date_to=date(2025, 1, 5))["total"] == 3
+
+    first, second = query_results(page=1, page_size=5), query_results(page=2, page_size=5)
+    assert first["total"] == 7
+    assert [item["invoice_number"] for item in first["items"]][0] == "FAC-7"
+    assert len(second["items"]) == 2
+
+def test_retried_task_replaces_its_result(store, make_result):
+    save_result(make_result("FAC-1", day=1, is_valid=False), task_id="task-1")
+    save_result(make_result("FAC-1", day=1, is_valid=True), task_id="task-1")
+
+    page = query_results(include_data=True)
+    assert page["total"] == 1
+    assert page["items"][0]["is_valid"] is True
+    assert page["items"][0]["extracted_data"]["meta"]["invoice_number"] == "FAC-1"
+
+def test_results_endpoints(store, make_result):
+    from app.main import app
+    result_id = save_result(make_result("FAC-9", day=9), task_id="task-9")
+    client = TestClient(app)
+
+    listing = client.get("/invoices/results", params={"invoice_number": "FAC-9"}).json()
+    assert listing["items"][0]["id"] == result_id
+    assert client.get(f"/invoices/results/{result_id}").json()["extracted_data"]["meta"]["invoice_number"] == "FAC-9"
+    assert client.get("/invoices/results/999").status_code == 404
+
+def test_columns_added_since_the_table_was_created_are_migrated(store, make_result):
+    from sqlalchemy import create_engine, inspect, text
+    legacy = create_engine(database.DATABASE_URL)
+    with legacy.begin() as connection:
+        # invoice_results as first created, before rule_versions existed
+        connection.execute(text(
+            "CREATE TABLE invoice_results (id INTEGER PRIMARY KEY, task_id VARCHAR(64) UNIQUE, digest VARCHAR(64), "
+            "filename VARCHAR(255), is_valid BOOLEAN, invoice_number VARCHAR(64), invoice_date DATE, seller_ice VARCHAR(32), "
+            "client_ice VARCHAR(32), total_ttc FLOAT, issue_count INTEGER, issues JSON, extracted_data JSON, created_at DATETIME)"
+        ))
+    legacy.dispose()
+
+    save_result(make_result("FAC-1", day=1), task_id="task-1")
+
+    assert "rule_versions" in {column["name"] for column in inspect(database.get_engine()).get_columns("invoice_results")}
+    assert query_results(include_data=True)["items"][0]["invoice_number"] == "FAC-1"
@@ -0,0 +1,91 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.services import validator
+from app.services.validator import Rule, ValidationIssue
+from app.services.revalidation import main, revalidate, stale_rules
+from app.services.results_store import get_result, save_result
+from app.schemas.invoices import ErrorType
+from app.core.security import limiter
+
+
+def _stale_date(data):
+    return [ValidationIssue(field="Date", error_type=ErrorType.SUSPICIOUS_VALUE, message="Stale")]
+
+@pytest.fixture
+def bump_date_rule():
+    """Swaps the date rule for version 2 of it, as a release changing that rule would."""
+    original = validator.RULES[:]
+    index = next(i for i, r in enumerate(validator.RULES) if r.name == "date_logic")
+    yield lambda: validator.RULES.__setitem__(index, Rule("date_logic", 2, _stale_date))
+    validator.RULES[:] = original
+
+def test_only_rules_with_a_new_version_are_rerun(store, bump_date_rule, make_result):
+    result_id = save_result(make_result("FAC-1", day=1), task_id="task-1")
+    assert list(revalidate())[-1]["summary"]["revalidated"] == 0
+
+    bump_date_rule()
+    assert [r.name for r in stale_rules(validator.rule_versions() | {"date_logic": 1})] == ["date_logic"]
+
+    *diffs, summary = revalidate()
+    assert [diff["rules"] for diff in diffs] == [["date_logic"]]
+    assert diffs[0]["added"][0]["message"] == "Stale" and diffs[0]["is_valid"] is False
+    assert set(summary["summary"]["rule_runs"]) == {"date_logic"}
+    assert "date_logic" in summary["summary"]["rule_seconds"]
+
+    stored = get_result(result_id)
+    assert stored["issues"][-1]["rule"] == "date_logic" and stored["is_valid"] is False
+    assert list(revalidate())[-1]["summary"]["revalidated"] == 0
+
+def test_dry_run_and_endpoint_leave_results_untouched(store, bump_date_rule, make_result):
+    from app.main import app
+    result_id = save_result(make_result("FAC-2", day=2), task_id="task-2")
+    before = get_result(result_id)["issues"]
+    bump_date_rule()
+
+    limiter.reset()
+    client = TestClient(app)
+    response = client.post("/invoices/results/revalidate", params={"dry_run": True})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert lines[0]["id"] == result_id and lines[-1]["summary"]["changed"] == 1
+    assert get_result(result_id)["issues"] == before
+
+    # Writing back has to be asked for, and the endpoint is rate limited
+    response = client.post("/invoices/results/revalidate")
+    assert json.loads(response.text.splitlines()[-1])["summary"]["dry_run"] is True
+    assert get_result(result_id)["issues"] == before
+    assert client.post("/invoices/results/revalidate").status_code == 429
+
+def test_cli_only_writes_back_when_asked(store, bump_date_rule, monkeypatch, capsys, make_result):
+    result_id = save_result(make_result("FAC-4", day=4), task_id="task-4")
+    before = get_result(result_id)["issues"]
+    bump_date_rule()
+
+    monkeypatch.setattr("sys.argv", ["revalidation"])
+    main()
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])["summary"]["changed"] == 1
+    assert get_result(result_id)["issues"] == before
+
+    monkeypatch.setattr("sys.argv", ["revalidation", "--write"])
+    main()
+    assert get_result(result_id)["issues"][-1]["message"] == "Stale"
+
+def test_replay_matches_a_full_validation_and_keeps_duplicate_flags(store, make_result):
+    result = make_result("FAC-3", day=3)
+    result.issues = validator.validate_invoice(result.extracted_data)
+    result_id = save_result(result, task_id="task-3")
+    duplicate = {"field": "Invoice Number", "error_type": "DUPLICATE_INVOICE", "message": "Seen before", "rule": None}
+
+    from app.services.results_store import StoredResult
+    from app.core.database import get_session
+    with get_session() as session, session.begin():
+        row = session.get(StoredResult, result_id)
+        # Stored before versioning: untagged issues and no rule versions
+        row.issues = [{**issue, "rule": None} for issue in row.issues] + [duplicate]
+        row.rule_versions = None
+
+    list(revalidate())
+    expected = [issue.model_dump(mode="json") for issue in validator.validate_invoice(result.extracted_data)]
+    assert get_result(result_id)["issues"] == expected + [duplicate]
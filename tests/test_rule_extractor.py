@@ -0,0 +1,68 @@
+from app.services.rule_extractor import extract_fields, missing_sections, merge_extraction, parse_amount
+
+INVOICE_TEXT = """TECH SOLUTIONS SARL
+12 Bd Zerktouni, Casablanca
+FACTURE N° FAC-2025-001
+Date : 15/01/2025
+Date d'échéance : 15/02/2025
+FACTURÉ À
+Client SA
+ICE Client : 999999999999999
+Désignation Qté Prix unitaire Total
+Service A 1 1 000,00 1 000,00
+Service B 2 500,00 1 000,00
+Total HT 2 000,00 DH
+TVA (20%) 400,00 DH
+Total TTC 2 400,00 DH
+ICE : 123456789012345 | IF : 12345678 | RC : 98765
+"""
+
+
+def test_parses_moroccan_amount_formats():
+    assert parse_amount("2 000,00") == 2000.0
+    assert parse_amount("2.000,00") == 2000.0
+    assert parse_amount("2,000.00") == 2000.0
+    assert parse_amount("400,5") == 400.5
+
+def test_clean_invoice_needs_no_llm():
+    fields = extract_fields(INVOICE_TEXT)
+
+    assert missing_sections(fields) == []
+
+    data = merge_extraction(fields)
+    assert data.meta.invoice_number == "FAC-2025-001"
+    assert data.meta.date == "15/01/2025"
+    assert data.seller.ice == "123456789012345"
+    assert data.seller.if_ == "12345678"
+    assert data.client.ice == "999999999999999"
+    assert data.client.name == "Client SA"
+    assert len(data.items) == 2
+    assert data.financials.total_ttc == 2400.0
+
+def test_inconsistent_totals_are_left_to_the_llm():
+    """A tampered TTC must not be 'fixed' by the rules: the LLM reads what is written."""
+    fields = extract_fields(INVOICE_TEXT.replace("Total TTC 2 400,00", "Total TTC 2 500,00"))
+
+    assert fields["financials"] is None
+    assert "financials" in missing_sections(fields)
+    assert "items" in missing_sections(fields)
+
+def test_rule_values_override_llm_output():
+    fields = extract_fields(INVOICE_TEXT.replace("IF : 12345678", ""))
+    assert missing_sections(fields) == ["seller"]
+
+    llm_seller = {"name": "Tech Solutions", "address": "Casablanca", "ice": "000", "if_": "12345678", "rc": None}
+    data = merge_extraction(fields, {"seller": llm_seller})
+
+    assert data.seller.if_ == "12345678"
+    assert data.seller.ice == "123456789012345"
+    assert data.seller.address == "Casablanca"
+
+def test_nothing_found_still_yields_an_invoice_with_its_gaps_reported():
+    from app.services.validator import validate_invoice
+
+    data = merge_extraction(extract_fields("nothing useful here"), {})
+
+    assert data.items == [] and data.financials.total_ttc is None
+    missing = {issue.field for issue in validate_invoice(data) if issue.error_type.value == "MISSING_DATA"}
+    assert {"Total HT", "Total TVA", "Total TTC", "Invoice Number"} <= missing
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+from app.celery_app import BULK_QUEUE, INTERACTIVE_QUEUE, broker_lists
+from app.schemas.invoices import PreflightDecision, PreflightReport
+from app.services import scheduling
+from app.services.scheduling import (
+    TENANT_FAIR_SHARE_STEP, TENANT_LOAD_KEY_TTL_SECONDS, TENANT_LOAD_WINDOW_SECONDS, arelease_slots, choose_queue, reserve_slots,
+    tenant_from_header, tenant_of, tenant_priority,
+)
+
+
+class FakeCounters:
+    """The few Redis counter commands the scheduler pipelines, sync and async."""
+
+    def __init__(self):
+        self.values, self.ttls = {}, {}
+        self.queued = []
+
+    def pipeline(self, transaction=True):
+        self.queued = []
+        return self
+
+    def _queue(self, command, *args):
+        self.queued.append((command, args))
+        return self
+
+    def mget(self, keys):
+        return self._queue("mget", keys)
+
+    def incrby(self, key, count):
+        return self._queue("incrby", key, count)
+
+    def decrby(self, key, count):
+        return self._queue("incrby", key, -count)
+
+    def expire(self, key, seconds):
+        self.ttls.setdefault(key, set()).add(seconds)
+        return self._queue("expire", key)
+
+    def _run(self):
+        results = []
+        for command, args in self.queued:
+            if command == "mget":
+                results.append([self.values.get(key) for key in args[0]])
+            elif command == "incrby":
+                self.values[args[0]] = self.values.get(args[0], 0) + args[1]
+                results.append(self.values[args[0]])
+            else:
+                results.append(True)
+        return results
+
+    def execute(self):
+        return self._run()
+
+
+class AsyncFakeCounters(FakeCounters):
+    def __init__(self, counters: FakeCounters):
+        super().__init__()
+        self.values, self.ttls = counters.values, counters.ttls
+
+    async def execute(self):
+        return self._run()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+def test_large_and_scanned_invoices_go_to_the_bulk_queue():
+    small = PreflightReport(decision=PreflightDecision.ACCEPT, pages=1, has_text_layer=True, estimated_tokens=800)
+    large = small.model_copy(update={"estimated_tokens": 12000})
+    scanned = PreflightReport(decision=PreflightDecision.OCR, pages=1)
+
+    assert choose_queue(small) == INTERACTIVE_QUEUE
+    assert choose_queue(large) == BULK_QUEUE
+    assert choose_queue(scanned) == BULK_QUEUE
+
+def test_priority_sinks_with_the_tenant_backlog():
+    assert tenant_priority(0) == 0
+    assert tenant_priority(TENANT_FAIR_SHARE_STEP) == 1
+    assert tenant_priority(10_000 * TENANT_FAIR_SHARE_STEP) == 9
+    assert tenant_from_header("acme corp/../x") == "acmecorp..x"
+    assert tenant_from_header(None) == "default"
+    assert broker_lists(BULK_QUEUE)[:2] == ["bulk", "bulk:1"]
+
+
+def test_tenant_header_is_only_trusted_from_a_proxy(monkeypatch):
+    monkeypatch.setattr(scheduling, "TENANT_TRUSTED_PROXIES", {"10.0.0.2"})
+    assert tenant_of("10.0.0.2", "acme") == "acme"
+    assert tenant_of("10.0.0.2", None) == "10.0.0.2"
+    # Anyone else is their address, whatever they claim to be
+    assert tenant_of("203.0.113.7", "acme") == "203.0.113.7"
+    assert tenant_of("2001:db8::1", "fresh-tenant-42") == "2001:db8::1"
+
+
+def test_backlog_is_released_and_ages_out(monkeypatch):
+    counters = FakeCounters()
+    monkeypatch.setattr(scheduling, "get_redis", lambda: counters)
+    monkeypatch.setattr(scheduling, "get_async_redis", lambda: AsyncFakeCounters(counters))
+    now = 1_700_000_000
+    monkeypatch.setattr(scheduling.time, "time", lambda: now)
+
+    priorities, bucket = asyncio.run(reserve_slots("acme", BULK_QUEUE, 2 * TENANT_FAIR_SHARE_STEP))
+    assert priorities[0] == 0 and priorities[-1] == 1
+    assert asyncio.run(reserve_slots("acme", BULK_QUEUE, 1))[0] == [2]
+
+    # A message that could not be published gives its slot back
+    asyncio.run(arelease_slots("acme", BULK_QUEUE, 1, bucket))
+    # So does one revoked or expired before it ran
+    from app.worker import _release_revoked_slots
+    request = SimpleNamespace(**scheduling.tenant_headers("acme", BULK_QUEUE, TENANT_FAIR_SHARE_STEP, bucket))
+    _release_revoked_slots(request=request)
+    assert asyncio.run(reserve_slots("acme", BULK_QUEUE, 1))[0] == [1]
+    # Releasing does not shorten the bucket's life
+    assert set().union(*counters.ttls.values()) == {TENANT_LOAD_KEY_TTL_SECONDS}
+
+    # Slots nobody released stop counting once they leave the window, however busy the tenant stays
+    now += TENANT_LOAD_WINDOW_SECONDS
+    assert asyncio.run(reserve_slots("acme", BULK_QUEUE, 1))[0] == [0]
@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Generous enough for a loaded CI runner; the API cold start is ~0.9 s and ~75 MB on a laptop
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.5"))
+STARTUP_BUDGET_RSS_MB = float(os.getenv("STARTUP_BUDGET_RSS_MB", "100"))
+
+# The extraction stack only belongs in the workers
+WORKER_ONLY_MODULES = (
+    "app.worker", "app.services.ocr_engine", "app.services.invoice",
+    "langchain_core", "langchain_openai", "openai", "pypdfium2", "pdfminer", "pytesseract", "numpy",
+)
+
+# Current RSS from /proc: ru_maxrss is inherited across fork/exec, so it would report pytest's own peak
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import app.main
+seconds = time.perf_counter() - start
+status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+print(json.dumps({
+    "seconds": seconds,
+    "rss_mb": int(status["VmRSS"].split()[0]) / 1024,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def _cold_start() -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_api_does_not_import_the_extraction_stack():
+    modules = set(_cold_start()["modules"])
+
+    assert not [name for name in WORKER_ONLY_MODULES if name in modules]
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads RSS from /proc")
+def test_api_cold_start_stays_within_budget():
+    # Best of three: the budget guards against regressions, not against a noisy neighbour
+    runs = [_cold_start() for _ in range(3)]
+
+    assert min(run["seconds"] for run in runs) < STARTUP_BUDGET_SECONDS
+    assert min(run["rss_mb"] for run in runs) < STARTUP_BUDGET_RSS_MB
@@ -0,0 +1,164 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.synthetic import generate_invoice
+from app.celery_app import celery_app
+from app.routers import invoices
+from app.services.blob_store import LocalBlobStore
+
+
+class FakeRedis:
+    """Plain GET/SET for batch manifests, shared by the sync and async clients."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+class AsyncFakeRedis:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    async def set(self, key, value, ex=None):
+        self.redis.set(key, value, ex)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """The real result backend with its MGET answered from a dict of task id -> (state, result)."""
+    states = {}
+    backend = celery_app.backend
+
+    def encode(task_id):
+        state, result = states[task_id]
+        if state == "FAILURE":
+            result = backend.prepare_exception(result)
+        return backend.encode({"task_id": task_id, "status": state, "result": result, "traceback": None, "children": []})
+
+    keys = {}
+    def mget(self, raw_keys):
+        return [encode(keys[key]) if keys.get(key) in states else None for key in raw_keys]
+
+    def set_state(task_id, state, result=None):
+        keys[backend.get_key_for_task(task_id)] = task_id
+        states[task_id] = (state, result)
+
+    # Patched on the class: the app keeps one backend instance per thread
+    monkeypatch.setattr(type(backend), "mget", mget)
+    return set_state
+
+
+@pytest.fixture
+def client():
+    from app.main import app
+    return TestClient(app)
+
+
+def test_bulk_status_reports_each_state(backend, client):
+    result = {"filename": "a.pdf", "is_valid": False, "issues": [{"message": "x"}], "extracted_data": {}}
+    backend("ok", "SUCCESS", result)
+    backend("chunk-failure", "SUCCESS", {"error": "LLM down", "status": "failed", "filename": "b.pdf"})
+    backend("bad", "FAILURE", ValueError("boom"))
+
+    response = client.post("/invoices/status", json={"ids": ["ok", "chunk-failure", "bad", "unknown"], "include_data": True})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["completed"], body["failed"], body["pending"]) == (4, 2, 1, 1)
+    ok, chunk_failure, bad, unknown = body["tasks"]
+    assert ok == {"task_id": "ok", "status": "completed", "filename": "a.pdf", "is_valid": False, "issues_count": 1, "data": result}
+    assert chunk_failure["error"] == "LLM down"
+    assert bad == {"task_id": "bad", "status": "failed", "error": "boom"}
+    assert unknown == {"task_id": "unknown", "status": "pending"}
+
+    compact = client.get("/invoices/status", params={"ids": "ok,unknown"}).json()
+    assert "data" not in compact["tasks"][0] and compact["pending"] == 1
+
+def test_bulk_status_limits_the_id_count(backend, client):
+    ids = [f"task-{i}" for i in range(invoices.STATUS_MAX_IDS + 1)]
+
+    assert client.post("/invoices/status", json={"ids": ids}).status_code == 422
+    assert client.get("/invoices/status", params={"ids": ",".join(ids)}).status_code == 400
+    assert client.get("/invoices/status", params={"ids": ","}).status_code == 400
+    assert client.post("/invoices/status", json={"ids": ids[:-1]}).json()["pending"] == invoices.STATUS_MAX_IDS
+
+
+def test_batch_is_submitted_then_tracked(tmp_path, monkeypatch, backend, client):
+    redis = FakeRedis()
+    sent = []
+
+    class FakeChord:
+        def __init__(self, header, body):
+            self.header = header
+
+        def apply_async(self, task_id):
+            sent.append(self.header)
+            children = [SimpleNamespace(id=f"{task_id}-{i}") for i in range(len(self.header.tasks))]
+            return SimpleNamespace(id=task_id, parent=SimpleNamespace(results=children))
+
+    async def reserve_slots(tenant, queue, count):
+        return [0] * count, 0
+
+    monkeypatch.setattr(invoices, "get_blob_store", lambda: LocalBlobStore(tmp_path / "blobs"))
+    monkeypatch.setattr(invoices, "chord", FakeChord)
+    monkeypatch.setattr(invoices, "reserve_slots", reserve_slots)
+    monkeypatch.setattr(invoices, "get_redis", lambda: redis)
+    monkeypatch.setattr(invoices, "get_async_redis", lambda: AsyncFakeRedis(redis))
+
+    pdfs = [generate_invoice(tmp_path / f"{name}.pdf", seed=seed) for seed, name in enumerate(("a", "b"))]
+    (tmp_path / "broken.pdf").write_bytes(b"%PDF-1.4\n" + b"garbage" * 200)
+    files = [("files", (path.name, path.read_bytes(), "application/pdf")) for path in pdfs + [tmp_path / "broken.pdf"]]
+
+    submitted = client.post("/invoices/validate/batch", files=files).json()
+
+    assert submitted["total"] == 2 and len(sent[0].tasks) == 2
+    assert [r["filename"] for r in submitted["rejected"]] == ["broken.pdf"]
+    batch_id = submitted["batch_id"]
+    first, second = (task["task_id"] for task in submitted["tasks"])
+
+    backend(first, "SUCCESS", {"filename": "a.pdf", "is_valid": True, "issues": []})
+    running = client.get(f"/invoices/batch/{batch_id}").json()
+    assert running["status"] == "processing" and running["summary"] is None
+    assert (running["completed"], running["pending"]) == (1, 1)
+
+    # One invoice failed: the chord body fails too, and the summary is rebuilt from the files
+    backend(second, "FAILURE", ValueError("boom"))
+    backend(batch_id, "FAILURE", ValueError("chord failed"))
+    done = client.get(f"/invoices/batch/{batch_id}").json()
+    assert done["status"] == "completed"
+    assert done["summary"] == {"total": 2, "valid": 1, "invalid": 0, "failed": 1}
+    assert done["files"][1]["filename"] == "b.pdf" and done["files"][1]["error"] == "boom"
+
+    assert client.get("/invoices/batch/unknown").status_code == 404
+
+def test_batch_accepts_more_files_than_starlettes_default(tmp_path, monkeypatch, client):
+    monkeypatch.setattr(invoices, "get_blob_store", lambda: LocalBlobStore(tmp_path / "blobs"))
+    files = [("files", (f"{i}.pdf", b"not a pdf", "application/pdf")) for i in range(1001)]
+
+    # Past form parsing: the first file is turned down for its content, not the request for its size
+    response = client.post("/invoices/validate/batch", files=files)
+    assert response.status_code == 415 and "0.pdf" in response.json()["detail"]
+
+    monkeypatch.setattr(invoices, "BATCH_MAX_FILES", 1000)
+    assert client.post("/invoices/validate/batch", files=files).status_code == 400
+
+def test_batch_preflight_checks_each_blob_once_and_concurrently(monkeypatch):
+    # Both checks must be running at once for either to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    checked = []
+
+    def preflight_blob(digest):
+        checked.append(digest)
+        barrier.wait()
+        return f"report-{digest}"
+
+    monkeypatch.setattr(invoices, "_preflight_blob", preflight_blob)
+
+    assert invoices._preflight_blobs(["a", "b", "a"]) == ["report-a", "report-b", "report-a"]
+    assert sorted(checked) == ["a", "b"]
@@ -0,0 +1,96 @@
+import json
+from types import SimpleNamespace
+import pytest
+from benchmarks.synthetic import generate_invoice
+from benchmarks.fake_vllm import FakeVLLMServer
+from app import worker
+from app.services import ocr_engine, extraction_cache, duplicate_index
+from app.services.blob_store import LocalBlobStore
+from app.services.extraction_cache import file_digest
+
+
+class FakeBackend:
+    def __init__(self):
+        self.stored, self.failed = {}, {}
+
+    def store_result(self, task_id, result, state):
+        self.stored[task_id] = (state, result)
+
+    def mark_as_failure(self, task_id, error):
+        self.failed[task_id] = error
+
+    def mark_as_done(self, task_id, result, *args, **kwargs):
+        pass  # The chunk's own result, stored as apply() runs it eagerly
+
+
+@pytest.fixture
+def chunk_worker(tmp_path, monkeypatch):
+    """The chunk task wired to a fake vLLM, a blob store under tmp_path and recording stand-ins for Redis and the database."""
+    store = LocalBlobStore(tmp_path / "blobs")
+    backend = FakeBackend()
+    saved, events = {}, {}
+    monkeypatch.setattr(worker, "get_blob_store", lambda: store)
+    monkeypatch.setattr(worker, "save_result", lambda validation, task_id, digest: saved.setdefault(task_id, validation))
+    monkeypatch.setattr(worker, "publish_task_event", lambda task_id, event: events.setdefault(task_id, event))
+    monkeypatch.setattr(worker.process_invoice_chunk_task, "backend", backend)
+    monkeypatch.setattr(extraction_cache, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(duplicate_index, "DUPLICATE_INDEX_BACKEND", "none")
+
+    with FakeVLLMServer() as server:
+        monkeypatch.setattr(ocr_engine, "VLLM_API_URL", server.url)
+        monkeypatch.setattr(ocr_engine, "_cached_llm", None)
+        ocr_engine._get_chain.cache_clear()
+        try:
+            yield store, backend, saved, events, server
+        finally:
+            ocr_engine._get_chain.cache_clear()
+
+
+def test_chunk_reports_each_invoice_under_its_own_task_id(tmp_path, chunk_worker):
+    store, backend, saved, events, server = chunk_worker
+    pdf = generate_invoice(tmp_path / "invoice.pdf", pages=1, items=3, rule_friendly=False)
+    digest = file_digest(pdf)
+    staged = store.staging_path()
+    staged.write_bytes(pdf.read_bytes())
+    store.put_file(staged, digest)
+
+    invoices = [
+        {"digest": digest, "filename": "invoice.pdf", "task_id": "task-ok"},
+        # Its blob is gone: not transient, so it fails at once without holding up the other one
+        {"digest": "0" * 64, "filename": "missing.pdf", "task_id": "task-missing"},
+    ]
+    ok, missing = worker.process_invoice_chunk_task.apply(args=[invoices]).get()
+
+    assert server.requests >= 1
+    assert ok["filename"] == "invoice.pdf" and len(ok["extracted_data"]["items"]) == 3
+    assert backend.stored == {"task-ok": ("SUCCESS", ok)}
+    assert saved["task-ok"].filename == "invoice.pdf"
+    assert events["task-ok"]["status"] == "completed"
+
+    assert missing["status"] == "failed" and missing["filename"] == "missing.pdf"
+    assert isinstance(backend.failed["task-missing"], FileNotFoundError)
+    assert "task-missing" not in saved
+    assert events["task-missing"]["status"] == "failed"
+
+    # Every chunk of the process runs on the one shared loop
+    assert worker._get_event_loop() is worker._get_event_loop()
+    assert worker._get_event_loop().is_running()
+
+def test_a_batch_with_failed_invoices_is_reported_as_such(monkeypatch):
+    backend = worker.celery_app.backend
+    stored = {
+        backend.get_key_for_task("ok"): backend.encode({"task_id": "ok", "status": "SUCCESS", "result": {"is_valid": True}}),
+        backend.get_key_for_task("bad"): backend.encode({"task_id": "bad", "status": "FAILURE", "result": backend.prepare_exception(ValueError("boom"))}),
+    }
+    manifest = json.dumps({"summary_task_id": "batch", "tasks": [{"task_id": "ok"}, {"task_id": "bad"}]})
+    events = {}
+    monkeypatch.setattr(worker, "get_redis", lambda: SimpleNamespace(get=lambda key: manifest))
+    monkeypatch.setattr(type(backend), "mget", lambda self, keys: [stored.get(key) for key in keys])
+    monkeypatch.setattr(worker, "publish_task_event", lambda task_id, event: events.setdefault(task_id, event))
+
+    worker.batch_failed_task(None, ValueError("boom"), None, batch_id="batch")
+
+    # GET /invoices/status reports the chord itself as failed: the event must not say "completed"
+    assert events["batch"] == {
+        "task_id": "batch", "status": "completed_with_failures", "data": {"total": 2, "valid": 1, "invalid": 0, "failed": 1},
+    }
@@ -1,11 +1,15 @@
 import os
+import asyncio
 import streamlit as st
-import requests
 import time
+import httpx
 import pandas as pd
+from app.client import InvoiceClient
 
 # 1. SETUP & CONFIG
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+UI_MAX_FILES = int(os.getenv("UI_MAX_FILES", "100"))
+UI_UPLOAD_CONCURRENCY = int(os.getenv("UI_UPLOAD_CONCURRENCY", "8"))
 st.set_page_config(page_title="Morocco Invoice Validator", layout="wide")
 
 # 2. SESSION STATE MANAGEMENT
@@ -42,7 +46,7 @@ def render_invoice_report(data):
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Invoice #", extracted.get('meta', {}).get('invoice_number', 'N/A'))
     col2.metric("Date", extracted.get('meta', {}).get('date', 'N/A'))
-    col3.metric("Total TTC", f"{extracted.get('financials', {}).get('total_ttc', 0):,.2f} DH")
+    col3.metric("Total TTC", f"{extracted.get('financials', {}).get('total_ttc') or 0:,.2f} DH")
     col4.metric("ICE Check", "✅ Match" if data.get('is_valid') else "⚠️ Check")
 
     # 3. Compliance Issues List
@@ -79,9 +83,9 @@ with st.sidebar:
         key=f"uploader_{st.session_state.uploader_key}" 
     )
     
-    if uploaded_files and len(uploaded_files) > 10:
-        st.warning("⚠️ Limit is 10 files.")
-        uploaded_files = uploaded_files[:10]
+    if uploaded_files and len(uploaded_files) > UI_MAX_FILES:
+        st.warning(f"⚠️ Limit is {UI_MAX_FILES} files.")
+        uploaded_files = uploaded_files[:UI_MAX_FILES]
 
     def start_upload():
         st.session_state.uploading = True
@@ -98,37 +102,32 @@ with st.sidebar:
 # ==========================================
 #  PHASE 1: UPLOAD (Run Once)
 # ==========================================
+async def upload_all(files):
+    """Parallel uploads; the client backs off on its own when the API rate limit is hit."""
+    async with InvoiceClient(API_URL, max_concurrency=UI_UPLOAD_CONCURRENCY) as client:
+        return await client.submit_many(files)
+
 if st.session_state.uploading:
-    with st.status("📤 Uploading files...", expanded=True) as status:
+    with st.status(f"📤 Uploading {len(uploaded_files)} files...", expanded=True) as status:
+        files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+        answers = asyncio.run(upload_all(files))
+
         active_tasks = []
-        for uploaded_file in uploaded_files:
-            try:
-                uploaded_file.seek(0) # Safety rewind
-                files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
-                
-                response = requests.post(f"{API_URL}/invoices/validate", files=files)
-                
-                # Rate Limit Handling (429)
-                if response.status_code == 429:
-                    status.warning(f"⚠️ Rate limit hit on '{uploaded_file.name}'. Skipping...")
-                    time.sleep(1)
-                    continue
-                
-                response.raise_for_status()
-                task_data = response.json()
-                
+        for answer in answers:
+            if "task_id" in answer:
                 active_tasks.append({
-                    "filename": uploaded_file.name,
-                    "task_id": task_data["task_id"],
+                    "filename": answer["filename"],
+                    "task_id": answer["task_id"],
                     "start_time": time.time(),
                     "completed": False,
                     "result": None
                 })
-                status.write(f"✅ Uploaded {uploaded_file.name}")
-                time.sleep(0.2) # Polite throttle
-
-            except Exception as e:
-                status.error(f"❌ Failed to upload {uploaded_file.name}: {e}")
+                status.write(f"✅ Uploaded {answer['filename']}")
+            # Preflight Rejection (422): corrupt, encrypted, scanned or oversized
+            elif answer.get("status_code") == 422:
+                status.error(f"🚫 '{answer['filename']}' rejected: {answer['error']}")
+            else:
+                status.error(f"❌ Failed to upload {answer['filename']}: {answer['error']}")
         
         # Save State & Reset Uploader
         st.session_state.invoice_tasks = active_tasks
@@ -180,42 +179,44 @@ if st.session_state.invoice_tasks:
                     p_text = st.empty()
                     active_placeholders[task['task_id']] = (p_bar, p_text)
 
-    # 4. POLLING LOOP (Runs in background if needed)
-    if not all_done:
-        while True:
-            any_updated = False
-            
-            for task in st.session_state.invoice_tasks:
-                if task['completed']:
-                    continue # Skip finished tasks
-                
+    # 4. POLLING LOOP (one bulk status request per second, whatever the number of files)
+    async def poll_until_update(tasks, placeholders):
+        async with InvoiceClient(API_URL) as client:
+            while True:
+                pending = [task for task in tasks if not task['completed']]
+
                 # Update Animation
-                elapsed = int(time.time() - task["start_time"])
-                if task['task_id'] in active_placeholders:
-                    p_bar, p_text = active_placeholders[task['task_id']]
-                    if elapsed < 300:
+                for task in pending:
+                    elapsed = int(time.time() - task["start_time"])
+                    if task['task_id'] in placeholders and elapsed < 300:
+                        p_bar, p_text = placeholders[task['task_id']]
                         p_bar.progress(min(elapsed * 2, 95))
                         p_text.caption(f"Processing... ({elapsed}s)")
-                
+
                 # Check API Status
                 try:
-                    check = requests.get(f"{API_URL}/invoices/status/{task['task_id']}")
-                    result = check.json()
-                    status = result.get("status", "").lower()
-
-                    if status == "completed":
+                    statuses = await client.status([task['task_id'] for task in pending], include_data=True)
+                except httpx.HTTPError:
+                    statuses = []
+
+                by_id = {entry["task_id"]: entry for entry in statuses}
+                any_updated = False
+                for task in pending:
+                    entry = by_id.get(task['task_id'], {})
+                    if entry.get("status") == "completed":
                         task["completed"] = True
-                        task["result"] = result["data"]
-                        any_updated = True 
-                    elif status == "failed":
+                        task["result"] = entry["data"]
+                        any_updated = True
+                    elif entry.get("status") == "failed":
                         task["completed"] = True
-                        task["result"] = {"error": result.get("error")}
+                        task["result"] = {"error": entry.get("error")}
                         any_updated = True
-                except:
-                    pass
-            
-            # If ANY task finished, refresh page to show its Final Dashboard
-            if any_updated:
-                st.rerun()
-            
-            time.sleep(1)
\ No newline at end of file
+
+                if any_updated:
+                    return
+                await asyncio.sleep(1)
+
+    if not all_done:
+        asyncio.run(poll_until_update(st.session_state.invoice_tasks, active_placeholders))
+        # A task finished: refresh the page to show its Final Dashboard
+        st.rerun()